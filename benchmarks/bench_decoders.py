@@ -0,0 +1,100 @@
+"""Decode throughput per format and backend, in multiples of realtime.
+
+Usage: python benchmarks/bench_decoders.py [seconds | audio files...]
+
+Without files, test tracks of ``seconds`` (default 60) are synthesized in a
+temporary directory.  Every backend that claims a file is timed on it.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from player.backends import BACKENDS  # noqa: E402
+
+FORMATS = [
+    ("wav16.wav", "WAV", "PCM_16"),
+    ("wav24.wav", "WAV", "PCM_24"),
+    ("float.wav", "WAV", "FLOAT"),
+    ("flac.flac", "FLAC", "PCM_16"),
+    ("vorbis.ogg", "OGG", "VORBIS"),
+    ("mp3.mp3", "MP3", None),
+]
+
+
+def synthesize(directory, seconds, samplerate=44100):
+    t = np.arange(int(seconds * samplerate)) / samplerate
+    tone = 0.3 * np.sin(2 * np.pi * 440 * t) + 0.05 * np.random.default_rng(0).standard_normal(len(t))
+    audio = np.stack([tone, np.roll(tone, 100)], axis=1).astype("float32")
+    paths = []
+    for name, fmt, subtype in FORMATS:
+        if fmt not in sf.available_formats():
+            continue
+        path = os.path.join(directory, name)
+        with sf.SoundFile(path, "w", samplerate, 2, subtype=subtype, format=fmt) as f:
+            # Block-wise: some libsndfile encoders crash on very large writes
+            for start in range(0, len(audio), 65536):
+                f.write(audio[start : start + 65536])
+        paths.append(path)
+    if shutil.which("ffmpeg"):
+        path = os.path.join(directory, "aac.m4a")
+        subprocess.run(
+            ["ffmpeg", "-v", "error", "-y", "-i", paths[0], "-c:a", "aac", path], check=False
+        )
+        if os.path.exists(path):
+            paths.append(path)
+    return paths
+
+
+def decode(backend, path, blocksize=4096):
+    start = time.perf_counter()
+    source = backend(path)
+    out = np.empty((blocksize, source.channels), dtype="float32")
+    frames = 0
+    while True:
+        n = len(source.read(out))
+        if not n:
+            break
+        frames += n
+    source.close()
+    return frames / source.samplerate, time.perf_counter() - start
+
+
+def main(args):
+    tmp = None
+    if args and not args[0].replace(".", "").isdigit():
+        paths = args
+    else:
+        tmp = tempfile.mkdtemp()
+        paths = synthesize(tmp, float(args[0]) if args else 60.0)
+    print("%-14s %-10s %10s %12s" % ("file", "backend", "decode s", "x realtime"))
+    try:
+        for path in paths:
+            ext = os.path.splitext(path)[1].lower()
+            for backend in BACKENDS:
+                if ext not in backend.extensions() or not backend.available():
+                    continue
+                try:
+                    decode(backend, path, blocksize=1024)  # warm the page cache
+                    duration, elapsed = decode(backend, path)
+                except (RuntimeError, OSError, ValueError) as e:
+                    print("%-14s %-10s %s" % (os.path.basename(path), backend.name, e))
+                    continue
+                print(
+                    "%-14s %-10s %10.3f %12.0f"
+                    % (os.path.basename(path), backend.name, elapsed, duration / elapsed)
+                )
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,45 @@
+"""Time Playlist operations on a large queue.
+
+Usage: python benchmarks/bench_playlist.py [entries]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from player.playlist import Playlist  # noqa: E402
+
+
+def timed(label, func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = time.perf_counter() - start
+    per_op = elapsed / repeat
+    unit, scale = ("ms", 1e3) if per_op >= 1e-3 else ("us", 1e6)
+    print("%-28s %10.3f %s/op" % (label, per_op * scale, unit))
+
+
+def main(entries=1_000_000):
+    files = ["/music/artist%d/album%d/track%07d.flac" % (i % 997, i % 89, i) for i in range(entries)]
+    playlist = Playlist()
+    print("Playlist benchmark, %d entries" % entries)
+    timed("add_files (all)", lambda: playlist.add_files(files))
+    timed("add_files (1000 more)", lambda: playlist.add_files(files[:1000]))
+    timed("set_shuffle(True)", lambda: playlist.set_shuffle(True))
+    timed("next (shuffle)", playlist.next, repeat=10000)
+    timed("prev (shuffle)", playlist.prev, repeat=10000)
+    timed("add_files into shuffle", lambda: playlist.add_files(files[:1000]))
+    playlist.set_shuffle(False)
+    timed("next (sequential)", playlist.next, repeat=10000)
+    timed("index", lambda: playlist.index, repeat=10000)
+    n = len(playlist)
+    timed("track_at (random)", lambda: playlist.track_at(random.randrange(n)), repeat=10000)
+    timed("move (random)", lambda: playlist.move(random.randrange(n), random.randrange(n)), repeat=10000)
+    timed("remove (random)", lambda: playlist.remove(random.randrange(len(playlist))), repeat=10000)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,79 @@
+"""Search index build time, memory and query latency on a synthetic library.
+
+Usage: python benchmarks/bench_search.py [tracks]
+"""
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from library.search import SearchIndex  # noqa: E402
+
+WORDS = (
+    "love night heart blue dream fire light rain time road home river star "
+    "gold summer dance shadow ocean city moon sun wild young black white "
+    "electric midnight silver broken song story world kingdom ghost garden"
+).split()
+
+
+def library(tracks, seed=0):
+    rng = random.Random(seed)
+    artists = [
+        " ".join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 3))) + " %d" % i
+        for i in range(tracks // 40 + 1)
+    ]
+    for i in range(tracks):
+        artist = artists[i // 40]
+        album = "%s Vol. %d" % (rng.choice(WORDS).title(), i // 12 % 5)
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+        path = "/home/user/Music/%s/%s/%02d %s.flac" % (artist, album, i % 12 + 1, title)
+        yield path, {"title": title, "artist": artist, "album": album}
+
+
+def timed_query(index, query, repeat=20, **facets):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = index.search(query, **facets)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    label = query + "".join(" [%s=%s]" % item for item in facets.items())
+    print(
+        "%-32s %8d hits %8.2f ms median %8.2f ms max"
+        % (repr(label), result.total, times[len(times) // 2] * 1e3, times[-1] * 1e3)
+    )
+
+
+def main(tracks=200_000):
+    docs = list(library(tracks))
+    index = SearchIndex()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for path, _ in docs:
+        index.add(path)
+    paths_only = time.perf_counter() - start
+    for path, meta in docs:
+        index.add(path, meta)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    memory = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) * 1024
+    print("Search benchmark, %d tracks" % tracks)
+    print("index paths              %8.2f s" % paths_only)
+    print("index paths + tags       %8.2f s (%.0f tracks/s)" % (elapsed, tracks / elapsed))
+    print("peak RSS growth          %8.1f MB" % (memory / 2**20))
+    start = time.perf_counter()
+    for path, meta in docs[:1000]:
+        index.add(path + ".new", meta)
+    print("add 1000 more            %8.2f ms" % ((time.perf_counter() - start) * 1e3))
+    artist = docs[len(docs) // 2][1]["artist"]
+    for query in ("l", "lo", "lov", "love", "love night", "midnight gho", "silver kingdom river", artist, "zzzz"):
+        timed_query(index, query)
+    timed_query(index, "love", artist=artist)
+    timed_query(index, "")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,41 @@
+"""Compare VisualizerWidget paint cost of the batched and per-bar paths.
+
+Usage: python benchmarks/bench_visualizer.py [frames]
+Runs offscreen; set QT_QPA_PLATFORM=offscreen if no display is available.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import numpy as np  # noqa: E402
+from PyQt5.QtGui import QPixmap  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+from ui.visualizer import VisualizerWidget  # noqa: E402
+
+
+def main(frames=300):
+    app = QApplication.instance() or QApplication(sys.argv)
+    rng = np.random.default_rng(0)
+    for width in (400, 700, 1400):
+        for batched in (False, True):
+            widget = VisualizerWidget()
+            widget.resize(width, 180)
+            widget.batched = batched
+            target = QPixmap(widget.size())
+            for _ in range(frames):
+                widget.update_spectrum(rng.random(64))
+                widget.render(target)
+            mean, p95 = widget.frame_stats()
+            print(
+                "width %4d  %-8s  mean %6.3f ms  p95 %6.3f ms"
+                % (width, "batched" if batched else "per-bar", mean, p95)
+            )
+            widget.fft_worker.stop()
+            widget.deleteLater()
+    app.processEvents()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
@@ -0,0 +1,143 @@
+"""Stand-in for ``sounddevice`` so playback can be benchmarked without a device.
+
+``install()`` must run before ``player.audio_engine`` is imported.  An
+OutputStream calls its callback from a thread, paced like a device that
+consumes ``blocksize`` frames every ``blocksize / samplerate / SPEED``
+seconds, and times every call.  ``arm()`` starts a time-to-first-audio
+measurement that ends with the first block containing a non-zero sample.
+"""
+import sys
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_SAMPLERATE = 48000
+SPEED = 4.0  # Faster than realtime keeps runs short; decoders still have to keep up
+
+
+class PortAudioError(Exception):
+    pass
+
+
+class CallbackStop(Exception):
+    pass
+
+
+class CallbackAbort(Exception):
+    pass
+
+
+class CallbackFlags:
+    output_underflow = False
+
+    def __bool__(self):
+        return False
+
+
+class _TimeInfo:
+    __slots__ = ("currentTime", "outputBufferDacTime")
+
+
+class _Default:
+    device = (None, None)
+    samplerate = None
+    latency = ("high", "high")
+
+
+default = _Default()
+
+
+def query_devices(device=None, kind=None):
+    return {
+        "name": "benchmark",
+        "max_output_channels": 8,
+        "default_samplerate": float(DEFAULT_SAMPLERATE),
+        "default_low_output_latency": 0.01,
+        "default_high_output_latency": 0.04,
+    }
+
+
+class OutputStream:
+    def __init__(
+        self, samplerate=None, blocksize=None, device=None, channels=None, dtype="float32",
+        latency=None, callback=None, **kwargs
+    ):
+        self.samplerate = float(samplerate or DEFAULT_SAMPLERATE)
+        self.blocksize = blocksize or 1024
+        self.channels = channels or 2
+        self.callback = callback
+        self.latency = latency if isinstance(latency, float) else 2 * self.blocksize / self.samplerate
+        self.active = False
+        self.closed = False
+        self.costs = np.zeros(1 << 16)  # seconds per callback, ring of the latest calls
+        self.calls = 0
+        self.first_audio = None
+        self._armed = False
+        self._thread = None
+        self._running = False
+
+    @property
+    def time(self):
+        return time.perf_counter()
+
+    def arm(self):
+        self.first_audio = None
+        self._armed = True
+
+    def reset_costs(self):
+        self.calls = 0
+
+    def recent_costs(self):
+        return self.costs[: min(self.calls, len(self.costs))].copy()
+
+    def start(self):
+        self._running = True
+        self.active = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        out = np.zeros((self.blocksize, self.channels), dtype="float32")
+        info = _TimeInfo()
+        flags = CallbackFlags()
+        period = self.blocksize / self.samplerate / SPEED
+        due = time.perf_counter()
+        while self._running:
+            start = time.perf_counter()
+            info.currentTime = start
+            info.outputBufferDacTime = start + self.latency
+            try:
+                self.callback(out, self.blocksize, info, flags)
+            except (CallbackStop, CallbackAbort):
+                break
+            end = time.perf_counter()
+            self.costs[self.calls % len(self.costs)] = end - start
+            self.calls += 1
+            if self._armed and out.any():
+                self._armed = False
+                self.first_audio = end
+            due += period
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                due = time.perf_counter()
+        self.active = False
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        self.active = False
+
+    abort = stop
+
+    def close(self):
+        self.stop()
+        self.closed = True
+
+
+def install():
+    sys.modules["sounddevice"] = sys.modules[__name__]
@@ -0,0 +1,398 @@
+"""Headless benchmark suite with baseline comparison.
+
+Usage: python benchmarks/run.py [--quick] [--only GROUP ...] [--latency PROFILE]
+                                [-o results.json] [--baseline FILE] [--save-baseline]
+                                [--threshold 0.25]
+
+Plays synthesized WAV/FLAC/OGG/MP3 fixtures through ``AudioEngine`` on a fake
+output device (see fake_sounddevice.py) and times the decoders, playlist,
+spectrum analysis, visualizer painting and tag reading.  Results are written
+as JSON; when a baseline exists (benchmarks/baseline.json by default) every
+metric is compared against it and the exit status is 1 if any got worse by
+more than its tolerance.  Baselines are machine-specific, so record one with
+``--save-baseline`` on the machine that runs the comparison.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+
+import fake_sounddevice  # noqa: E402
+
+fake_sounddevice.install()
+
+from bench_decoders import decode, synthesize  # noqa: E402
+
+GROUPS = ("playback", "decode", "memory", "playlist", "fft", "metadata")
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+PLAYBACK_FIXTURES = ("wav16", "flac", "vorbis", "mp3", "aac")
+METADATA_FIXTURES = ("wav16", "flac", "vorbis", "mp3")
+PLAYBACK_RATES = (44100, 48000)
+
+FULL = {
+    "seconds": 40,
+    "blocks": 1200,
+    "repeats": 5,
+    "playlist_sizes": (10_000, 100_000, 1_000_000),
+    "ops": 2000,
+    "metadata_reads": 200,
+    "fft_frames": 2000,
+    "paint_frames": 300,
+}
+QUICK = {
+    "seconds": 12,
+    "blocks": 300,
+    "repeats": 3,
+    "playlist_sizes": (10_000, 100_000),
+    "ops": 500,
+    "metadata_reads": 50,
+    "fft_frames": 500,
+    "paint_frames": 100,
+}
+
+
+class Results:
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name, value, unit, better="lower", tolerance=None):
+        """Record a metric; ``tolerance`` overrides the regression threshold."""
+        metric = {"value": float(value), "unit": unit, "better": better}
+        if tolerance is not None:
+            metric["tolerance"] = tolerance
+        self.metrics[name] = metric
+        print("%-44s %12.3f %s" % (name, value, unit), flush=True)
+
+
+def fixture_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def size_label(n):
+    return "%dm" % (n // 1_000_000) if n >= 1_000_000 else "%dk" % (n // 1000)
+
+
+def tag_fixtures(paths):
+    """Give every fixture title/artist/album tags and FLAC and MP3 cover art."""
+    from mutagen import File, MutagenError
+    from mutagen.flac import FLAC, Picture
+    from mutagen.id3 import APIC, ID3
+
+    art = bytes(random.Random(0).getrandbits(8) for _ in range(64 * 1024))
+    for i, path in enumerate(paths):
+        try:
+            audio = File(path, easy=True)
+            if audio is None:
+                continue
+            if audio.tags is None:
+                audio.add_tags()
+            audio["title"] = "Track %d" % i
+            audio["artist"] = "Benchmark"
+            audio["album"] = "Fixtures"
+            audio.save()
+            if path.endswith(".flac"):
+                audio = FLAC(path)
+                picture = Picture()
+                picture.type = 3
+                picture.mime = "image/jpeg"
+                picture.data = art
+                audio.add_picture(picture)
+                audio.save()
+            elif path.endswith(".mp3"):
+                tags = ID3(path)
+                tags.add(APIC(encoding=3, mime="image/jpeg", type=3, desc="", data=art))
+                tags.save(path)
+        except (MutagenError, KeyError, TypeError, ValueError):
+            pass  # Untaggable in this mutagen version; it still gets benchmarked
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise RuntimeError("timed out")
+        time.sleep(0.0005)
+
+
+def bench_playback(results, fixtures, config):
+    from player.audio_engine import AudioEngine
+
+    fixtures = [p for p in fixtures if fixture_name(p) in PLAYBACK_FIXTURES]
+    for rate in PLAYBACK_RATES:
+        engine = AudioEngine(samplerate=rate, profile=config["profile"])
+        try:
+            for path in fixtures:
+                name = "playback.%s.%dk" % (fixture_name(path), rate // 1000)
+                engine.play(path)  # Opens the stream and warms the page cache
+                stream = engine.stream
+                first_audio = []
+                for _ in range(config["repeats"]):
+                    engine.stop()
+                    stream.arm()
+                    start = time.perf_counter()
+                    engine.play(path)
+                    wait_for(lambda: stream.first_audio is not None)
+                    first_audio.append(stream.first_audio - start)
+                starved = engine.starved_blocks
+                stream.reset_costs()
+                wait_for(lambda: stream.calls >= config["blocks"], timeout=120)
+                costs = stream.recent_costs()[: config["blocks"]] * 1e6
+                results.add(name + ".first_audio_ms", statistics.median(first_audio) * 1e3, "ms", tolerance=0.5)
+                results.add(name + ".callback_mean_us", costs.mean(), "us")
+                results.add(name + ".callback_p99_us", np.percentile(costs, 99), "us", tolerance=0.5)
+                results.add(name + ".callback_max_us", costs.max(), "us", tolerance=2.0)
+                results.add(name + ".starved_blocks", engine.starved_blocks - starved, "blocks")
+        finally:
+            engine.close()
+
+
+def bench_decode(results, fixtures, config):
+    from player.backends import BACKENDS
+
+    for path in fixtures:
+        ext = os.path.splitext(path)[1].lower()
+        for backend in BACKENDS:
+            if ext not in backend.extensions() or not backend.available():
+                continue
+            try:
+                decode(backend, path)  # Warm the page cache
+                speeds = []
+                for _ in range(3):
+                    duration, elapsed = decode(backend, path)
+                    speeds.append(duration / elapsed)
+            except (RuntimeError, OSError, ValueError):
+                continue
+            results.add(
+                "decode.%s.%s.x_realtime" % (fixture_name(path), backend.name),
+                statistics.median(speeds),
+                "x",
+                better="higher",
+            )
+
+
+def traced_peak(func):
+    """Peak Python/NumPy heap growth while ``func`` runs, in MiB."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def bench_memory(results, fixtures, config):
+    from player.audio_engine import AudioEngine
+    from player.playlist import Playlist
+
+    flac = [p for p in fixtures if p.endswith(".flac")][0]
+
+    def playback():
+        engine = AudioEngine(samplerate=48000)
+        try:
+            engine.play(flac)
+            stream = engine.stream
+            stream.reset_costs()
+            wait_for(lambda: stream.calls >= 200)
+        finally:
+            engine.close()
+
+    results.add("memory.playback_mib", traced_peak(playback), "MiB", tolerance=0.5)
+    for size in config["playlist_sizes"]:
+        files = ["/music/artist%d/album%d/track%07d.flac" % (i % 997, i % 89, i) for i in range(size)]
+
+        def fill():
+            playlist = Playlist()
+            playlist.add_files(files)
+            playlist.set_shuffle(True)
+
+        results.add("memory.playlist_%s_mib" % size_label(size), traced_peak(fill), "MiB", tolerance=0.5)
+
+
+def timed(func, repeat=1, rounds=5):
+    """Best time per call over ``rounds`` runs of ``repeat`` calls, like timeit."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+
+def bench_playlist(results, fixtures, config):
+    from player.playlist import Playlist
+
+    rng = random.Random(0)
+    ops = config["ops"]
+    for size in config["playlist_sizes"]:
+        files = ["/music/artist%d/album%d/track%07d.flac" % (i % 997, i % 89, i) for i in range(size)]
+        name = "playlist.%s." % size_label(size)
+        results.add(name + "add_files_ms", timed(lambda: Playlist().add_files(files)) * 1e3, "ms")
+        playlist = Playlist()
+        playlist.add_files(files)
+        results.add(name + "shuffle_ms", timed(lambda: playlist.set_shuffle(True)) * 1e3, "ms")
+        results.add(name + "next_us", timed(playlist.next, ops) * 1e6, "us")
+        results.add(name + "prev_us", timed(playlist.prev, ops) * 1e6, "us")
+        results.add(name + "track_at_us", timed(lambda: playlist.track_at(rng.randrange(size)), ops) * 1e6, "us")
+        results.add(
+            name + "move_us", timed(lambda: playlist.move(rng.randrange(size), rng.randrange(size)), ops) * 1e6, "us"
+        )
+        results.add(name + "remove_us", timed(lambda: playlist.remove(rng.randrange(len(playlist))), ops) * 1e6, "us")
+        state = playlist.snapshot()
+        results.add(name + "snapshot_ms", timed(playlist.snapshot) * 1e3, "ms")
+        results.add(name + "restore_ms", timed(lambda: Playlist().restore(state)) * 1e3, "ms")
+
+
+def bench_fft(results, fixtures, config):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtGui import QPixmap
+    from PyQt5.QtWidgets import QApplication
+
+    from ui.visualizer import FFTWorker, VisualizerWidget
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    block = np.random.default_rng(0).standard_normal((1024, 2)).astype("float32")
+    frames = config["fft_frames"]
+    for size in (1024, 2048, 4096):
+        worker = FFTWorker(fft_size=size)  # Driven directly, the thread is never started
+
+        def frame():
+            worker.update_data(block)
+            worker.analyze()
+
+        results.add("fft.%d.frame_us" % size, timed(frame, frames) * 1e6, "us")
+    widget = VisualizerWidget()
+    widget.resize(700, 180)
+    target = QPixmap(widget.size())
+    levels = np.random.default_rng(0).random((config["paint_frames"], 64))
+    for spectrum in levels:
+        widget.update_spectrum(spectrum)
+        widget.render(target)
+    mean, p95 = widget.frame_stats()
+    results.add("visualizer.paint_ms", mean, "ms")
+    results.add("visualizer.paint_p95_ms", p95, "ms", tolerance=0.5)
+    widget.fft_worker.stop()
+    widget.deleteLater()
+    app.processEvents()
+
+
+def bench_metadata(results, fixtures, config):
+    from utils.metadata_utils import get_metadata_and_album_art
+
+    reads = config["metadata_reads"]
+    for path in fixtures:
+        if fixture_name(path) not in METADATA_FIXTURES:
+            continue
+        per_file = timed(lambda: get_metadata_and_album_art(path), reads)
+        results.add("metadata.%s.files_per_s" % fixture_name(path), 1 / per_file, "files/s", better="higher")
+
+
+def worse_by(metric, base):
+    """Relative change in the bad direction; positive means worse."""
+    value, reference = metric["value"], base["value"]
+    if metric["better"] == "higher":
+        value, reference = reference, value
+    if reference == 0:
+        return float("inf") if value > 0 else 0.0
+    return value / reference - 1
+
+
+def compare(metrics, baseline, threshold):
+    """Print a comparison table and return the names of regressed metrics."""
+    regressions = []
+    print()
+    print("%-44s %12s %12s %8s" % ("metric", "baseline", "current", "change"))
+    for name, metric in metrics.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        change = worse_by(metric, base)
+        tolerance = metric.get("tolerance", threshold)
+        flag = ""
+        if change > tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -tolerance:
+            flag = "  improved"
+        print("%-44s %12.3f %12.3f %+7.0f%%%s" % (name, base["value"], metric["value"], change * 100, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python benchmarks/run.py", description=__doc__.split("\n")[0])
+    parser.add_argument("--quick", action="store_true", help="smaller fixtures and fewer repeats")
+    parser.add_argument("--only", nargs="+", choices=GROUPS, metavar="GROUP", help=", ".join(GROUPS))
+    parser.add_argument("--latency", default="balanced", metavar="PROFILE", help="engine latency profile")
+    parser.add_argument("-o", "--output", metavar="FILE", help="write results as JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, metavar="FILE")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="default allowed slowdown (0.25 = 25%%)"
+    )
+    args = parser.parse_args(argv)
+    config = dict(QUICK if args.quick else FULL, profile=args.latency)
+
+    work = tempfile.mkdtemp(prefix="player-bench-")
+    # Private caches, so loudness, peak and metadata caches of earlier runs do not help
+    os.environ["XDG_CACHE_HOME"] = os.path.join(work, "cache")
+    fixtures = synthesize(work, config["seconds"])
+    tag_fixtures(fixtures)
+    results = Results()
+    try:
+        for group in args.only or GROUPS:
+            globals()["bench_" + group](results, fixtures, config)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    # ru_maxrss is in KiB on Linux
+    results.add(
+        "memory.max_rss_mib", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, "MiB", tolerance=0.5
+    )
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "quick": args.quick,
+        "profile": args.latency,
+        "metrics": results.metrics,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        return 0
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("quick") != args.quick:
+        print("\nbaseline was recorded with%s --quick; not comparing" % ("" if baseline.get("quick") else "out"))
+        return 0
+    if baseline.get("profile", "balanced") != args.latency:
+        print("\nbaseline was recorded with the %s latency profile; not comparing" % baseline.get("profile"))
+        return 0
+    regressions = compare(results.metrics, baseline["metrics"], args.threshold)
+    if regressions:
+        print("\n%d regression(s) beyond tolerance" % len(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
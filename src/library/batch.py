@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.file_utils import file_identity, is_audio_file
+
+BatchProgress = namedtuple(
+    "BatchProgress", "total analyzed failed elapsed tracks_per_min done"
+)
+
+
+def audio_files(targets):
+    """Decodable audio files in ``targets``, which are files or folders."""
+    from player.backends import can_decode
+
+    for target in targets:
+        if os.path.isdir(target):
+            for root, dirs, files in os.walk(target):
+                for name in files:
+                    if is_audio_file(name) and can_decode(name):
+                        yield os.path.join(root, name)
+        else:
+            yield target
+
+
+class BatchScanner:
+    """Runs a per-file analysis over a process pool, caching the results.
+
+    ``analyze(identity)`` must be a module-level function taking
+    ``(path, size, mtime)`` and returning one cache row.  The cache provides
+    ``identities()`` and ``upsert(rows)``; files whose identity it already
+    holds are skipped.
+    """
+
+    def __init__(self, cache, analyze, max_workers=None, batch_size=50):
+        self.cache = cache
+        self.analyze = analyze
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def scan(self, paths, progress=None):
+        """Analyze every path whose identity changed; returns a BatchProgress.
+
+        ``progress`` is called with a BatchProgress after every track.
+        """
+        start = time.perf_counter()
+        known = self.cache.identities()
+        todo = []
+        for path in paths:
+            try:
+                identity = file_identity(path)
+            except OSError:
+                continue
+            if known.get(identity[0]) != identity[1:]:
+                todo.append(identity)
+        analyzed = failed = 0
+        batch = []
+
+        def report(done=False):
+            elapsed = time.perf_counter() - start
+            rate = analyzed * 60 / elapsed if elapsed > 0 else 0.0
+            state = BatchProgress(len(todo), analyzed, failed, elapsed, rate, done)
+            if progress is not None:
+                progress(state)
+            return state
+
+        if todo:
+            # Spawn rather than fork: the GUI process runs audio and Qt threads
+            pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            try:
+                futures = [pool.submit(self.analyze, identity) for identity in todo]
+                for future in as_completed(futures):
+                    if self._cancelled.is_set():
+                        break
+                    try:
+                        batch.append(future.result())
+                        analyzed += 1
+                    except Exception:
+                        # Undecodable files are retried on the next scan
+                        failed += 1
+                    if len(batch) >= self.batch_size:
+                        self.cache.upsert(batch)
+                        batch = []
+                    report()
+            finally:
+                pool.shutdown(wait=not self._cancelled.is_set(), cancel_futures=True)
+        if batch:
+            self.cache.upsert(batch)
+        return report(done=True)
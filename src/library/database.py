@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import threading
+
+from utils.file_utils import cache_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS idx_tracks_artist ON tracks(artist);
+CREATE INDEX IF NOT EXISTS idx_tracks_album ON tracks(album);
+CREATE INDEX IF NOT EXISTS idx_tracks_title ON tracks(title);
+"""
+
+
+def _prefix_range(root):
+    # Paths under ``root`` sort between "root/" and "root0" ("0" follows "/")
+    root = os.path.join(os.path.abspath(root), "")
+    return root, root[:-1] + chr(ord(os.sep) + 1)
+
+
+class LibraryDatabase:
+    """SQLite index of every known track with its file identity and tags."""
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = os.path.join(cache_dir(), "library.sqlite")
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def identities(self, root):
+        """Map every stored path under ``root`` to its ``(size, mtime)``."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, size, mtime FROM tracks WHERE path >= ? AND path < ?",
+                _prefix_range(root),
+            ).fetchall()
+        return {path: (size, mtime) for path, size, mtime in rows}
+
+    def upsert(self, rows):
+        """Insert or update ``(path, size, mtime, title, artist, album, duration)`` rows."""
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO tracks (path, size, mtime, title, artist, album, duration)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(path) DO UPDATE SET size = excluded.size,"
+                " mtime = excluded.mtime, title = excluded.title,"
+                " artist = excluded.artist, album = excluded.album,"
+                " duration = excluded.duration",
+                rows,
+            )
+            self._db.commit()
+
+    def remove(self, paths):
+        with self._lock:
+            self._db.executemany(
+                "DELETE FROM tracks WHERE path = ?", [(path,) for path in paths]
+            )
+            self._db.commit()
+
+    def paths(self, root=None):
+        """All stored paths, optionally limited to those under ``root``."""
+        with self._lock:
+            if root is None:
+                rows = self._db.execute("SELECT path FROM tracks ORDER BY path")
+            else:
+                rows = self._db.execute(
+                    "SELECT path FROM tracks WHERE path >= ? AND path < ? ORDER BY path",
+                    _prefix_range(root),
+                )
+            return [row[0] for row in rows]
+
+    def tags(self, path):
+        """Stored ``{"title", "artist", "album"}`` of ``path``, or ``None``."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT title, artist, album FROM tracks WHERE path = ?", (path,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("title", "artist", "album"), row))
+
+    def find(self, artist=None, album=None, title=None):
+        """Tracks matching every given tag exactly, as row tuples."""
+        clauses, params = [], []
+        for column, value in (("artist", artist), ("album", album), ("title", title)):
+            if value is not None:
+                clauses.append("%s = ?" % column)
+                params.append(value)
+        sql = "SELECT path, title, artist, album, duration FROM tracks"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,345 @@
+"""Acoustic duplicate detection: the same recording in different files.
+
+Each track gets a chroma fingerprint of its first two minutes: the audio is
+downmixed and resampled to 11025 Hz, framed, and every frame's spectrum
+(one batched FFT per decoded block) is folded onto the twelve pitch
+classes.  Each frame is reduced to 32 bits comparing neighbouring pitch
+classes and the same class a little later in time.  Such bits survive lossy
+encoding, resampling and level changes.
+
+Tokens pair the three strongest pitch classes of frames two apart.  A
+MinHash signature of each track's token set is banded into a
+locality-sensitive hash index, so only tracks that share a bucket are ever
+compared.  Candidates are confirmed by the bit error rate of their
+fingerprints at the best alignment.
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+from library.batch import BatchScanner, audio_files
+from utils.file_utils import cache_dir
+
+RATE = 11025
+FRAME = 4096
+HOP = FRAME // 3
+MAX_SECONDS = 120
+SILENCE = 1e-3  # Frame RMS below -60 dBFS carries no tokens
+BANDS = 64
+ROWS = 3  # Near-certain match at token Jaccard 0.4, rare at 0.05
+MAX_BUCKET = 200  # Buckets shared by more tracks say nothing about them
+MAX_OFFSET = 8  # Frames either way, about a second
+MAX_BIT_ERRORS = 0.15  # Unrelated tracks sit near 0.5
+MIN_TOKENS = 20
+MIN_OVERLAP = 20  # Frames two fingerprints must share at an alignment
+DURATION_TOLERANCE = (2.0, 0.02)  # Seconds, and share of the longer track
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    duration REAL,
+    fingerprint BLOB,
+    signature BLOB
+);
+"""
+
+_rng = np.random.default_rng(0x5EED)
+PRIME = (1 << 31) - 1
+HASH_A = _rng.integers(1, PRIME, BANDS * ROWS, dtype=np.uint64)[:, None]
+HASH_B = _rng.integers(0, PRIME, BANDS * ROWS, dtype=np.uint64)[:, None]
+
+
+def chroma_filter():
+    """``(bins, 12)`` matrix folding FFT bins between 28 Hz and 3.5 kHz onto pitch classes."""
+    freqs = np.fft.rfftfreq(FRAME, 1 / RATE)
+    used = np.flatnonzero((freqs >= 28) & (freqs <= 3520))
+    notes = np.round(12 * np.log2(freqs[used] / 440) + 69).astype(int)
+    matrix = np.zeros((len(freqs), 12), dtype="float32")
+    matrix[used, notes % 12] = 1.0
+    return matrix
+
+
+class Fingerprinter:
+    """Builds a fingerprint from blocks of any size, in the file's own format."""
+
+    def __init__(self, samplerate, channels):
+        from player.resampler import Resampler, mix_matrix
+
+        self.mix = mix_matrix(channels, 1)
+        self.resampler = Resampler(samplerate, RATE, 1) if samplerate != RATE else None
+        self.window = np.hanning(FRAME).astype("float32")
+        self.filter = chroma_filter()
+        self._tail = np.zeros(0, dtype="float32")
+        self._chroma = []
+        self._loud = []
+        self.frames = 0
+
+    @property
+    def full(self):
+        return self.frames * HOP >= MAX_SECONDS * RATE
+
+    def process(self, block):
+        mono = block @ self.mix
+        if self.resampler is not None:
+            mono = self.resampler.process(mono)
+        samples = np.concatenate((self._tail, mono[:, 0]))
+        count = max(0, (len(samples) - FRAME) // HOP + 1)
+        if count:
+            frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME)[::HOP][:count]
+            spectrum = np.fft.rfft(frames * self.window, axis=1)
+            power = spectrum.real ** 2 + spectrum.imag ** 2
+            self._chroma.append(power @ self.filter)
+            self._loud.append(np.sqrt(np.mean(frames**2, axis=1)) > SILENCE)
+            self.frames += count
+        self._tail = samples[count * HOP :]
+
+    def finish(self):
+        """``(fingerprint, tokens)``: one uint32 per frame and the token set."""
+        if not self._chroma:
+            return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint64)
+        count = MAX_SECONDS * RATE // HOP
+        chroma = np.concatenate(self._chroma)[:count]
+        loud = np.concatenate(self._loud)[:count]
+        chroma /= np.maximum(chroma.sum(axis=1, keepdims=True), 1e-12)
+        # Three-frame moving average steadies the comparisons
+        padded = np.concatenate((chroma[:1], chroma, chroma[-1:]))
+        chroma = (padded[:-2] + padded[1:-1] + padded[2:]) / 3
+        later = np.concatenate((chroma[2:], chroma[-1:].repeat(2, axis=0)))[:, :8]
+        bits = np.concatenate(
+            (
+                chroma > np.roll(chroma, -1, axis=1),
+                chroma > np.roll(chroma, -4, axis=1),
+                later > chroma[:, :8],
+            ),
+            axis=1,
+        )
+        weights = np.left_shift(np.uint64(1), np.arange(32, dtype=np.uint64))
+        prints = (bits.astype(np.uint64) @ weights).astype(np.uint32)
+        return prints, tokens(chroma, loud)
+
+
+def tokens(chroma, loud):
+    """Sets of the three strongest pitch classes in frames two apart, as integers."""
+    strongest = np.argsort(-chroma, axis=1)[:, :3]
+    sets = np.left_shift(1, strongest).sum(axis=1).astype(np.uint64)
+    both = loud[:-2] & loud[2:]
+    return np.unique((sets[:-2] << np.uint64(12) | sets[2:])[both])
+
+
+def signature(token_set):
+    """MinHash of ``token_set``, ``BANDS * ROWS`` values."""
+    if not len(token_set):
+        return np.full(BANDS * ROWS, PRIME, dtype=np.uint32)
+    hashed = (HASH_A * token_set[None, :] + HASH_B) % PRIME
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def bit_error_rate(a, b, max_offset=MAX_OFFSET):
+    """Share of differing bits at the best alignment of two fingerprints."""
+    best = 1.0
+    for offset in range(-max_offset, max_offset + 1):
+        x = a[max(offset, 0) :]
+        y = b[max(-offset, 0) :]
+        n = min(len(x), len(y))
+        if n < MIN_OVERLAP:
+            continue
+        errors = np.unpackbits((x[:n] ^ y[:n]).view(np.uint8)).sum()
+        best = min(best, errors / (32 * n))
+    return best
+
+
+def fingerprint(identity, blocksize=65536):
+    """Fingerprint one file; runs in worker processes on plain values.
+
+    Returns ``(path, size, mtime, duration, fingerprint, signature)``, the
+    last two as bytes.
+    """
+    from player.backends import open_backend
+
+    path, size, mtime = identity
+    source = open_backend(path)
+    try:
+        duration = source.frames / source.samplerate
+        printer = Fingerprinter(source.samplerate, source.channels)
+        buffer = np.empty((blocksize, source.channels), dtype="float32")
+        # Only the start of the track is needed
+        while not printer.full:
+            block = source.read(buffer)
+            if not len(block):
+                break
+            printer.process(block)
+    finally:
+        source.close()
+    prints, found = printer.finish()
+    sig = signature(found) if len(found) >= MIN_TOKENS else None
+    return (
+        path,
+        size,
+        mtime,
+        duration,
+        prints.tobytes(),
+        sig.tobytes() if sig is not None else None,
+    )
+
+
+class FingerprintCache:
+    """SQLite store of fingerprints, valid while a file's identity holds."""
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = os.path.join(cache_dir(), "fingerprints.sqlite")
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def identities(self):
+        with self._lock:
+            rows = self._db.execute("SELECT path, size, mtime FROM fingerprints").fetchall()
+        return {path: (size, mtime) for path, size, mtime in rows}
+
+    def upsert(self, rows):
+        """Insert or replace rows as returned by ``fingerprint()``."""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._db.commit()
+
+    def signatures(self):
+        """``(path, duration, signature)`` for every track with enough tokens."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, duration, signature FROM fingerprints"
+                " WHERE signature IS NOT NULL"
+            ).fetchall()
+        return [
+            (path, duration, np.frombuffer(sig, dtype=np.uint32))
+            for path, duration, sig in rows
+        ]
+
+    def fingerprint(self, path):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fingerprint FROM fingerprints WHERE path = ?", (path,)
+            ).fetchone()
+        return np.frombuffer(row[0], dtype=np.uint32) if row else None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def duration_bin(seconds):
+    # Bins are 0.02 * (100 + seconds) wide: at least DURATION_TOLERANCE, so
+    # tracks close enough in length are never more than one bin apart
+    return int(np.log1p(seconds / 100) / 0.02)
+
+
+class DuplicateIndex:
+    """LSH buckets over MinHash signatures; yields likely duplicate pairs.
+
+    Bucket keys include a coarse duration bin, and each track goes into its
+    own bin and the next, so tracks of clearly different length never meet.
+    """
+
+    def __init__(self):
+        self.paths = []
+        self.durations = []
+        self._buckets = {}
+
+    def add(self, path, duration, sig):
+        doc = len(self.paths)
+        self.paths.append(path)
+        self.durations.append(duration)
+        length = duration_bin(duration)
+        for band, rows in enumerate(sig.reshape(BANDS, ROWS)):
+            key = rows.tobytes()
+            for slot in (length, length + 1):
+                self._buckets.setdefault((band, slot, key), []).append(doc)
+
+    def candidates(self):
+        """Pairs of documents sharing at least one bucket, each pair once."""
+        pairs = set()
+        for docs in self._buckets.values():
+            if len(docs) < 2 or len(docs) > MAX_BUCKET:
+                continue
+            for i, a in enumerate(docs):
+                for b in docs[i + 1 :]:
+                    pairs.add((a, b))
+        return pairs
+
+    def similar_duration(self, a, b):
+        da, db = self.durations[a], self.durations[b]
+        seconds, share = DURATION_TOLERANCE
+        return abs(da - db) <= max(seconds, share * max(da, db))
+
+
+class DuplicateFinder(BatchScanner):
+    """Fingerprints tracks across a process pool and groups duplicates."""
+
+    def __init__(self, cache=None, max_workers=None, batch_size=50):
+        cache = cache if cache is not None else FingerprintCache()
+        super().__init__(cache, fingerprint, max_workers, batch_size)
+
+    def find(self, paths, progress=None):
+        """Groups of paths holding the same recording, largest first.
+
+        Only changed files are fingerprinted; ``progress`` is as for ``scan``.
+        """
+        paths = [os.path.abspath(path) for path in paths]
+        self.scan(paths, progress)
+        wanted = set(paths)
+        index = DuplicateIndex()
+        for path, duration, sig in self.cache.signatures():
+            if path in wanted:
+                index.add(path, duration, sig)
+        parent = list(range(len(index.paths)))
+
+        def root(doc):
+            while parent[doc] != doc:
+                parent[doc] = parent[parent[doc]]
+                doc = parent[doc]
+            return doc
+
+        # Pairs come sorted, so the first track of each stays cached a while
+        load = lru_cache(maxsize=1024)(lambda doc: self.cache.fingerprint(index.paths[doc]))
+        for a, b in sorted(index.candidates()):
+            if root(a) == root(b) or not index.similar_duration(a, b):
+                continue
+            if bit_error_rate(load(a), load(b)) <= MAX_BIT_ERRORS:
+                parent[root(b)] = root(a)
+        groups = {}
+        for doc in range(len(index.paths)):
+            groups.setdefault(root(doc), []).append(index.paths[doc])
+        found = [sorted(group) for group in groups.values() if len(group) > 1]
+        found.sort(key=lambda group: (-len(group), group))
+        return found
+
+
+if __name__ == "__main__":
+    finder = DuplicateFinder()
+    groups = finder.find(
+        list(audio_files(sys.argv[1:])),
+        lambda p: print(
+            "\r%d/%d tracks fingerprinted, %.1f tracks/min"
+            % (p.analyzed + p.failed, p.total, p.tracks_per_min),
+            end="",
+            flush=True,
+        ),
+    )
+    print("\r\033[K%d groups of duplicates" % len(groups))
+    for group in groups:
+        print()
+        for path in group:
+            print("  " + path)
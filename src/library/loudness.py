@@ -0,0 +1,261 @@
+"""EBU R128 / ITU-R BS.1770 loudness analysis and its persistent cache.
+
+Tracks are decoded block by block and K-weighted with two biquads run by
+``scipy.signal.sosfilt`` over all channels at once.  Mean square power is
+summed per 100 ms step, so the gated 400 ms blocks (75% overlap) are formed
+at the end from a small array.  The true peak is measured on the 4x
+oversampled signal.
+"""
+
+import math
+import os
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+
+from library.batch import BatchScanner, audio_files
+from utils.file_utils import cache_dir, file_identity
+
+REFERENCE_LUFS = -18.0  # ReplayGain 2.0 target level
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+STEP_SECONDS = 0.1
+STEPS_PER_BLOCK = 4  # 400 ms gating blocks
+TRUE_PEAK_TAPS = 12  # Per phase, as in the BS.1770 reference interpolator
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS loudness (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    integrated REAL,
+    true_peak REAL,
+    gain REAL
+);
+"""
+
+
+def k_weighting_sos(samplerate):
+    """BS.1770 pre-filter (high shelf) and RLB high-pass for any sample rate."""
+    # Analog prototype parameters that reproduce the 48 kHz coefficients
+    k = math.tan(math.pi * 1681.974450955533 / samplerate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [
+        (vh + vb * k / q + k * k) / a0,
+        2 * (k * k - vh) / a0,
+        (vh - vb * k / q + k * k) / a0,
+        1.0,
+        2 * (k * k - 1) / a0,
+        (1 - k / q + k * k) / a0,
+    ]
+    k = math.tan(math.pi * 38.13547087602444 / samplerate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    highpass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return np.array([shelf, highpass])
+
+
+def channel_weights(channels):
+    if channels == 6:
+        # L, R, C, LFE, Ls, Rs: LFE is ignored and surrounds count +1.5 dB
+        return np.array([1.0, 1.0, 1.0, 0.0, 1.41, 1.41])
+    return np.ones(channels)
+
+
+class LoudnessMeter:
+    """Integrated loudness and true peak of a stream fed in blocks of any size."""
+
+    def __init__(self, samplerate, channels):
+        from scipy.signal import lfilter, sosfilt
+
+        from player.resampler import polyphase_bank
+
+        self._sosfilt = sosfilt
+        self._lfilter = lfilter
+        self.samplerate = samplerate
+        self.sos = k_weighting_sos(samplerate)
+        self.weights = channel_weights(channels)
+        self.step = max(1, round(samplerate * STEP_SECONDS))
+        self._zi = np.zeros((len(self.sos), 2, channels))
+        self._steps = []  # Weighted sum of squares per completed step
+        self._partial = 0.0
+        self._partial_frames = 0
+        # BS.1770 oversamples 4x below 96 kHz, 2x below 192 kHz
+        factor = 4 if samplerate < 96000 else 2 if samplerate < 192000 else 1
+        # Each phase of the interpolator is a short FIR; only the peak over
+        # all phases matters, so the output is never interleaved
+        self.phases = polyphase_bank(factor, 1, TRUE_PEAK_TAPS)
+        self._phase_zi = np.zeros((factor, TRUE_PEAK_TAPS - 1, channels))
+        self.peak = 0.0
+
+    def process(self, block):
+        if not len(block):
+            return
+        self._oversample_peak(block)
+        filtered, self._zi = self._sosfilt(self.sos, block, axis=0, zi=self._zi)
+        energy = np.square(filtered) @ self.weights
+        # Top up the step left open by the previous block first
+        take = min(self.step - self._partial_frames, len(energy))
+        self._partial += float(energy[:take].sum())
+        self._partial_frames += take
+        if self._partial_frames < self.step:
+            return
+        self._steps.append(np.array([self._partial]))
+        rest = energy[take:]
+        whole = len(rest) // self.step * self.step
+        if whole:
+            self._steps.append(rest[:whole].reshape(-1, self.step).sum(axis=1))
+        self._partial = float(rest[whole:].sum())
+        self._partial_frames = len(rest) - whole
+
+    def _oversample_peak(self, block):
+        for i, taps in enumerate(self.phases):
+            out, self._phase_zi[i] = self._lfilter(
+                taps, 1.0, block, axis=0, zi=self._phase_zi[i]
+            )
+            self.peak = max(self.peak, float(out.max()), -float(out.min()))
+
+    def integrated(self):
+        """Gated loudness in LUFS, or ``None`` for silence or very short input."""
+        steps = np.concatenate(self._steps) if self._steps else np.zeros(0)
+        if len(steps) < STEPS_PER_BLOCK:
+            return None
+        sums = np.convolve(steps, np.ones(STEPS_PER_BLOCK), mode="valid")
+        power = sums / (STEPS_PER_BLOCK * self.step)
+        with np.errstate(divide="ignore"):
+            loudness = -0.691 + 10 * np.log10(power)
+        gated = power[loudness > ABSOLUTE_GATE]
+        if not len(gated):
+            return None
+        threshold = -0.691 + 10 * math.log10(gated.mean()) + RELATIVE_GATE
+        gated = power[(loudness > ABSOLUTE_GATE) & (loudness > threshold)]
+        return -0.691 + 10 * math.log10(gated.mean())
+
+    def true_peak(self):
+        """Oversampled peak in dBTP."""
+        if self._phase_zi.any():
+            # Let the filters ring out after the last sample
+            self._oversample_peak(np.zeros((TRUE_PEAK_TAPS - 1, self._phase_zi.shape[2])))
+        return 20 * math.log10(self.peak) if self.peak > 0 else None
+
+
+def analyze(identity, blocksize=65536):
+    """Measure one file; runs in worker processes on plain values.
+
+    Returns ``(path, size, mtime, integrated, true_peak, gain)``.
+    """
+    from player.backends import open_backend
+
+    path, size, mtime = identity
+    source = open_backend(path)
+    try:
+        meter = LoudnessMeter(source.samplerate, source.channels)
+        buffer = np.empty((blocksize, source.channels), dtype="float32")
+        while True:
+            block = source.read(buffer)
+            if not len(block):
+                break
+            meter.process(block)
+    finally:
+        source.close()
+    integrated = meter.integrated()
+    gain = REFERENCE_LUFS - integrated if integrated is not None else None
+    return path, size, mtime, integrated, meter.true_peak(), gain
+
+
+class LoudnessCache:
+    """SQLite store of analysis results, valid while a file's identity holds."""
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = os.path.join(cache_dir(), "loudness.sqlite")
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def identities(self):
+        with self._lock:
+            rows = self._db.execute("SELECT path, size, mtime FROM loudness").fetchall()
+        return {path: (size, mtime) for path, size, mtime in rows}
+
+    def lookup(self, path):
+        """``(integrated, true_peak, gain)`` for the file as it is now, or ``None``."""
+        try:
+            path, size, mtime = file_identity(path)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT integrated, true_peak, gain FROM loudness"
+                " WHERE path = ? AND size = ? AND mtime = ?",
+                (path, size, mtime),
+            ).fetchone()
+        return row
+
+    def upsert(self, rows):
+        """Insert or replace ``(path, size, mtime, integrated, true_peak, gain)`` rows."""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO loudness VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def stored_gain(path):
+    """Cached ReplayGain in dB for ``path``, or ``None`` if it was not analyzed.
+
+    The gain is lowered where needed so the true peak stays below 0 dBTP.
+    """
+    global _shared
+    try:
+        with _shared_lock:
+            if _shared is None:
+                _shared = LoudnessCache()
+        row = _shared.lookup(path)
+    except sqlite3.Error:
+        return None
+    if row is None or row[2] is None:
+        return None
+    _, peak, gain = row
+    return min(gain, -peak) if peak is not None else gain
+
+
+class LoudnessScanner(BatchScanner):
+    """Analyzes tracks missing from the cache across a pool of processes."""
+
+    def __init__(self, cache=None, max_workers=None, batch_size=50):
+        cache = cache if cache is not None else LoudnessCache()
+        super().__init__(cache, analyze, max_workers, batch_size)
+
+
+if __name__ == "__main__":
+    scanner = LoudnessScanner()
+    result = scanner.scan(
+        list(audio_files(sys.argv[1:])),
+        lambda p: print(
+            "\r%d/%d tracks, %.1f tracks/min" % (p.analyzed + p.failed, p.total, p.tracks_per_min),
+            end="",
+            flush=True,
+        ),
+    )
+    print(
+        "\r%d tracks analyzed, %d failed in %.1fs (%.1f tracks/min)"
+        % (result.analyzed, result.failed, result.elapsed, result.tracks_per_min)
+    )
@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from library.database import LibraryDatabase
+from utils.file_utils import is_audio_file
+from utils.metadata_utils import get_metadata_and_album_art
+
+ScanProgress = namedtuple(
+    "ScanProgress", "found updated removed elapsed files_per_sec done"
+)
+
+
+def _scan_directory(path):
+    """List one directory: playable files with their identity, and subdirectories."""
+    from player.backends import can_decode
+
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif (
+                        entry.is_file() and is_audio_file(entry.name) and can_decode(entry.name)
+                    ):
+                        st = entry.stat()
+                        files.append((entry.path, st.st_size, st.st_mtime_ns))
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return files, subdirs
+
+
+def _read_tags(identity):
+    path, size, mtime = identity
+    try:
+        meta, _ = get_metadata_and_album_art(path)
+    except Exception:
+        # Corrupt or unsupported tags should not abort the whole scan
+        meta = {}
+    return (
+        path,
+        size,
+        mtime,
+        meta.get("title") or None,
+        meta.get("artist") or None,
+        meta.get("album") or None,
+        meta.get("duration"),
+    )
+
+
+class LibraryScanner:
+    """Walks folders in parallel and keeps a LibraryDatabase up to date.
+
+    Rescans are incremental: only files whose size or mtime differ from the
+    database are opened to read tags.
+    """
+
+    def __init__(self, database=None, workers=8, batch_size=500):
+        self.database = database if database is not None else LibraryDatabase()
+        self.workers = workers
+        self.batch_size = batch_size
+
+    def walk(self, root, pool):
+        """Yield ``(path, size, mtime_ns)`` for every audio file under ``root``."""
+        pending = {pool.submit(_scan_directory, os.path.abspath(root))}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                for subdir in subdirs:
+                    pending.add(pool.submit(_scan_directory, subdir))
+                yield from files
+
+    def scan(self, root, progress=None):
+        """Bring the database in line with ``root``; returns the final ScanProgress.
+
+        ``progress`` is called with a ScanProgress after every database batch.
+        """
+        start = time.perf_counter()
+        known = self.database.identities(root)
+        found = updated = removed = 0
+        seen = set()
+        batch = []
+
+        def report(done=False):
+            elapsed = time.perf_counter() - start
+            rate = found / elapsed if elapsed > 0 else 0.0
+            state = ScanProgress(found, updated, removed, elapsed, rate, done)
+            if progress is not None:
+                progress(state)
+            return state
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            changed = []
+            for identity in self.walk(root, pool):
+                found += 1
+                seen.add(identity[0])
+                if known.get(identity[0]) != identity[1:]:
+                    changed.append(identity)
+                if found % self.batch_size == 0:
+                    report()
+            for row in pool.map(_read_tags, changed):
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self.database.upsert(batch)
+                    updated += len(batch)
+                    batch = []
+                    report()
+        if batch:
+            self.database.upsert(batch)
+            updated += len(batch)
+        gone = [path for path in known if path not in seen]
+        if gone:
+            self.database.remove(gone)
+            removed = len(gone)
+        return report(done=True)
+
+
+if __name__ == "__main__":
+    scanner = LibraryScanner()
+    for folder in sys.argv[1:]:
+        result = scanner.scan(
+            folder,
+            lambda p: print(
+                "\r%d files, %d updated, %.0f files/sec"
+                % (p.found, p.updated, p.files_per_sec),
+                end="",
+                flush=True,
+            ),
+        )
+        print(
+            "\r%s: %d files, %d updated, %d removed in %.1fs (%.0f files/sec)"
+            % (
+                folder,
+                result.found,
+                result.updated,
+                result.removed,
+                result.elapsed,
+                result.files_per_sec,
+            )
+        )
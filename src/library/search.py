@@ -0,0 +1,273 @@
+"""In-memory search over track tags and file names.
+
+Every track is a document with title, artist, album and the tail of its path.
+Terms of three or more characters are found through a trigram inverted
+index; shorter ones match the start of a word through a sorted vocabulary.
+Postings are ``array('i')`` lists of document ids that only ever grow, so
+adding tracks, or the tags of a track indexed by path alone, never has to
+rebuild anything.
+"""
+
+import bisect
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from collections import namedtuple
+
+import numpy as np
+
+FIELDS = ("title", "artist", "album")
+PATH_PARTS = 3  # Folder names above the file are usually artist and album
+WORD = re.compile(r"\w+")
+VERIFY_LIMIT = 5000  # Candidates checked for an exact substring match
+
+SearchResult = namedtuple("SearchResult", "query paths labels total artists albums")
+
+
+def normalize(text):
+    """Case- and accent-insensitive form used for indexing and queries."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    if text.isascii():
+        return text
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def path_text(path):
+    parts = os.path.normpath(path).split(os.sep)[-PATH_PARTS:]
+    parts[-1] = os.path.splitext(parts[-1])[0]
+    return " ".join(parts)
+
+
+class SearchIndex:
+    """Trigram and word-prefix index with artist/album facets.
+
+    Not thread-safe on its own; SearchService serializes access.
+    """
+
+    def __init__(self):
+        self.paths = []
+        self.tags = []  # doc -> (title, artist, album)
+        self._ids = {}
+        self._texts = []  # doc -> normalized fields joined by "\n"
+        self._grams = {}
+        self._words = {}
+        self._vocabulary = []  # Sorted words, for prefix lookups
+        self._facets = {"artist": ({}, [""]), "album": ({}, [""])}  # value -> id, names
+        self._artist = array("i")
+        self._album = array("i")
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, path):
+        return path in self._ids
+
+    def add(self, path, meta=None):
+        """Index ``path``; calling again with ``meta`` adds its tags."""
+        doc = self._ids.get(path)
+        if doc is None:
+            doc = len(self.paths)
+            self._ids[path] = doc
+            self.paths.append(path)
+            self.tags.append(("", "", ""))
+            self._texts.append("")
+            self._artist.append(0)
+            self._album.append(0)
+            self._extend(doc, normalize(path_text(path)))
+        if meta:
+            tags = tuple(str(meta.get(field) or "") for field in FIELDS)
+            if tags != self.tags[doc] and any(tags):
+                self.tags[doc] = tags
+                self._artist[doc] = self._facet_id("artist", tags[1])
+                self._album[doc] = self._facet_id("album", tags[2])
+                # Postings only grow: superseded tags stay findable, which
+                # is harmless since tags rarely change within a session
+                self._extend(doc, "\n".join(normalize(t) for t in tags if t))
+        return doc
+
+    def _extend(self, doc, text):
+        old = self._texts[doc]
+        grams = set()
+        for field in text.split("\n"):
+            grams.update(field[i : i + 3] for i in range(len(field) - 2))
+        index = self._grams
+        for gram in grams:
+            # Grams never span fields, so this is "old already has it"
+            if gram in old:
+                continue
+            posting = index.get(gram)
+            if posting is None:
+                posting = index[gram] = array("i")
+            posting.append(doc)
+        old_words = set(WORD.findall(old))
+        for word in set(WORD.findall(text)) - old_words:
+            posting = self._words.get(word)
+            if posting is None:
+                posting = self._words[word] = array("i")
+                bisect.insort(self._vocabulary, word)
+            posting.append(doc)
+        self._texts[doc] = old + "\n" + text if old else text
+
+    def _facet_id(self, facet, value):
+        ids, names = self._facets[facet]
+        key = normalize(value)
+        if not key:
+            return 0
+        found = ids.get(key)
+        if found is None:
+            found = ids[key] = len(names)
+            names.append(value)
+        return found
+
+    def _posting_mask(self, posting):
+        mask = np.zeros(len(self.paths), dtype=bool)
+        mask[np.frombuffer(posting, dtype=np.int32)] = True
+        return mask
+
+    def _match_term(self, term):
+        """Boolean mask of the documents containing ``term``."""
+        if len(term) < 3:
+            mask = np.zeros(len(self.paths), dtype=bool)
+            start = bisect.bisect_left(self._vocabulary, term)
+            for word in self._vocabulary[start:]:
+                if not word.startswith(term):
+                    break
+                mask[np.frombuffer(self._words[word], dtype=np.int32)] = True
+            return mask
+        postings = []
+        for gram in trigrams(term):
+            posting = self._grams.get(gram)
+            if posting is None:
+                return np.zeros(len(self.paths), dtype=bool)
+            postings.append(posting)
+        postings.sort(key=len)
+        mask = self._posting_mask(postings[0])
+        for posting in postings[1:]:
+            mask &= self._posting_mask(posting)
+        if len(term) > 3:
+            # Having all trigrams does not make a substring.  Large candidate
+            # sets are left as they are: false hits need every trigram of the
+            # term elsewhere in the same track, and checking them one by one
+            # would blow the latency budget for the broadest queries
+            docs = np.flatnonzero(mask)
+            if len(docs) <= VERIFY_LIMIT:
+                texts = self._texts
+                mask[[d for d in docs.tolist() if term not in texts[d]]] = False
+        return mask
+
+    def search(self, query, artist=None, album=None, limit=500, facets=10):
+        """Documents matching every word of ``query``, optionally one facet value.
+
+        Returns a SearchResult with up to ``limit`` paths in index order and
+        their display labels, the total number of matches, and the ``facets``
+        most common artists and albums among them as ``(name, count)`` pairs.
+        """
+        mask = None
+        for term in normalize(query).split():
+            found = self._match_term(term)
+            if mask is None:
+                mask = found
+            else:
+                mask &= found
+        for facet, value, column in (("artist", artist, self._artist), ("album", album, self._album)):
+            if value is not None:
+                wanted = self._facets[facet][0].get(normalize(value), -1)
+                found = np.frombuffer(column, dtype=np.int32) == wanted
+                if mask is None:
+                    mask = found
+                else:
+                    mask &= found
+        if mask is None:
+            docs = np.arange(len(self.paths))
+        else:
+            docs = np.flatnonzero(mask)
+        shown = docs[:limit].tolist()
+        return SearchResult(
+            query,
+            [self.paths[d] for d in shown],
+            [self.label(d) for d in shown],
+            len(docs),
+            self._top("artist", np.frombuffer(self._artist, dtype=np.int32)[docs], facets),
+            self._top("album", np.frombuffer(self._album, dtype=np.int32)[docs], facets),
+        )
+
+    def label(self, doc):
+        title, artist, _ = self.tags[doc]
+        if not title:
+            return os.path.basename(self.paths[doc])
+        return "%s – %s" % (artist, title) if artist else title
+
+    def _top(self, facet, column, count):
+        names = self._facets[facet][1]
+        counts = np.bincount(column, minlength=len(names))
+        counts[0] = 0  # Untagged
+        top = np.argsort(counts)[::-1][:count]
+        return [(names[i], int(counts[i])) for i in top.tolist() if counts[i]]
+
+
+class SearchService:
+    """Owns a SearchIndex on a worker thread, off the GUI thread.
+
+    Updates are applied in the order they arrive.  Only the newest query is
+    kept: while typing, intermediate queries that were not started yet are
+    dropped.  ``tags(path)`` supplies known tags for newly added paths.
+    """
+
+    def __init__(self, tags=None, chunk=2000):
+        self.index = SearchIndex()
+        self.tags = tags
+        self.chunk = chunk
+        self._updates = []
+        self._query = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="search", daemon=True)
+        self._thread.start()
+
+    def add(self, paths):
+        with self._cond:
+            self._updates.extend((path, None) for path in paths)
+            self._cond.notify()
+
+    def update(self, path, meta):
+        with self._cond:
+            self._updates.append((path, meta))
+            self._cond.notify()
+
+    def query(self, text, on_result, artist=None, album=None):
+        """Run a search; ``on_result(SearchResult)`` is called on the worker thread."""
+        with self._cond:
+            self._query = (text, artist, album, on_result)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _run(self):
+        index = self.index
+        while True:
+            with self._cond:
+                while not (self._closed or self._query or self._updates):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                query, self._query = self._query, None
+                batch = self._updates[: self.chunk]
+                del self._updates[: self.chunk]
+            # A pending query goes first; big additions are applied in chunks
+            # so typing stays responsive while a library is being indexed
+            if query is not None:
+                text, artist, album, on_result = query
+                on_result(index.search(text, artist=artist, album=album))
+            for path, meta in batch:
+                if meta is None and path not in index and self.tags is not None:
+                    meta = self.tags(path)
+                index.add(path, meta)
@@ -1,3 +1,7 @@
+import time
+
+START = time.perf_counter()
+
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtGui import QIcon
 import sys, os
@@ -10,10 +14,31 @@ def resource_path(relative_path):
 
 
 if __name__ == "__main__":
+    import multiprocessing
+
+    # Spawned pool workers of a frozen build must not start another GUI
+    multiprocessing.freeze_support()
+    profile = None
+    if "--profile-startup" in sys.argv:
+        from utils.startup_profile import StartupProfile, relaunch, under_importtime
+
+        if not under_importtime():
+            sys.exit(relaunch(sys.argv))
+        profile = StartupProfile(START)
+        profile.mark("import Qt")
     app = QApplication(sys.argv)
     app.setWindowIcon(QIcon(resource_path("src/resources/icon.ico")))  # Set here
+    if profile:
+        profile.mark("QApplication")
     from ui.main_window import MainWindow
 
+    if profile:
+        profile.mark("import MainWindow")
     window = MainWindow()
+    if profile:
+        profile.mark("MainWindow()")
+        profile.watch_first_paint(window, app)
     window.show()
+    if profile:
+        profile.mark("show()")
     sys.exit(app.exec_())
@@ -0,0 +1,113 @@
+"""Headless player: ``python -m player [options] FILE|DIR|PLAYLIST...``"""
+
+import argparse
+import os
+import sys
+import threading
+
+from player.audio_engine import AudioEngine
+from player.backends import can_decode
+from player.controls import PlayerControls
+from player.latency import DEFAULT_PROFILE, PROFILES
+from player.playlist import Playlist
+from player.playlist_io import iter_playlist
+from utils.file_utils import is_audio_file
+
+PLAYLIST_EXTENSIONS = (".m3u", ".m3u8", ".xspf")
+
+
+def collect(targets):
+    """Expand directories and playlist files into a flat list of tracks."""
+    for target in targets:
+        if os.path.isdir(target):
+            for root, dirs, files in os.walk(target):
+                dirs.sort()
+                for name in sorted(files):
+                    if is_audio_file(name) and can_decode(name):
+                        yield os.path.join(root, name)
+        elif target.lower().endswith(PLAYLIST_EXTENSIONS):
+            for path in iter_playlist(target):
+                if os.path.isfile(path) and can_decode(path):
+                    yield path
+        else:
+            yield target
+
+
+def format_time(seconds):
+    return "%d:%02d" % divmod(int(seconds), 60)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m player", description=__doc__)
+    parser.add_argument("targets", nargs="+", help="audio files, folders or playlists")
+    parser.add_argument("--shuffle", action="store_true")
+    parser.add_argument("--repeat", action="store_true", help="loop the playlist")
+    parser.add_argument("--volume", type=float, default=1.0, help="0.0 to 1.0")
+    parser.add_argument("--crossfade", type=float, default=0.0, metavar="SECONDS")
+    parser.add_argument("--samplerate", type=int, help="output rate (device default)")
+    parser.add_argument(
+        "--latency", choices=sorted(PROFILES), default=DEFAULT_PROFILE, help="latency profile"
+    )
+    parser.add_argument(
+        "--fixed-latency", action="store_true", help="do not enlarge buffers after glitches"
+    )
+    parser.add_argument("--quiet", action="store_true", help="no progress line")
+    parser.add_argument(
+        "--stats", metavar="FILE", help="write timing statistics on exit (.json or .csv)"
+    )
+    args = parser.parse_args(argv)
+
+    playlist = Playlist()
+    playlist.add_files(list(collect(args.targets)))
+    if not len(playlist):
+        parser.error("no audio files found")
+    playlist.set_repeat(args.repeat)
+    playlist.set_shuffle(args.shuffle)
+    if args.shuffle:
+        playlist.next()
+
+    engine = AudioEngine(playlist, samplerate=args.samplerate, profile=args.latency)
+    engine.set_adaptive_latency(not args.fixed_latency)
+    engine.set_volume(args.volume)
+    engine.set_crossfade(args.crossfade)
+    controls = PlayerControls(engine, playlist)
+    done = threading.Event()
+    controls.finished.connect(done.set)
+
+    def announce(path):
+        # Start on a fresh line, below the progress line of the last track
+        print("\r\033[KPlaying %s" % path, flush=True)
+
+    def skip(path, error):
+        print("\r\033[KSkipping %s: %s" % (path, error), file=sys.stderr, flush=True)
+
+    controls.track_started.connect(announce)
+    controls.skipped.connect(skip)
+    try:
+        controls.play()
+        while not done.wait(0.5):
+            if not args.quiet:
+                frame, total = engine.playback_position()
+                rate = engine.samplerate or 1
+                print(
+                    "\r  %s / %s" % (format_time(frame / rate), format_time(total / rate)),
+                    end="",
+                    flush=True,
+                )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # A track boundary during shutdown must not start the next track
+        controls.detach()
+        engine.close()
+        if not args.quiet:
+            print()
+        if args.stats:
+            from player.instrumentation import instruments
+
+            instruments.export(args.stats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
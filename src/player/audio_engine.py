@@ -1,56 +1,423 @@
 import sounddevice as sd
-import soundfile as sf
+import numpy as np
+import queue
 import threading
-from PyQt5.QtCore import QObject, pyqtSignal
+import time
+import traceback
 
+from player.decoder import open_decoder
+from player.dsp import DSPChain
+from player.events import Event
+from player.instrumentation import callback_load, decode_ahead, instruments
+from player.latency import DEFAULT_PROFILE, MAX_BLOCKSIZE, AdaptiveLatency
+from player.ring_buffer import EventRing, RingBuffer
 
-class AudioEngine(QObject):
-    playback_finished = pyqtSignal()
+# Events posted from the audio thread to the dispatcher thread
+EVENT_FINISHED = 1
+EVENT_TRACK_CHANGED = 2
+EVENT_FADE_DONE = 3
 
-    def __init__(self, playlist=None):
-        super().__init__()
+VISUALIZER_FRAMES = 1024
+FALLBACK_SAMPLERATE = 48000
+
+
+class AudioEngine:
+    """Plays decoders through one long-lived output stream.
+
+    The stream runs at a fixed rate and channel layout (the device default
+    rate unless ``samplerate`` is given); decoders convert every track to that
+    format, so changing tracks never reopens the device.  ``playback_finished``
+    and ``track_changed`` (after a gapless or crossfaded transition) are
+    emitted from the dispatcher thread.
+
+    Blocksize, stream latency and decode-ahead come from a latency profile
+    (see ``player.latency``) and grow while the output keeps glitching.
+    ``latency_changed`` is emitted with ``output_latency()`` whenever the
+    stream is (re)opened.
+    """
+
+    def __init__(self, playlist=None, samplerate=None, channels=2, profile=DEFAULT_PROFILE):
+        self.playback_finished = Event()
+        self.track_changed = Event()
+        self.latency_changed = Event()
         self.playlist = playlist
         self.stream = None
-        self.data = None
-        self.samplerate = None
+        self.decoder = None
+        self.next_decoder = None  # Pre-decoded upcoming track
+        self.gapless = True
+        self.mapped = True  # Play uncompressed files straight from a memory map
+        self.samplerate = samplerate
+        self.channels = channels
+        self.latency_control = AdaptiveLatency(profile)
+        self.blocksize = self.latency_control.blocksize
+        self.latency = self.latency_control.latency  # Requested, in seconds
+        self.frames = 0
         self.position = 0
+        # (first frame of the last block, its DAC time, frames in it, track
+        # length), replaced as a whole by the audio thread so readers need no lock
+        self.clock = (0, 0.0, 0, 0)
         self.playing = False
-        self.lock = threading.Lock()
+        self.lock = threading.Lock()  # Serializes control calls, never taken by the audio thread
         self.callback = None  # For visualizer
         self.volume = 1.0
+        self.eq_gains = None
+        self.crossfade_seconds = 0.0
+        self.dsp = None
+        self._fading = None  # Outgoing decoder during a crossfade
+        self._fade_pos = 0
+        self._fade_block = None
+        self.underflows = 0  # Device underflows reported through ``status``
+        self.starved_blocks = 0  # Blocks the decoder could not fill in time
+        instruments.watch("underflows", lambda: self.underflows)
+        instruments.watch("starved_blocks", lambda: self.starved_blocks)
+        self.events = EventRing()
+        self.tap = None
+        self._tap_block = None
+        self._tap_lag = 0  # Frames the visualizer is held back to match the output
+        self._dispatcher = None
+        self._previous = None  # Decoder replaced by the audio thread
+        self._retired = queue.SimpleQueue()
+        self._reaping = []
+        self._preload_seq = 0
 
     def play(self, path, callback=None):
-        self.stop()
-        self.data, self.samplerate = sf.read(path, dtype="float32")
-        self.position = 0
-        self.playing = True
-        self.callback = callback
+        with self.lock:
+            self._apply_latency(now=True)
+            self._preload_seq += 1
+            upcoming = self.next_decoder
+            self.next_decoder = None
+            if upcoming is not None and upcoming.path == path and upcoming is not self.decoder:
+                decoder = upcoming
+            else:
+                if upcoming is not None:
+                    self._retired.put(upcoming)
+                if self.stream is None:
+                    self._open_stream()
+                decoder = open_decoder(
+                    path,
+                    self.samplerate,
+                    self.channels,
+                    MAX_BLOCKSIZE,
+                    self.mapped,
+                    self.latency_control.ahead_seconds,
+                )
+                decoder.prime()
+                decoder.start()
+            self.callback = callback
+            for old in (self.decoder, self._fading):
+                if old is not None:
+                    self._retired.put(old)
+            self._fading = None
+            self.dsp.set_track_gain(decoder.gain_db)
+            self.frames = decoder.frames
+            self.position = 0
+            self.clock = (0, 0.0, 0, decoder.frames)
+            self.decoder = decoder
+            self.playing = True
+
+    def preload(self, path):
+        """Start decoding ``path`` in the background for a gapless transition.
+
+        Passing ``None`` drops any previously preloaded track.
+        """
+        with self.lock:
+            self._preload_seq += 1
+            seq = self._preload_seq
+            if self.next_decoder is not None:
+                self._retired.put(self.next_decoder)
+                self.next_decoder = None
+            samplerate, channels = self.samplerate, self.channels
+            ahead = self.latency_control.ahead_seconds
+        if path is None or not self.gapless or self.stream is None:
+            return
+        threading.Thread(
+            target=self._preload, args=(path, seq, samplerate, channels, ahead), daemon=True
+        ).start()
+
+    def _preload(self, path, seq, samplerate, channels, ahead):
+        try:
+            decoder = open_decoder(path, samplerate, channels, MAX_BLOCKSIZE, self.mapped, ahead)
+            decoder.prime()
+        except (RuntimeError, OSError):
+            return
+        with self.lock:
+            # The output format may have been reconfigured in the meantime
+            if seq == self._preload_seq and self._stream_matches(decoder):
+                decoder.start()
+                self.next_decoder = decoder
+                return
+        decoder.stop()
+
+    def _stream_matches(self, decoder):
+        return (
+            self.stream is not None
+            and decoder.samplerate == self.samplerate
+            and decoder.channels == self.channels
+        )
+
+    def configure_output(self, samplerate=None, channels=None):
+        """Change the output format; ``samplerate=None`` means the device default.
+
+        The stream is only reopened when the format actually changes.
+        """
+        with self.lock:
+            if self.stream is not None and samplerate is None:
+                samplerate = self._device_samplerate()
+            channels = channels or self.channels
+            if samplerate == self.samplerate and channels == self.channels:
+                return
+        self._stop_dispatcher()
+        with self.lock:
+            self.playing = False
+            self._close_stream()
+            self.samplerate = samplerate
+            self.channels = channels
+
+    def _device_samplerate(self):
+        try:
+            return int(sd.query_devices(kind="output")["default_samplerate"])
+        except (sd.PortAudioError, KeyError, ValueError):
+            return FALLBACK_SAMPLERATE
+
+    def _open_stream(self):
+        if self.samplerate is None:
+            self.samplerate = self._device_samplerate()
+        self._tap_block = np.zeros((VISUALIZER_FRAMES, self.channels), dtype="float32")
+        self._start_output()
+        self._start_dispatcher()
+
+    def _start_output(self):
+        channels = self.channels
+        self._fade_block = np.zeros((self.blocksize, channels), dtype="float32")
+        dsp = DSPChain(self.samplerate, channels, self.blocksize)
+        dsp.set_volume(self.volume)
+        dsp.set_crossfade(self.crossfade_seconds)
+        if self.eq_gains is not None:
+            dsp.set_eq(self.eq_gains)
+        if self.decoder is not None:
+            dsp.set_track_gain(self.decoder.gain_db)
+        # Start at the target gain rather than ramping there from unity
+        dsp.ramp.gain = dsp.ramp.target
+        self.dsp = dsp
         self.stream = sd.OutputStream(
             samplerate=self.samplerate,
-            channels=self.data.shape[1] if len(self.data.shape) > 1 else 1,
+            channels=channels,
             callback=self.audio_callback,
-            blocksize=1024,
+            blocksize=self.blocksize,
+            latency=self.latency,
         )
+        latency = self.output_latency()
+        self._tap_lag = int(latency * self.samplerate)
+        self.tap = RingBuffer(VISUALIZER_FRAMES * 8 + self._tap_lag + self.blocksize, channels)
         self.stream.start()
+        self.latency_changed.emit(latency)
+
+    def _restart_stream(self):
+        """Reopen the device at the current blocksize and latency; decoders carry on."""
+        stream, self.stream = self.stream, None
+        stream.stop()
+        stream.close()
+        self._start_output()
 
-    def audio_callback(self, outdata, frames, time, status):
+    def _apply_latency(self, now=False):
+        control = self.latency_control
+        wanted = (control.blocksize, control.latency)
+        if wanted == (self.blocksize, self.latency):
+            return
+        # Growing answers glitches, so it happens at once; shrinking waits for
+        # a moment without audio, so it never causes a gap of its own
+        if self.playing and not now and control.blocksize < self.blocksize:
+            return
+        self.blocksize, self.latency = wanted
+        if self.stream is not None:
+            self._restart_stream()
+
+    def _adapt_latency(self):
+        control = self.latency_control
+        control.update(self.xrun_count(), time.monotonic())
+        if (control.blocksize, control.latency) == (self.blocksize, self.latency):
+            return
+        # Skip a tick rather than hold up event delivery behind a control call
+        if self.lock.acquire(blocking=False):
+            try:
+                self._apply_latency()
+            finally:
+                self.lock.release()
+
+    def set_latency_profile(self, name):
+        """Switch to one of ``player.latency.PROFILES``, reopening the stream if needed."""
         with self.lock:
-            if not self.playing:
-                outdata[:] = 0
-                return
-            end = self.position + frames
-            chunk = self.data[self.position : end]
-            if len(chunk) < frames:
-                outdata[: len(chunk)] = chunk * self.volume
-                outdata[len(chunk) :] = 0
+            self.latency_control.set_profile(name)
+            self._apply_latency(now=True)
+
+    def set_adaptive_latency(self, enabled):
+        with self.lock:
+            self.latency_control.set_enabled(enabled)
+            self._apply_latency(now=True)
+
+    def output_latency(self):
+        """Seconds between the callback producing a sample and it being heard."""
+        stream = self.stream
+        if stream is not None:
+            return float(stream.latency)
+        return self.latency
+
+    def _close_stream(self):
+        # Callers join the dispatcher before taking the lock; one started since
+        # then is only told to stop, as joining it here could deadlock
+        self._dispatcher = None
+        if self.stream:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+        # With the callback stopped nothing can adopt a decoder any more
+        for decoder in (self.decoder, self.next_decoder, self._previous, self._fading):
+            if decoder is not None:
+                decoder.stop()
+        self.decoder = self.next_decoder = self._previous = self._fading = None
+        self._reap(force=True)
+
+    def audio_callback(self, outdata, frames, time_info, status):
+        # Runs on the realtime thread: no locks, no allocation, no Qt calls.
+        start = time.perf_counter()
+        if status.output_underflow:
+            self.underflows += 1
+        decoder = self.decoder
+        if not self.playing or decoder is None:
+            outdata.fill(0)
+            return
+        dsp = self.dsp
+        upcoming = self.next_decoder
+        if (
+            upcoming is not None
+            and self._fading is None
+            and 0 < decoder.frames - decoder.ring.frame <= dsp.fade_frames
+        ):
+            # Start the next track now and fade the current one out over it
+            self.next_decoder = None
+            self._fading = decoder
+            self._fade_pos = 0
+            self.decoder = decoder = upcoming
+            self.frames = upcoming.frames
+            dsp.begin_crossfade(upcoming.gain_db)
+            self.events.push(EVENT_TRACK_CHANGED)
+        ring = decoder.ring
+        n = ring.read_into(outdata)
+        if n < frames and ring.at_end():
+            upcoming = self.next_decoder
+            if upcoming is not None:
+                # Splice the next track in right after the last sample
+                self.next_decoder = None
+                self._previous = decoder
+                self.decoder = decoder = upcoming
+                self.frames = upcoming.frames
+                dsp.set_track_gain(upcoming.gain_db)
+                ring = upcoming.ring
+                n += ring.read_into(outdata[n:])
+                self.events.push(EVENT_TRACK_CHANGED)
+        if n < frames:
+            outdata[n:] = 0
+        fading = self._fading
+        if fading is not None:
+            fade = self._fade_block[:frames]
+            m = fading.ring.read_into(fade)
+            fade[m:] = 0
+            dsp.crossfade(outdata, fade, self._fade_pos)
+            self._fade_pos += frames
+            if self._fade_pos >= dsp.fade_frames or (m < frames and fading.ring.at_end()):
+                self._fading = None
+                self._previous = fading
+                self.events.push(EVENT_FADE_DONE)
+            n = frames
+        elif n < frames:
+            if ring.at_end():
                 self.playing = False
-                self.stream.stop()
+                self.events.push(EVENT_FINISHED)
+            elif not ring.refilling:
+                # The gap while a seek refills the ring is expected, not a glitch
+                self.starved_blocks += 1
+        dsp.process(outdata)
+        self.position = ring.frame
+        self.clock = (max(ring.frame - n, 0), time_info.outputBufferDacTime, n, self.frames)
+        if self.callback is not None:
+            self.tap.write(outdata[:n])
+        decode_ahead.record(decoder.ahead() / self.samplerate, start)
+        callback_load.record((time.perf_counter() - start) * self.samplerate / frames, start)
+
+    def xrun_count(self):
+        """Total number of glitches since the engine was created."""
+        return self.underflows + self.starved_blocks
+
+    def _start_dispatcher(self):
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._dispatcher.start()
+
+    def _stop_dispatcher(self):
+        """Stop the dispatcher and wait for it; never call with ``lock`` held.
+
+        Event listeners run on the dispatcher and may call ``play``, which
+        takes the lock, so joining it under the lock can deadlock.
+        """
+        dispatcher, self._dispatcher = self._dispatcher, None
+        if dispatcher is not None and dispatcher is not threading.current_thread():
+            dispatcher.join()
+
+    def _dispatch_loop(self):
+        # Everything the audio thread defers is handled here, off the realtime path.
+        # The loop ends once another dispatcher replaces it or it is stopped.
+        me = threading.current_thread()
+        while self._dispatcher is me:
+            try:
+                self.dispatch_pending()
+                self._reap()
+                self._adapt_latency()
+            except Exception:
+                # A failing event handler must not stop event delivery for good
+                traceback.print_exc()
+            time.sleep(0.02)
+
+    def _reap(self, force=False):
+        # Decoders are retired one dispatcher tick before they are stopped, so
+        # the audio thread can never be holding one that is being torn down.
+        stale, self._reaping = self._reaping, []
+        while True:
+            try:
+                self._reaping.append(self._retired.get_nowait())
+            except queue.Empty:
+                break
+        if force:
+            stale += self._reaping
+            self._reaping = []
+        for decoder in stale:
+            if force or (decoder is not self.decoder and decoder is not self.next_decoder):
+                decoder.stop()
+
+    def dispatch_pending(self):
+        """Deliver visualizer data and events queued by the audio thread."""
+        tap = self.tap
+        if tap is not None and self.callback is not None:
+            # Keep the newest ``_tap_lag`` frames back: they are not audible yet
+            available = tap.available() - self._tap_lag
+            if available >= VISUALIZER_FRAMES:
+                tap.skip(available - VISUALIZER_FRAMES)
+                tap.read_into(self._tap_block)
+                self.callback(self._tap_block)
+        event = self.events.pop()
+        while event is not None:
+            if event[0] == EVENT_TRACK_CHANGED:
+                if self._previous is not None:
+                    self._retired.put(self._previous)
+                    self._previous = None
+                decoder = self.decoder
+                if decoder is not None:
+                    self.track_changed.emit(decoder.path)
+            elif event[0] == EVENT_FADE_DONE:
+                if self._previous is not None:
+                    self._retired.put(self._previous)
+                    self._previous = None
+            elif event[0] == EVENT_FINISHED:
                 self.playback_finished.emit()
-            else:
-                outdata[:] = chunk * self.volume
-            if self.callback:
-                self.callback(chunk)
-            self.position = end
+            event = self.events.pop()
 
     def pause(self):
         with self.lock:
@@ -58,19 +425,70 @@ class AudioEngine(QObject):
                 self.playing = not self.playing
 
     def stop(self):
+        """Stop playback; the output stream stays open for the next track."""
         with self.lock:
-            if self.stream:
-                self.stream.stop()
-                self.stream.close()
-                self.stream = None
             self.playing = False
+            self._preload_seq += 1
+            for decoder in (self.decoder, self.next_decoder, self._fading):
+                if decoder is not None:
+                    self._retired.put(decoder)
+            self.decoder = self.next_decoder = self._fading = None
+            self.position = 0
+            self.clock = (0, 0.0, 0, 0)
+
+    def close(self):
+        """Stop playback and release the output device."""
+        self._stop_dispatcher()
+        with self.lock:
+            self.playing = False
+            self._preload_seq += 1
+            self._close_stream()
             self.position = 0
 
     def set_volume(self, value):
         self.volume = value
+        if self.dsp is not None:
+            self.dsp.set_volume(value)
+
+    def set_eq(self, gains_db):
+        """Gains in dB for the ten EQ bands (see ``dsp.EQ_FREQUENCIES``)."""
+        self.eq_gains = list(gains_db)
+        if self.dsp is not None:
+            self.dsp.set_eq(self.eq_gains)
+
+    def set_crossfade(self, seconds):
+        """Crossfade length between tracks; 0 keeps gapless splicing."""
+        self.crossfade_seconds = seconds
+        if self.dsp is not None:
+            self.dsp.set_crossfade(seconds)
 
     def seek(self, position):
         """Set playback position (in samples)."""
         with self.lock:
-            if self.data is not None:
-                self.position = max(0, min(position, len(self.data) - 1))
+            if self.decoder is not None:
+                position = max(0, min(position, self.frames - 1))
+                self.decoder.seek(position)
+                self.position = position
+                self.clock = (position, 0.0, 0, self.frames)
+
+    def playback_position(self):
+        """``(frame, track frames)`` of the sample being heard right now.
+
+        Derived from the clock the callback publishes: the first frame of the
+        newest block reaches the DAC at its ``outputBufferDacTime``, and the
+        blocks before it are still playing until then.
+        """
+        frame, dac_time, count, total = self.clock
+        stream = self.stream
+        if count and stream is not None:
+            try:
+                elapsed = stream.time - dac_time
+            except sd.PortAudioError:
+                elapsed = 0.0
+            frame += int(min(elapsed * self.samplerate, count))
+        return max(frame, 0), total
+
+    def position_seconds(self):
+        if not self.samplerate:
+            return 0.0
+        return self.playback_position()[0] / self.samplerate
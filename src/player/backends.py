@@ -0,0 +1,463 @@
+"""Decoder backends behind one streaming interface.
+
+Every backend is opened with a path and exposes ``samplerate``, ``channels``,
+``frames`` (possibly an estimate), ``read(out)`` which fills a float32
+``frames x channels`` array and returns the filled part (shorter only at the
+end of the stream), ``seek(frame)`` and ``close()``.
+
+``open_backend`` tries the registered backends in order of preference for the
+file's extension and returns the first that opens it.
+"""
+
+import json
+import mmap
+import os
+import shutil
+import struct
+import subprocess
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import soundfile as sf
+
+from utils.file_utils import file_identity
+
+# Decoders that build a seek index as they go (mpg123, Ogg bisection state)
+INDEXED_FORMATS = {"MP3", "OGG"}
+
+
+class UnsupportedFormat(RuntimeError):
+    pass
+
+
+class HandleCache:
+    """Keeps idle SoundFile handles of MP3/OGG files open for reuse.
+
+    Their first long seek has to scan the stream; the index built while doing
+    so lives in the handle, so reusing it makes later seeks in the same file,
+    and replays of it, close to free.  Handles are keyed by file identity, so
+    an edited file is never served from the cache.
+    """
+
+    def __init__(self, size=4):
+        self.size = size
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, path):
+        key = file_identity(path)
+        with self._lock:
+            handle = self._idle.pop(key, None)
+        if handle is None:
+            return sf.SoundFile(path)
+        handle.seek(0)
+        return handle
+
+    def release(self, path, handle):
+        if handle.format not in INDEXED_FORMATS:
+            handle.close()
+            return
+        try:
+            key = file_identity(path)
+        except OSError:
+            handle.close()
+            return
+        with self._lock:
+            old = self._idle.pop(key, None)
+            self._idle[key] = handle
+            evicted = [old] if old is not None and old is not handle else []
+            while len(self._idle) > self.size:
+                evicted.append(self._idle.popitem(last=False)[1])
+        for stale in evicted:
+            stale.close()
+
+
+handles = HandleCache()
+
+
+class SoundFileBackend:
+    """libsndfile: WAV, AIFF, FLAC, OGG/Vorbis/Opus and, from 1.1, MP3."""
+
+    name = "soundfile"
+
+    @classmethod
+    def extensions(cls):
+        formats = sf.available_formats()
+        exts = {"." + f.lower() for f in formats}
+        if "AIFF" in formats:
+            exts.add(".aif")
+        if "OGG" in formats:
+            exts.add(".opus")
+        if "MP3" in formats:
+            exts.add(".mp3")
+        return exts
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def __init__(self, path):
+        self.path = path
+        self.file = handles.acquire(path)
+        self.samplerate = self.file.samplerate
+        self.channels = self.file.channels
+        self.frames = self.file.frames
+
+    def read(self, out):
+        return self.file.read(out=out, always_2d=True)
+
+    def seek(self, frame):
+        self.file.seek(frame)
+
+    def close(self):
+        handles.release(self.path, self.file)
+
+
+def parse_wav(path):
+    """Locate the sample data of a PCM or float WAV file without decoding it.
+
+    Returns ``(offset, frames, channels, samplerate, format_tag, bits)``.
+    """
+    with open(path, "rb") as f:
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave != b"WAVE":
+            raise UnsupportedFormat("%s is not a RIFF/WAVE file" % path)
+        fmt = None
+        size = os.fstat(f.fileno()).st_size
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise UnsupportedFormat("%s has no data chunk" % path)
+            chunk, length = struct.unpack("<4sI", header)
+            if chunk == b"fmt ":
+                body = f.read(length + (length & 1))
+                tag, channels, samplerate, _, align, bits = struct.unpack_from("<HHIIHH", body)
+                if tag == 0xFFFE and length >= 40:
+                    # WAVE_FORMAT_EXTENSIBLE: the real tag opens the subformat GUID
+                    tag = struct.unpack_from("<H", body, 24)[0]
+                fmt = (tag, channels, samplerate, align, bits)
+            elif chunk == b"data":
+                if fmt is None:
+                    raise UnsupportedFormat("%s: data before fmt chunk" % path)
+                tag, channels, samplerate, align, bits = fmt
+                offset = f.tell()
+                # Streamed files may leave the size at 0 or 0xFFFFFFFF
+                available = size - offset
+                if length == 0 or length > available:
+                    length = available
+                return offset, length // align, channels, samplerate, tag, bits
+            else:
+                f.seek(length + (length & 1), os.SEEK_CUR)
+
+
+# (format tag, bits) -> (memmap dtype, scale to [-1, 1), offset)
+PCM_LAYOUTS = {
+    (1, 8): ("u1", 1 / 128, -128),
+    (1, 16): ("<i2", 1 / 32768, 0),
+    (1, 32): ("<i4", 1 / 2**31, 0),
+    (3, 32): ("<f4", 1.0, 0),
+    (3, 64): ("<f8", 1.0, 0),
+}
+
+
+class PcmMap:
+    """Interleaved PCM samples memory-mapped in place and converted on read.
+
+    Nothing is copied until a block is requested; the page cache does the
+    I/O.  Little-endian 24-bit samples are read through an unaligned int32
+    view that starts one byte early, so each element holds a sample shifted
+    left by 8 plus one stray low byte, which is masked off.
+    """
+
+    def __init__(self, path, offset, frames, channels, dtype, bits, scale, bias=0):
+        self.frames = frames
+        self.channels = channels
+        self.scale = scale
+        self.bias = bias
+        self.mode = "plain"
+        self.frame_bytes = channels * (3 if bits == 24 else np.dtype(dtype).itemsize)
+        self._scratch = None
+        # Where the samples start inside the underlying mmap object
+        self._data_start = offset % mmap.ALLOCATIONGRANULARITY
+        if bits == 24 and dtype == "<i3":
+            self.mode = "int24"
+            self.data = np.memmap(path, "u1", "r")
+            self._data_start = offset
+            self._samples = np.ndarray(
+                (frames, channels), "<i4", self.data, offset - 1, (3 * channels, 3)
+            )
+            self._scratch = np.empty((0, channels), dtype="<i4")
+        elif bits == 24:
+            # Big-endian 24-bit: widen byte-reversed into a little-endian int32
+            self.mode = "int24be"
+            self.data = np.memmap(path, "u1", "r", offset, (frames, channels, 3))
+            self._scratch = np.zeros((0, channels, 4), dtype="u1")
+        else:
+            self.data = np.memmap(path, dtype, "r", offset, (frames, channels))
+
+    def advise(self, start, end, advice):
+        """``madvise`` the pages holding frames ``start:end``, where supported."""
+        mm = getattr(self.data, "_mmap", None)
+        if mm is None or not hasattr(mm, "madvise"):
+            return
+        lo = self._data_start + max(start, 0) * self.frame_bytes
+        hi = self._data_start + min(end, self.frames) * self.frame_bytes
+        lo -= lo % mmap.PAGESIZE
+        if hi > lo:
+            mm.madvise(advice, lo, hi - lo)
+
+    def reserve(self, frames):
+        """Preallocate scratch space so ``convert`` never allocates."""
+        if self._scratch is not None and len(self._scratch) < frames:
+            self._scratch = np.zeros((frames,) + self._scratch.shape[1:], self._scratch.dtype)
+
+    def convert(self, start, out):
+        """Write frames from ``start`` into ``out`` as float32; returns the count."""
+        n = max(0, min(len(out), self.frames - start))
+        if not n:
+            return 0
+        dst = out[:n]
+        if self.mode == "int24":
+            self.reserve(n)
+            scratch = self._scratch[:n]
+            np.bitwise_and(self._samples[start : start + n], -256, out=scratch)
+            np.multiply(scratch, self.scale / 256, out=dst)
+        elif self.mode == "int24be":
+            self.reserve(n)
+            wide = self._scratch[:n]
+            wide[:, :, 1:] = self.data[start : start + n, :, ::-1]
+            np.multiply(wide.view("<i4")[:, :, 0], self.scale / 256, out=dst)
+        elif self.bias:
+            np.add(self.data[start : start + n], self.bias, out=dst, dtype="float32")
+            np.multiply(dst, self.scale, out=dst)
+        elif self.scale == 1.0:
+            dst[...] = self.data[start : start + n]
+        else:
+            np.multiply(self.data[start : start + n], self.scale, out=dst, dtype="float32")
+        return n
+
+    def close(self):
+        mm = getattr(self.data, "_mmap", None)
+        self.data = self._samples = None
+        if mm is not None:
+            mm.close()
+
+
+def parse_aiff(path):
+    """Locate the sample data of an AIFF or uncompressed AIFF-C file.
+
+    Returns ``(offset, frames, channels, samplerate, dtype, bits)``.
+    """
+    with open(path, "rb") as f:
+        form, _, kind = struct.unpack(">4sI4s", f.read(12))
+        if form != b"FORM" or kind not in (b"AIFF", b"AIFC"):
+            raise UnsupportedFormat("%s is not an AIFF file" % path)
+        comm = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise UnsupportedFormat("%s has no SSND chunk" % path)
+            chunk, length = struct.unpack(">4sI", header)
+            if chunk == b"COMM":
+                body = f.read(length + (length & 1))
+                channels, frames, bits = struct.unpack_from(">hIh", body)
+                # 80-bit extended float: sign/exponent, then a 64-bit mantissa
+                exponent, mantissa = struct.unpack_from(">HQ", body, 8)
+                samplerate = round(mantissa * 2.0 ** ((exponent & 0x7FFF) - 16383 - 63))
+                compression = body[18:22] if kind == b"AIFC" else b"NONE"
+                comm = (channels, frames, bits, samplerate, compression)
+            elif chunk == b"SSND":
+                if comm is None:
+                    raise UnsupportedFormat("%s: SSND before COMM chunk" % path)
+                channels, frames, bits, samplerate, compression = comm
+                skip = struct.unpack(">I", f.read(4))[0]
+                f.read(4)
+                offset = f.tell() + skip
+                layouts = {
+                    (b"NONE", 8): "i1", (b"NONE", 16): ">i2", (b"NONE", 24): ">i3",
+                    (b"NONE", 32): ">i4", (b"sowt", 16): "<i2", (b"sowt", 24): "<i3",
+                    (b"sowt", 32): "<i4", (b"fl32", 32): ">f4", (b"FL32", 32): ">f4",
+                    (b"fl64", 64): ">f8", (b"FL64", 64): ">f8",
+                }
+                dtype = layouts.get((compression, bits))
+                if dtype is None:
+                    raise UnsupportedFormat("%s: AIFF-C %r is compressed" % (path, compression))
+                return offset, frames, channels, samplerate, dtype, bits
+            else:
+                f.seek(length + (length & 1), os.SEEK_CUR)
+
+
+def map_aiff(path):
+    offset, frames, channels, samplerate, dtype, bits = parse_aiff(path)
+    if dtype.endswith("f4") or dtype.endswith("f8"):
+        scale = 1.0
+    else:
+        scale = 1 / 2 ** (bits - 1)
+    return PcmMap(path, offset, frames, channels, dtype, bits, scale), samplerate
+
+
+def map_pcm(path):
+    """Memory-map an uncompressed WAV or AIFF file: ``(PcmMap, samplerate)``."""
+    if path.lower().endswith((".aif", ".aiff", ".aifc")):
+        return map_aiff(path)
+    return map_wav(path)
+
+
+def map_wav(path):
+    offset, frames, channels, samplerate, tag, bits = parse_wav(path)
+    if tag == 1 and bits == 24:
+        return PcmMap(path, offset, frames, channels, "<i3", 24, 1 / 2**23), samplerate
+    layout = PCM_LAYOUTS.get((tag, bits))
+    if layout is None:
+        raise UnsupportedFormat("%s: WAV format %d/%d-bit" % (path, tag, bits))
+    dtype, scale, bias = layout
+    return PcmMap(path, offset, frames, channels, dtype, bits, scale, bias), samplerate
+
+
+class MemmapPcmBackend:
+    """Uncompressed WAV/AIFF read straight from a memory map, no decoder at all."""
+
+    name = "memmap"
+
+    @classmethod
+    def extensions(cls):
+        return {".wav", ".aif", ".aiff", ".aifc"}
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def __init__(self, path):
+        self.pcm, self.samplerate = map_pcm(path)
+        self.channels = self.pcm.channels
+        self.frames = self.pcm.frames
+        self.position = 0
+
+    def read(self, out):
+        n = self.pcm.convert(self.position, out)
+        self.position += n
+        return out[:n]
+
+    def seek(self, frame):
+        self.position = max(0, min(frame, self.frames))
+
+    def close(self):
+        self.pcm.close()
+
+
+class FFmpegBackend:
+    """Any format ffmpeg knows, streamed as raw float32 through a pipe."""
+
+    name = "ffmpeg"
+
+    @classmethod
+    def extensions(cls):
+        return {".m4a", ".aac", ".mp4", ".alac", ".wma", ".opus", ".mp3", ".ogg", ".flac", ".wav"}
+
+    @classmethod
+    def available(cls):
+        return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+    def __init__(self, path):
+        self.path = path
+        probe = subprocess.run(
+            [
+                "ffprobe", "-v", "error", "-select_streams", "a:0",
+                "-show_entries", "stream=sample_rate,channels,duration:format=duration",
+                "-of", "json", path,
+            ],
+            capture_output=True,
+            text=True,
+        )
+        try:
+            info = json.loads(probe.stdout)
+            stream = info["streams"][0]
+            self.samplerate = int(stream["sample_rate"])
+            self.channels = int(stream["channels"])
+            duration = stream.get("duration") or info.get("format", {}).get("duration") or 0
+        except (ValueError, KeyError, IndexError):
+            raise UnsupportedFormat("ffprobe cannot read %s" % path)
+        # Compressed streams only know their length approximately
+        self.frames = int(float(duration) * self.samplerate)
+        self._proc = None
+        self.seek(0)
+
+    def seek(self, frame):
+        self._kill()
+        cmd = ["ffmpeg", "-v", "error", "-nostdin"]
+        if frame:
+            cmd += ["-ss", "%.6f" % (frame / self.samplerate)]
+        cmd += [
+            "-i", self.path, "-map", "0:a:0", "-f", "f32le",
+            "-ac", str(self.channels), "-ar", str(self.samplerate), "-",
+        ]
+        self._proc = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0
+        )
+
+    def read(self, out):
+        view = memoryview(out).cast("B")
+        got = 0
+        while got < len(view):
+            n = self._proc.stdout.readinto(view[got:])
+            if not n:
+                break
+            got += n
+        return out[: got // (4 * self.channels)]
+
+    def close(self):
+        self._kill()
+
+    def _kill(self):
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.stdout.close()
+            self._proc.wait()
+            self._proc = None
+
+
+# In order of preference: the first backend that opens a file wins
+BACKENDS = []
+_by_extension = {}
+
+
+def register(backend, index=None):
+    BACKENDS.insert(len(BACKENDS) if index is None else index, backend)
+    _by_extension.clear()
+
+
+register(MemmapPcmBackend)
+register(SoundFileBackend)
+register(FFmpegBackend)
+
+
+def candidates(path):
+    """Backends that claim ``path``'s extension, fastest first."""
+    ext = os.path.splitext(path)[1].lower()
+    found = _by_extension.get(ext)
+    if found is None:
+        found = [b for b in BACKENDS if ext in b.extensions() and b.available()]
+        _by_extension[ext] = found
+    return found
+
+
+def open_backend(path, exclude=()):
+    errors = []
+    for backend in candidates(path):
+        if backend.name in exclude:
+            continue
+        try:
+            return backend(path)
+        except (RuntimeError, OSError, ValueError, struct.error) as e:
+            errors.append("%s: %s" % (backend.name, e))
+    raise UnsupportedFormat("cannot decode %s (%s)" % (path, "; ".join(errors) or "no backend"))
+
+
+def can_decode(path):
+    return bool(candidates(path))
+
+
+def supported_extensions():
+    """Extensions that some available backend can decode, e.g. ``".flac"``."""
+    return sorted({ext for b in BACKENDS if b.available() for ext in b.extensions()})
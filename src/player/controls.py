@@ -1,12 +1,33 @@
+from player.events import Event
+
+
 class PlayerControls:
+    """Drives an AudioEngine from a Playlist without any UI.
+
+    Follows the engine through gapless transitions, preloads the upcoming
+    track and emits ``finished`` when the playlist runs out.  Tracks that
+    are missing or cannot be decoded are reported through ``skipped`` and
+    passed over.
+    """
+
     def __init__(self, audio_engine, playlist):
         self.audio_engine = audio_engine
         self.playlist = playlist
+        self.track_started = Event()  # path
+        self.skipped = Event()  # path, exception
+        self.finished = Event()
+        audio_engine.track_changed.connect(self.on_track_changed)
+        audio_engine.playback_finished.connect(self.on_playback_finished)
+
+    def detach(self):
+        """Stop following the engine, e.g. before closing it."""
+        self.audio_engine.track_changed.disconnect(self.on_track_changed)
+        self.audio_engine.playback_finished.disconnect(self.on_playback_finished)
 
     def play(self):
         path = self.playlist.current()
         if path:
-            self.audio_engine.play(path)
+            self._start(path)
 
     def pause(self):
         self.audio_engine.pause()
@@ -17,22 +38,68 @@ class PlayerControls:
     def next_track(self):
         path = self.playlist.next()
         if path:
-            self.audio_engine.play(path)
+            self._start(path)
 
     def prev_track(self):
         path = self.playlist.prev()
         if path:
-            self.audio_engine.play(path)
+            self._start(path)
 
     def set_volume(self, value):
         self.audio_engine.set_volume(value)
 
     def toggle_shuffle(self, enabled):
         self.playlist.set_shuffle(enabled)
+        self.queue_upcoming()
 
     def toggle_repeat(self, enabled):
         self.playlist.set_repeat(enabled)
+        self.queue_upcoming()
 
     def seek(self, seconds):
-        # Implement seeking if your audio engine supports it
-        pass
+        engine = self.audio_engine
+        if engine.samplerate:
+            engine.seek(int(seconds * engine.samplerate))
+
+    def position(self):
+        """Seconds into the current track, as heard."""
+        return self.audio_engine.position_seconds()
+
+    def queue_upcoming(self):
+        if self.audio_engine.decoder is not None:
+            self.audio_engine.preload(self.playlist.peek_next())
+
+    def on_track_changed(self, path):
+        # The engine already switched; catch the playlist up with it
+        if not self.playlist.repeat_one:
+            self.playlist.next()
+        if self.playlist.current() != path:
+            # The queue was edited after the preload; play what it says now
+            self.play()
+            return
+        self.track_started.emit(path)
+        self.queue_upcoming()
+
+    def on_playback_finished(self):
+        if self.playlist.peek_next() is None:
+            self.finished.emit()
+        else:
+            self.next_track()
+
+    def _start(self, path):
+        # Each track is tried at most once, so a playlist of broken files ends
+        for _ in range(len(self.playlist)):
+            try:
+                self.audio_engine.play(path)
+            except (RuntimeError, OSError) as e:
+                self.skipped.emit(path, e)
+                upcoming = self.playlist.peek_next()
+                if upcoming is None or upcoming == path:
+                    break
+                path = self.playlist.next()
+                continue
+            self.track_started.emit(path)
+            self.queue_upcoming()
+            return
+        self.audio_engine.stop()
+        self.finished.emit()
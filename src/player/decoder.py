@@ -0,0 +1,287 @@
+import mmap
+import queue
+import struct
+import threading
+
+import numpy as np
+
+from player.backends import UnsupportedFormat, map_pcm, open_backend
+from player.peaks import PeakBuilder
+from player.resampler import Resampler, mix_matrix
+from player.ring_buffer import RingBuffer
+from utils.metadata_utils import read_replaygain
+
+
+def track_gain(path):
+    """ReplayGain from the file's tags, else from the loudness scan cache."""
+    gain = read_replaygain(path)
+    if gain is None:
+        from library.loudness import stored_gain
+
+        gain = stored_gain(path)
+    return gain
+
+
+class StreamDecoder(threading.Thread):
+    """Decodes a file block by block into a bounded ring buffer.
+
+    Only ``buffer_seconds`` of audio are ever resident, so memory use does not
+    depend on the length of the track.  When ``samplerate`` or ``channels``
+    differ from the file, blocks are mixed and resampled on the way in, so the
+    ring always holds audio in the output format.  ``frames`` and seek
+    positions are in output frames.
+    """
+
+    def __init__(self, path, samplerate=None, channels=None, blocksize=4096, buffer_seconds=2.0):
+        super().__init__(daemon=True)
+        self.path = path
+        self.file = open_backend(path)
+        self.source_rate = self.file.samplerate
+        self.source_channels = self.file.channels
+        self.samplerate = samplerate or self.source_rate
+        self.channels = channels or self.source_channels
+        self.frames = round(self.file.frames * self.samplerate / self.source_rate)
+        self.blocksize = blocksize
+        self.gain_db = track_gain(path)
+        self._block = np.empty((blocksize, self.source_channels), dtype="float32")
+        self._mix = None
+        self._mixed = None
+        if self.channels != self.source_channels:
+            self._mix = mix_matrix(self.source_channels, self.channels)
+            self._mixed = np.empty((blocksize, self.channels), dtype="float32")
+        self._resampler = None
+        out_block = blocksize
+        if self.samplerate != self.source_rate:
+            self._resampler = Resampler(self.source_rate, self.samplerate, self.channels)
+            # Room for one block plus the filter tail written at the end
+            out_block = self._resampler.output_frames(blocksize + self._resampler.taps)
+        self._out_block = out_block
+        self.ring = RingBuffer(
+            max(int(self.samplerate * buffer_seconds), out_block * 2), self.channels
+        )
+        self._next_frame = 0  # in source frames
+        # Waveform overview built from the same blocks that are played
+        self.overview = PeakBuilder(self.file.frames)
+        self._requests = queue.SimpleQueue()
+        self._wake = threading.Event()
+        self._closing = False
+        self._eof = False
+
+    def prime(self):
+        """Decode the first block synchronously so playback can start at once."""
+        self._decode_block()
+
+    def ahead(self):
+        """Frames decoded beyond the play position."""
+        return self.ring.available()
+
+    def seek(self, frame):
+        self._requests.put(frame)
+        self._wake.set()
+
+    def stop(self):
+        self._closing = True
+        self._wake.set()
+        if self.is_alive():
+            self.join()
+        else:
+            self._release()
+
+    def _release(self):
+        file, self.file = self.file, None
+        if file is not None:
+            file.close()
+
+    def run(self):
+        try:
+            while not self._closing:
+                self._handle_seek()
+                if self._eof or self.ring.free() < self._out_block:
+                    # Sleep for about half a block, or until seek/stop
+                    self._wake.wait(self.blocksize / self.source_rate / 2)
+                    self._wake.clear()
+                    continue
+                self._decode_block()
+        finally:
+            self._release()
+
+    def _handle_seek(self):
+        target = None
+        while True:
+            try:
+                target = self._requests.get_nowait()
+            except queue.Empty:
+                break
+        if target is not None:
+            source = min(round(target * self.source_rate / self.samplerate), self.file.frames)
+            self.file.seek(source)
+            self._next_frame = source
+            self._eof = False
+            if self._resampler is not None:
+                self._resampler.reset()
+            self.ring.request_flush(target)
+
+    def _decode_block(self):
+        block = self.file.read(self._block)
+        self.overview.add(block, self._next_frame)
+        self._next_frame += len(block)
+        out = block
+        if self._mix is not None:
+            out = np.matmul(block, self._mix, out=self._mixed[: len(block)])
+        if self._resampler is not None:
+            out = self._resampler.process(out)
+        self.ring.write(out)
+        if len(block) < self.blocksize:
+            self._eof = True
+            if self._resampler is not None:
+                self.ring.write(self._resampler.flush())
+            self.ring.mark_end()
+
+
+class PcmReader:
+    """Ring-buffer stand-in that reads a PcmMap on the consumer's thread.
+
+    ``read_into`` converts straight from the mapped file into the caller's
+    buffer, so the audio callback writes samples into ``outdata`` without any
+    intermediate copy.  Seeks are posted like ring flushes and applied on the
+    next read.
+    """
+
+    def __init__(self, pcm, channels, max_frames):
+        self.pcm = pcm
+        self.channels = channels
+        pcm.reserve(max_frames)
+        self.frame = 0
+        self._seek = (0, 0)  # (sequence, frame)
+        self._seek_seen = 0
+        self.refilling = False  # Seeks in a mapped file never wait for data
+
+    def request_seek(self, frame):
+        self._seek = (self._seek[0] + 1, frame)
+
+    def read_into(self, out):
+        seq, frame = self._seek
+        if seq != self._seek_seen:
+            self._seek_seen = seq
+            self.frame = frame
+        source = self.pcm.channels
+        # Mono files are converted into the first column and copied across
+        dst = out if source == self.channels else out[:, :source]
+        n = self.pcm.convert(self.frame, dst)
+        if source == 1 and self.channels > 1:
+            out[:n, 1:] = out[:n, :1]
+        self.frame += n
+        return n
+
+    def at_end(self):
+        return self._seek[0] == self._seek_seen and self.frame >= self.pcm.frames
+
+
+class MappedDecoder(threading.Thread):
+    """Plays an uncompressed WAV/AIFF file directly from a memory map.
+
+    Only usable when the file already has the output sample rate and either
+    the output channel count or one channel.  The thread does no decoding: it
+    reads ahead of the play position to fault pages in (building the overview
+    as it goes) and drops pages already played, so resident memory stays at a
+    few seconds of audio whatever the file size.
+    """
+
+    def __init__(self, path, samplerate=None, channels=None, max_frames=4096,
+                 lookahead_seconds=2.0, keep_seconds=1.0):
+        super().__init__(daemon=True)
+        self.path = path
+        pcm, rate = map_pcm(path)
+        if (samplerate and rate != samplerate) or (
+            channels and pcm.channels not in (1, channels)
+        ):
+            pcm.close()
+            raise UnsupportedFormat("%s needs conversion" % path)
+        self.samplerate = rate
+        self.channels = channels or pcm.channels
+        self.frames = pcm.frames
+        self.blocksize = 16384
+        self.gain_db = track_gain(path)
+        self.ring = PcmReader(pcm, self.channels, max_frames)
+        self.overview = PeakBuilder(self.frames)
+        # Separate mapping, so read-ahead never shares scratch with the callback
+        self._prefetch, _ = map_pcm(path)
+        self._prefetch.reserve(self.blocksize)
+        self._block = np.empty((self.blocksize, pcm.channels), dtype="float32")
+        self._lookahead = int(lookahead_seconds * rate)
+        self._keep = int(keep_seconds * rate)
+        self._ahead = 0
+        self._dropped = 0
+        self._wake = threading.Event()
+        self._closing = False
+
+    def prime(self):
+        self._read_ahead(self.blocksize)
+
+    def ahead(self):
+        """Frames paged in beyond the play position."""
+        return max(0, self._ahead - self.ring.frame)
+
+    def seek(self, frame):
+        self.ring.request_seek(frame)
+        self._ahead = frame
+        self._wake.set()
+
+    def stop(self):
+        self._closing = True
+        self._wake.set()
+        if self.is_alive():
+            self.join()
+        else:
+            self._release()
+
+    def _release(self):
+        # Decoders are only stopped once the callback can no longer reach them
+        pcm, self._prefetch = self._prefetch, None
+        if pcm is not None:
+            pcm.close()
+            self.ring.pcm.close()
+
+    def run(self):
+        try:
+            while not self._closing:
+                position = self.ring.frame
+                if self._ahead < position:
+                    self._ahead = position
+                self._read_ahead(position + self._lookahead)
+                behind = position - self._keep
+                if behind > self._dropped + self._keep and hasattr(mmap, "MADV_DONTNEED"):
+                    self.ring.pcm.advise(self._dropped, behind, mmap.MADV_DONTNEED)
+                    self._prefetch.advise(self._dropped, behind, mmap.MADV_DONTNEED)
+                    self._dropped = behind
+                elif behind < self._dropped:
+                    self._dropped = 0  # Seeked backwards
+                self._wake.wait(0.1)
+                self._wake.clear()
+        finally:
+            self._release()
+
+    def _read_ahead(self, until):
+        until = min(until, self.frames)
+        while self._ahead < until and not self._closing:
+            start = self._ahead
+            n = self._prefetch.convert(start, self._block[: min(self.blocksize, until - start)])
+            if not n:
+                break
+            self.overview.add(self._block[:n], start)
+            self._ahead = start + n
+
+
+def open_decoder(path, samplerate=None, channels=None, max_frames=4096, mapped=True,
+                 ahead_seconds=2.0):
+    """A MappedDecoder when the file can be played in place, else a StreamDecoder.
+
+    ``ahead_seconds`` is how much audio either keeps ready beyond the play
+    position.
+    """
+    if mapped:
+        try:
+            return MappedDecoder(path, samplerate, channels, max_frames, ahead_seconds)
+        except (UnsupportedFormat, OSError, ValueError, struct.error):
+            pass
+    return StreamDecoder(path, samplerate, channels, buffer_seconds=ahead_seconds)
@@ -0,0 +1,269 @@
+import math
+import time
+
+import numpy as np
+
+EQ_FREQUENCIES = (31, 62, 125, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+
+def peaking_sos(frequencies, gains_db, samplerate, q=1.41):
+    """RBJ peaking filters as an ``(n, 6)`` second-order-sections array."""
+    sos = np.zeros((len(frequencies), 6))
+    sos[:, 0] = sos[:, 3] = 1.0
+    for i, (freq, gain) in enumerate(zip(frequencies, gains_db)):
+        if gain == 0 or freq >= samplerate / 2:
+            continue
+        a = 10 ** (gain / 40)
+        w0 = 2 * math.pi * freq / samplerate
+        alpha = math.sin(w0) / (2 * q)
+        cos = math.cos(w0)
+        b = (1 + alpha * a, -2 * cos, 1 - alpha * a)
+        den = (1 + alpha / a, -2 * cos, 1 - alpha / a)
+        sos[i, :3] = np.divide(b, den[0])
+        sos[i, 3:] = np.divide(den, den[0])
+    return sos
+
+
+def db_to_gain(db):
+    return 10 ** (db / 20)
+
+
+class GainRamp:
+    """Volume that moves linearly to its target instead of jumping."""
+
+    def __init__(self, blocksize, ramp_frames):
+        self.gain = 1.0
+        self.target = 1.0
+        self.step = 1.0 / ramp_frames
+        self._index = np.arange(1, blocksize + 1, dtype="float32")
+        self._curve = np.empty(blocksize, dtype="float32")
+
+    def process(self, block):
+        gain, target = self.gain, self.target
+        if gain == target:
+            if gain != 1.0:
+                np.multiply(block, gain, out=block)
+            return
+        n = len(block)
+        curve = self._curve[:n]
+        delta = target - gain
+        # Full-scale change takes ``ramp_frames``; smaller ones are quicker
+        np.multiply(self._index[:n], math.copysign(self.step, delta), out=curve)
+        np.add(curve, gain, out=curve)
+        if delta > 0:
+            np.minimum(curve, target, out=curve)
+        else:
+            np.maximum(curve, target, out=curve)
+        np.multiply(block, curve[:, None], out=block)
+        self.gain = float(curve[-1])
+
+
+def _sosfilt_inplace(sos, x, zi):
+    """Public-API stand-in for ``scipy.signal._sosfilt._sosfilt``; allocates."""
+    from scipy.signal import sosfilt
+
+    filtered, state = sosfilt(sos, x, axis=-1, zi=zi.transpose(1, 0, 2))
+    x[:] = filtered
+    zi[:] = state.transpose(1, 0, 2)
+
+
+class Equalizer:
+    """Ten-band graphic EQ run with SciPy's second-order-sections filter.
+
+    Filters, filter state and the channel-major work buffer are float32 and
+    preallocated, and the block is filtered in place, so ``process``
+    allocates nothing.  The state restarts from silence whenever the EQ is
+    switched on.  The EQ is bypassed while every band is flat, or when SciPy
+    is not installed; SciPy is only imported once a band is actually changed.
+    """
+
+    def __init__(self, samplerate, channels, blocksize=0, frequencies=EQ_FREQUENCIES):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.frequencies = frequencies
+        self.gains = [0.0] * len(frequencies)
+        self.sos = None
+        self._filter = None  # (sos, zi), swapped as a whole
+        self._buffer = np.zeros((channels, blocksize), dtype="float32")
+        self._sosfilt = None
+
+    def set_gains(self, gains_db):
+        self.gains = [float(g) for g in gains_db]
+        if not any(self.gains):
+            self.sos = self._filter = None
+            return
+        if self._sosfilt is None:
+            try:
+                # Filters x (channels, frames) and zi (channels, sections, 2) in place
+                from scipy.signal._sosfilt import _sosfilt
+            except ImportError:
+                try:
+                    import scipy.signal  # noqa: F401
+                except ImportError:
+                    return
+                _sosfilt = _sosfilt_inplace
+            self._sosfilt = _sosfilt
+        sos = peaking_sos(self.frequencies, self.gains, self.samplerate).astype("float32")
+        if self._filter is not None and len(self._filter[0]) == len(sos):
+            zi = self._filter[1]
+        else:
+            # Coming out of bypass: the old state belongs to audio long gone
+            zi = np.zeros((self.channels, len(sos), 2), dtype="float32")
+        # Swapped in as a whole so the audio thread sees old or new filters
+        self._filter = (sos, zi)
+        self.sos = sos
+
+    def process(self, block):
+        active = self._filter
+        if active is None:
+            return
+        sos, zi = active
+        x = self._buffer
+        if x.shape[1] != len(block):
+            # Only for a block of unexpected length
+            x = self._buffer = np.empty((self.channels, len(block)), dtype="float32")
+        x[:] = block.T
+        self._sosfilt(sos, x, zi)
+        block[:] = x.T
+
+
+class Limiter:
+    """Block peak limiter: instant attack, smooth release, hard ceiling."""
+
+    def __init__(self, blocksize, ceiling=0.98, release_blocks=20):
+        self.ceiling = ceiling
+        self.release = 1.0 / release_blocks
+        self.ramp = GainRamp(blocksize, blocksize)
+
+    def process(self, block):
+        if not len(block):
+            return
+        peak = max(float(block.max()), -float(block.min()))
+        wanted = 1.0
+        if peak * self.ramp.gain > self.ceiling:
+            wanted = self.ceiling / peak
+        elif self.ramp.target < 1.0:
+            wanted = min(1.0, self.ramp.target + self.release)
+        self.ramp.target = wanted
+        if wanted < self.ramp.gain:
+            self.ramp.gain = wanted
+        self.ramp.process(block)
+        np.clip(block, -self.ceiling, self.ceiling, out=block)
+
+
+class DSPChain:
+    """Per-block effects applied by the audio callback.
+
+    ``stages`` run in order on each block, in place; by default EQ, volume
+    (including ReplayGain) and the limiter.  Any object with a
+    ``process(block)`` method can be added as a stage.  The time each block
+    takes is recorded against the callback deadline.
+    """
+
+    def __init__(self, samplerate, channels, blocksize, ramp_seconds=0.03):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.volume = 1.0
+        self.track_gain = 1.0
+        self.replaygain = True
+        self.preamp_db = 0.0
+        self.ramp = GainRamp(blocksize, max(1, int(samplerate * ramp_seconds)))
+        self.equalizer = Equalizer(samplerate, channels, blocksize)
+        self.limiter = Limiter(blocksize)
+        self.stages = (self.equalizer, self.ramp, self.limiter)
+        self._fade = (np.zeros(0, dtype="float32"), np.zeros(0, dtype="float32"))
+        self._fade_gain = 1.0  # Outgoing track's ReplayGain relative to the incoming one
+        self._mix = np.empty((blocksize, channels), dtype="float32")
+        self.times = np.zeros(512)  # Processing time of recent blocks, seconds
+        self.blocks = 0
+        self.overruns = 0  # Blocks that used more than the budget
+        self.budget = 0.5  # Share of the callback deadline the chain may use
+
+    def set_volume(self, value):
+        self.volume = value
+        self._update_gain()
+
+    def set_track_gain(self, db):
+        """ReplayGain adjustment for the current track; ``None`` for untagged."""
+        self.track_gain = db_to_gain(db) if db is not None else 1.0
+        self._update_gain()
+
+    def begin_crossfade(self, db):
+        """Switch ReplayGain to the incoming track of a crossfade.
+
+        The gain stage runs on the mixed block, so ``crossfade`` scales the
+        outgoing track by the ratio of the two gains to keep it at its own.
+        """
+        outgoing = self.track_gain
+        self.set_track_gain(db)
+        if self.replaygain:
+            self._fade_gain = outgoing / self.track_gain
+            # Rescaled rather than ramped: the outgoing track is compensated
+            # and the incoming one starts from silence
+            self.ramp.gain *= self.track_gain / outgoing
+        else:
+            self._fade_gain = 1.0
+
+    def set_preamp(self, db):
+        self.preamp_db = db
+        self._update_gain()
+
+    def _update_gain(self):
+        gain = self.volume
+        if self.replaygain:
+            gain *= self.track_gain * db_to_gain(self.preamp_db)
+        self.ramp.target = gain
+
+    def add_stage(self, stage, index=None):
+        stages = list(self.stages)
+        stages.insert(len(stages) if index is None else index, stage)
+        # Replaced, never mutated, so the audio thread iterates a stable tuple
+        self.stages = tuple(stages)
+
+    def remove_stage(self, stage):
+        self.stages = tuple(s for s in self.stages if s is not stage)
+
+    def set_eq(self, gains_db):
+        self.equalizer.set_gains(gains_db)
+
+    def set_crossfade(self, seconds):
+        frames = int(seconds * self.samplerate)
+        # Equal power: the two gains satisfy in**2 + out**2 == 1 throughout
+        angle = np.linspace(0, math.pi / 2, frames, dtype="float32")
+        self._fade = (np.sin(angle), np.cos(angle))
+
+    @property
+    def fade_frames(self):
+        return len(self._fade[0])
+
+    def crossfade(self, block, outgoing, position):
+        """Mix ``outgoing`` into ``block``, ``position`` frames into the fade."""
+        fade_in, fade_out = self._fade
+        end = min(position + len(block), len(fade_in))
+        k = max(end - position, 0)
+        mix = self._mix[:k]
+        np.multiply(block[:k], fade_in[position:end, None], out=block[:k])
+        np.multiply(outgoing[:k], fade_out[position:end, None], out=mix)
+        if self._fade_gain != 1.0:
+            np.multiply(mix, self._fade_gain, out=mix)
+        np.add(block[:k], mix, out=block[:k])
+
+    def process(self, block):
+        start = time.perf_counter()
+        for stage in self.stages:
+            stage.process(block)
+        elapsed = time.perf_counter() - start
+        self.times[self.blocks % len(self.times)] = elapsed
+        self.blocks += 1
+        if elapsed > self.budget * len(block) / self.samplerate:
+            self.overruns += 1
+
+    def load(self):
+        """Mean and worst recent processing time as a share of the deadline."""
+        count = min(self.blocks, len(self.times))
+        if not count:
+            return 0.0, 0.0
+        deadline = self.blocksize / self.samplerate
+        times = self.times[:count]
+        return float(times.mean() / deadline), float(times.max() / deadline)
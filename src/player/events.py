@@ -0,0 +1,26 @@
+import threading
+
+
+class Event:
+    """Minimal signal: callbacks connected to it run on ``emit``.
+
+    Callbacks run on the emitting thread; for the engine that is its
+    dispatcher thread, never the audio thread.  GUI code that needs them on
+    its own thread goes through ``ui.engine_adapter``.
+    """
+
+    def __init__(self):
+        self._callbacks = ()
+        self._lock = threading.Lock()
+
+    def connect(self, callback):
+        with self._lock:
+            self._callbacks = self._callbacks + (callback,)
+
+    def disconnect(self, callback):
+        with self._lock:
+            self._callbacks = tuple(c for c in self._callbacks if c != callback)
+
+    def emit(self, *args):
+        for callback in self._callbacks:
+            callback(*args)
@@ -0,0 +1,138 @@
+"""Low-overhead timing and glitch statistics for playback and the GUI.
+
+A Metric keeps its most recent samples, with timestamps, in preallocated
+arrays, plus a histogram over fixed bucket edges.  Recording only stores
+into those, so it is safe on the audio thread.  Each metric must have a
+single writer thread; readers take the arrays as they are, which at worst
+includes one sample still being written.
+"""
+
+import bisect
+import csv
+import json
+import time
+from array import array
+
+import numpy as np
+
+MS_EDGES = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 33, 50, 100, 250)
+
+
+class Metric:
+    def __init__(self, name, unit, edges, capacity=4096):
+        self.name = name
+        self.unit = unit
+        self.edges = tuple(edges)
+        self.capacity = capacity
+        self.times = np.zeros(capacity)
+        self.values = np.zeros(capacity)
+        self.counts = array("q", [0] * (len(self.edges) + 1))
+        self.total = 0
+
+    def record(self, value, now=None):
+        i = self.total % self.capacity
+        self.times[i] = time.perf_counter() if now is None else now
+        self.values[i] = value
+        self.counts[bisect.bisect_right(self.edges, value)] += 1
+        # Advanced last, so readers never see a slot before it is written
+        self.total += 1
+
+    def recent(self):
+        """Copies of the retained ``(times, values)``, oldest first."""
+        total = self.total
+        index = np.arange(max(0, total - self.capacity), total) % self.capacity
+        return self.times[index], self.values[index]
+
+    def summary(self):
+        _, values = self.recent()
+        result = {"unit": self.unit, "count": self.total}
+        if len(values):
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            result.update(
+                mean=float(values.mean()),
+                p50=float(p50),
+                p95=float(p95),
+                p99=float(p99),
+                max=float(values.max()),
+            )
+        result["histogram"] = {"edges": list(self.edges), "counts": list(self.counts)}
+        return result
+
+    def reset(self):
+        self.total = 0
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+
+
+class Instrumentation:
+    """Named metrics plus counters read through getters when summarized."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.metrics = {}
+        self._counters = {}
+
+    def add_metric(self, name, unit, edges, capacity=4096):
+        if name not in self.metrics:
+            self.metrics[name] = Metric(name, unit, edges, capacity)
+        return self.metrics[name]
+
+    def watch(self, name, getter):
+        """Report ``getter()`` as counter ``name``; replaces an earlier getter."""
+        self._counters[name] = getter
+
+    def counters(self):
+        return {name: getter() for name, getter in self._counters.items()}
+
+    def summary(self):
+        return {
+            "uptime": time.perf_counter() - self.started,
+            "counters": self.counters(),
+            "metrics": {name: m.summary() for name, m in self.metrics.items()},
+        }
+
+    def reset(self):
+        self.started = time.perf_counter()
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def export_json(self, path):
+        """Summaries plus every retained sample, timestamps relative to start."""
+        data = self.summary()
+        for name, metric in self.metrics.items():
+            times, values = metric.recent()
+            data["metrics"][name]["samples"] = {
+                "time": (times - self.started).tolist(),
+                "value": values.tolist(),
+            }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+
+    def export_csv(self, path):
+        """One ``metric,time,value`` row per retained sample."""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(("metric", "time", "value"))
+            for name, metric in self.metrics.items():
+                times, values = metric.recent()
+                for t, v in zip((times - self.started).tolist(), values.tolist()):
+                    writer.writerow((name, "%.6f" % t, "%.6g" % v))
+
+    def export(self, path):
+        if path.lower().endswith(".csv"):
+            self.export_csv(path)
+        else:
+            self.export_json(path)
+
+
+instruments = Instrumentation()
+# Callback time as a share of its block's deadline; 1.0 and up is a glitch risk
+callback_load = instruments.add_metric(
+    "callback_load", "x deadline", (0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9, 1.0, 1.5, 2.0)
+)
+decode_ahead = instruments.add_metric(
+    "decode_ahead", "s", (0.02, 0.05, 0.1, 0.25, 0.5, 1.0, 1.5, 2.0, 3.0)
+)
+fft_time = instruments.add_metric("fft", "ms", MS_EDGES)
+paint_time = instruments.add_metric("paint", "ms", MS_EDGES)
+event_loop_lag = instruments.add_metric("event_loop_lag", "ms", MS_EDGES)
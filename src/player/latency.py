@@ -0,0 +1,96 @@
+"""Output latency profiles and the controller that adapts them to glitches."""
+
+from collections import deque, namedtuple
+
+# Steps of (callback blocksize in frames, suggested stream latency in seconds),
+# from the tightest to the most forgiving
+LEVELS = (
+    (128, 0.005),
+    (256, 0.010),
+    (512, 0.020),
+    (1024, 0.040),
+    (2048, 0.080),
+    (4096, 0.160),
+)
+MAX_BLOCKSIZE = LEVELS[-1][0]
+MAX_AHEAD_SECONDS = 8.0
+
+# ``level`` indexes LEVELS and is the floor the controller returns to;
+# ``ahead_seconds`` is how far decoders run ahead of playback at that level
+LatencyProfile = namedtuple("LatencyProfile", "name level ahead_seconds")
+
+PROFILES = {
+    "low-latency": LatencyProfile("low-latency", 1, 1.0),
+    "balanced": LatencyProfile("balanced", 3, 2.0),
+    "power-saving": LatencyProfile("power-saving", 5, 8.0),
+}
+DEFAULT_PROFILE = "balanced"
+
+
+class AdaptiveLatency:
+    """Picks the current level from a profile and the engine's glitch count.
+
+    ``update`` is fed the running xrun count.  ``grow_after`` glitches within
+    ``window`` seconds move one level up; ``stable_for`` seconds without
+    glitches or changes move one level back down, but never below the
+    profile.  With ``enabled`` off the level stays at the profile's.
+    """
+
+    def __init__(self, profile=DEFAULT_PROFILE, grow_after=3, window=10.0, stable_for=60.0):
+        self.grow_after = grow_after
+        self.window = window
+        self.stable_for = stable_for
+        self.enabled = True
+        self._glitches = deque()  # times of recent xruns, at most grow_after
+        self._xruns = None
+        self._quiet_since = None
+        self.set_profile(profile)
+
+    def set_profile(self, name):
+        self.profile = PROFILES[name]
+        self.level = self.profile.level
+        self._glitches.clear()
+        self._quiet_since = None
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        if not enabled:
+            self.level = self.profile.level
+
+    @property
+    def blocksize(self):
+        return LEVELS[self.level][0]
+
+    @property
+    def latency(self):
+        return LEVELS[self.level][1]
+
+    @property
+    def ahead_seconds(self):
+        steps = self.level - self.profile.level
+        return min(self.profile.ahead_seconds * 2**steps, MAX_AHEAD_SECONDS)
+
+    def update(self, xruns, now):
+        """Return the new level when it should change, else ``None``."""
+        new = 0 if self._xruns is None else xruns - self._xruns
+        self._xruns = xruns
+        if self._quiet_since is None:
+            self._quiet_since = now
+        if new > 0:
+            self._glitches.extend([now] * min(new, self.grow_after))
+            self._quiet_since = now
+        while len(self._glitches) > self.grow_after or (
+            self._glitches and self._glitches[0] < now - self.window
+        ):
+            self._glitches.popleft()
+        if not self.enabled:
+            return None
+        if len(self._glitches) >= self.grow_after and self.level < len(LEVELS) - 1:
+            self.level += 1
+        elif self.level > self.profile.level and now - self._quiet_since >= self.stable_for:
+            self.level -= 1
+        else:
+            return None
+        self._glitches.clear()
+        self._quiet_since = now
+        return self.level
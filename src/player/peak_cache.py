@@ -0,0 +1,197 @@
+import hashlib
+import multiprocessing
+import os
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from utils.file_utils import cache_dir, file_identity
+
+# Peak files hold a pyramid of (min, max, rms) triples, like DAW .reapeaks
+# files.  Level 0 summarizes BASE_FRAMES frames per peak and every further
+# level summarizes LEVEL_FACTOR peaks of the one below it.
+MAGIC = b"AMPK"
+VERSION = 1
+BASE_FRAMES = 256
+LEVEL_FACTOR = 4
+MIN_LEVEL_PEAKS = 256
+HEADER = struct.Struct("<4sHHIQI")  # magic, version, levels, samplerate, frames, base
+SCALE = 32767.0
+
+
+def peak_path(path):
+    """Location of the cached peak file for ``path`` in its current state."""
+    key = "\0".join(str(part) for part in file_identity(path))
+    name = hashlib.sha1(key.encode("utf-8", "surrogateescape")).hexdigest()
+    return os.path.join(cache_dir("peaks"), name + ".ampk")
+
+
+def _reduce_level(level):
+    """Combine LEVEL_FACTOR neighbouring (min, max, rms) peaks into one."""
+    count = -(-len(level) // LEVEL_FACTOR)
+    padded = np.zeros((count * LEVEL_FACTOR, 3), dtype="float32")
+    padded[: len(level)] = level
+    groups = padded.reshape(count, LEVEL_FACTOR, 3)
+    out = np.empty((count, 3), dtype="float32")
+    out[:, 0] = groups[:, :, 0].min(axis=1)
+    out[:, 1] = groups[:, :, 1].max(axis=1)
+    out[:, 2] = np.sqrt((groups[:, :, 2] ** 2).mean(axis=1))
+    return out
+
+
+def build_peak_file(path, blocksize=BASE_FRAMES * 1024):
+    """Decode ``path`` once and write its peak pyramid to the cache.
+
+    Runs in worker processes, so it only takes and returns plain values.
+    """
+    from player.backends import open_backend
+
+    target = peak_path(path)
+    if os.path.exists(target):
+        return path
+    chunks = []
+    source = open_backend(path)
+    samplerate, frames = source.samplerate, source.frames
+    buffer = np.empty((blocksize, source.channels), dtype="float32")
+    try:
+        while True:
+            block = source.read(buffer)
+            if not len(block):
+                break
+            mono = block.mean(axis=1)
+            count = -(-len(mono) // BASE_FRAMES)
+            padded = np.zeros(count * BASE_FRAMES, dtype="float32")
+            padded[: len(mono)] = mono
+            groups = padded.reshape(count, BASE_FRAMES)
+            chunk = np.empty((count, 3), dtype="float32")
+            chunk[:, 0] = groups.min(axis=1)
+            chunk[:, 1] = groups.max(axis=1)
+            chunk[:, 2] = np.sqrt((groups**2).mean(axis=1))
+            chunks.append(chunk)
+    finally:
+        source.close()
+    levels = [np.concatenate(chunks) if chunks else np.zeros((0, 3), dtype="float32")]
+    while len(levels[-1]) > MIN_LEVEL_PEAKS:
+        levels.append(_reduce_level(levels[-1]))
+
+    tmp = "%s.%d.tmp" % (target, os.getpid())
+    with open(tmp, "wb") as out:
+        out.write(HEADER.pack(MAGIC, VERSION, len(levels), samplerate, frames, BASE_FRAMES))
+        out.write(np.array([len(level) for level in levels], dtype="<u4").tobytes())
+        for level in levels:
+            scaled = np.clip(level * SCALE, -SCALE, SCALE).astype("<i2")
+            out.write(scaled.tobytes())
+    os.replace(tmp, target)
+    return path
+
+
+class PeakFile:
+    """Memory-mapped peak pyramid; opening one does not decode any audio."""
+
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            magic, version, levels, samplerate, frames, base = HEADER.unpack(
+                f.read(HEADER.size)
+            )
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("Not a peak file: %s" % filename)
+            counts = np.frombuffer(f.read(4 * levels), dtype="<u4")
+        self.samplerate = samplerate
+        self.frames = frames
+        self.base = base
+        data = np.memmap(filename, dtype="<i2", mode="r", offset=HEADER.size + 4 * levels)
+        self.levels = []
+        start = 0
+        for count in counts:
+            count = int(count)
+            self.levels.append(data[start * 3 : (start + count) * 3].reshape(count, 3))
+            start += count
+
+    def columns(self, width):
+        """Return ``(mins, maxs, rms)`` arrays of ``width`` values in -1..1."""
+        # Coarsest level that still has at least one peak per column
+        level = self.levels[0]
+        for candidate in self.levels:
+            if len(candidate) >= width:
+                level = candidate
+        if len(level) == 0:
+            zeros = np.zeros(width, dtype="float32")
+            return zeros, zeros, zeros
+        edges = np.minimum(
+            np.arange(width, dtype=np.int64) * len(level) // width, len(level) - 1
+        )
+        mins = np.minimum.reduceat(level[:, 0], edges) / SCALE
+        maxs = np.maximum.reduceat(level[:, 1], edges) / SCALE
+        rms = np.maximum.reduceat(level[:, 2], edges) / SCALE
+        return mins, maxs, rms
+
+
+def load_peaks(path):
+    """Open the cached pyramid for ``path``, or return ``None`` if missing."""
+    try:
+        return PeakFile(peak_path(path))
+    except (OSError, ValueError):
+        return None
+
+
+class PeakCacheService:
+    """Builds missing peak files in a background process pool."""
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def request(self, paths, on_ready=None):
+        """Queue pyramid generation for every path not cached yet.
+
+        ``on_ready(path)`` is called from a pool management thread.
+        """
+        for path in paths:
+            try:
+                if os.path.exists(peak_path(path)):
+                    continue
+            except OSError:
+                continue
+            with self._lock:
+                if path in self._pending:
+                    continue
+                self._pending.add(path)
+            future = self._submit(path)
+            future.add_done_callback(
+                lambda future, path=path: self._done(path, future, on_ready)
+            )
+
+    def _done(self, path, future, on_ready):
+        with self._lock:
+            self._pending.discard(path)
+        if future.cancelled() or future.exception() is not None:
+            return
+        if on_ready is not None:
+            on_ready(path)
+
+    def _submit(self, path):
+        try:
+            return self._pool().submit(build_peak_file, path)
+        except BrokenProcessPool:
+            # A worker died (say on a corrupt file); carry on with a fresh pool
+            self.shutdown()
+            return self._pool().submit(build_peak_file, path)
+
+    def _pool(self):
+        if self._executor is None:
+            # Spawn rather than fork: the GUI process runs audio and Qt threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,57 @@
+import numpy as np
+
+
+def bucket_edges(frames, buckets):
+    """First frame of each of ``buckets`` equal-width buckets over ``frames``."""
+    return np.arange(buckets, dtype=np.int64) * frames // buckets
+
+
+def reduce_peaks(samples, buckets):
+    """Reduce ``samples`` to per-bucket ``(mins, maxs)`` envelopes."""
+    mono = samples.mean(axis=1) if samples.ndim > 1 else samples
+    if len(mono) == 0:
+        zeros = np.zeros(buckets, dtype="float32")
+        return zeros, zeros.copy()
+    edges = np.minimum(bucket_edges(len(mono), buckets), len(mono) - 1)
+    return np.minimum.reduceat(mono, edges), np.maximum.reduceat(mono, edges)
+
+
+class PeakBuilder:
+    """Min/max overview of a track, filled in as blocks are decoded.
+
+    Blocks may arrive in any order (the decoder seeks), so each one is reduced
+    on its own and merged into the buckets it overlaps.
+    """
+
+    def __init__(self, frames, buckets=512):
+        self.frames = max(int(frames), 1)
+        self.buckets = buckets
+        self.mins = np.zeros(buckets, dtype="float32")
+        self.maxs = np.zeros(buckets, dtype="float32")
+
+    def add(self, block, start):
+        n = len(block)
+        if n == 0 or start >= self.frames:
+            return
+        mono = block.mean(axis=1) if block.ndim > 1 else block
+        first = start * self.buckets // self.frames
+        last = min((start + n - 1) * self.buckets // self.frames, self.buckets - 1)
+        # Offsets into the block where each overlapped bucket begins
+        offsets = bucket_edges(self.frames, self.buckets)[first : last + 1] - start
+        offsets[0] = 0
+        np.minimum(
+            self.mins[first : last + 1],
+            np.minimum.reduceat(mono, offsets),
+            out=self.mins[first : last + 1],
+        )
+        np.maximum(
+            self.maxs[first : last + 1],
+            np.maximum.reduceat(mono, offsets),
+            out=self.maxs[first : last + 1],
+        )
+
+    def envelope(self):
+        """Peak magnitude per bucket, normalized to 0..1."""
+        env = np.maximum(-self.mins, self.maxs)
+        top = env.max()
+        return env / top if top > 0 else env
@@ -1,68 +1,169 @@
 import os
-import random
+import sys
+
+import numpy as np
+
+from player.track_list import TrackList
 
 
 class Playlist:
+    """Play queue with shuffle history and O(log n) edits.
+
+    Every added file gets an integer entry id; ``_paths`` maps ids to interned
+    path strings and ``_order`` holds the ids in playlist order.  Shuffle mode
+    walks a NumPy permutation of ids with a cursor, so ``prev()`` really goes
+    back and adding files does not throw the current shuffle away.
+    """
+
     def __init__(self):
-        self.tracks = []
-        self.index = 0
+        self._paths = []  # entry id -> interned path, None once removed
+        self._order = TrackList()
+        self._current = None  # entry id of the current track
         self.shuffle_mode = False
         self.repeat_mode = False
         self.repeat_one = False
-        self._shuffled_indices = []
+        self._shuffle = np.zeros(0, dtype=np.int64)  # permutation of entry ids
+        self._cursor = -1  # position of the current track in _shuffle
+        self._dead = 0  # removed ids still present in _shuffle
+        self._entry_of = None  # path -> first live entry id, built on demand
+        self._rng = np.random.default_rng()
 
     def add_files(self, files):
-        self.tracks.extend(files)
-        self._reset_shuffle()
+        first = len(self._paths)
+        self._paths.extend(sys.intern(f) for f in files)
+        ids = np.arange(first, len(self._paths), dtype=np.int64)
+        self._order.extend(ids.tolist())
+        if self._entry_of is not None:
+            for entry in range(first, len(self._paths)):
+                self._entry_of.setdefault(self._paths[entry], entry)
+        if self._current is None and len(ids):
+            self._current = first
+        if self.shuffle_mode and len(self._shuffle):
+            # Scatter the new tracks over the part of the shuffle not yet played
+            slots = self._rng.integers(self._cursor + 1, len(self._shuffle) + 1, len(ids))
+            self._shuffle = np.insert(self._shuffle, np.sort(slots), self._rng.permutation(ids))
+
+    def remove(self, idx):
+        """Remove the track at position ``idx``."""
+        entry = self._order.pop(idx)
+        if self._entry_of is not None and self._entry_of.get(self._paths[entry]) == entry:
+            self._entry_of = None  # Another entry may have the same path
+        self._paths[entry] = None
+        self._dead += 1
+        if entry == self._current:
+            if len(self._order):
+                self._current = self._order[min(idx, len(self._order) - 1)]
+                if self.shuffle_mode and self._cursor >= 0:
+                    # Give the new current track the cursor's slot, so next()
+                    # moves on from it instead of arriving at it again
+                    where = np.flatnonzero(self._shuffle == self._current)
+                    if len(where):
+                        slots = [self._cursor, int(where[0])]
+                        self._shuffle[slots] = self._shuffle[slots[::-1]]
+            else:
+                self._current = None
+        if self._dead > len(self._shuffle) // 2:
+            self._compact_shuffle()
+
+    def move(self, src, dst):
+        """Move the track at position ``src`` so it ends up at ``dst``."""
+        self._order.insert(dst, self._order.pop(src))
+
+    @property
+    def tracks(self):
+        """All paths in playlist order (builds a new list, O(n))."""
+        return [self._paths[entry] for entry in self._order]
+
+    @property
+    def index(self):
+        if self._current is None:
+            return 0
+        return self._order.index_of(self._current)
+
+    def __len__(self):
+        return len(self._order)
+
+    def __iter__(self):
+        for entry in self._order:
+            yield self._paths[entry]
+
+    def position_of(self, path):
+        """Position of ``path`` in the playlist, or ``None``; O(log n) after the first call."""
+        if self._entry_of is None:
+            # Built back to front, so the first entry of a repeated path wins
+            ids = range(len(self._paths) - 1, -1, -1)
+            self._entry_of = dict(zip(reversed(self._paths), ids))
+            self._entry_of.pop(None, None)
+        entry = self._entry_of.get(path)
+        if entry is None:
+            return None
+        return self._order.index_of(entry)
+
+    def track_at(self, idx):
+        return self._paths[self._order[idx]]
 
     def get_filenames(self):
         return [os.path.basename(f) for f in self.tracks]
 
     def set_index(self, idx):
-        if 0 <= idx < len(self.tracks):
-            self.index = idx
+        if 0 <= idx < len(self._order):
+            self._current = self._order[idx]
 
     def current(self):
-        if self.tracks:
-            return self.tracks[self.index]
+        if self._current is not None:
+            return self._paths[self._current]
         return None
 
     def next(self):
-        if not self.tracks:
+        if self._current is None:
             return None
         if self.repeat_one:
             # Stay on the same track
-            return self.tracks[self.index]
+            return self.current()
         if self.shuffle_mode:
-            if not self._shuffled_indices:
-                self._reset_shuffle()
-            self.index = self._shuffled_indices.pop(0)
+            self._cursor = self._next_cursor()
+            self._current = int(self._shuffle[self._cursor])
         else:
-            self.index += 1
-            if self.index >= len(self.tracks):
-                if self.repeat_mode:
-                    self.index = 0
-                else:
-                    self.index = len(self.tracks) - 1
-        return self.tracks[self.index]
+            index = self.index + 1
+            if index >= len(self._order):
+                index = 0 if self.repeat_mode else len(self._order) - 1
+            self._current = self._order[index]
+        return self.current()
+
+    def peek_next(self):
+        """Return the track ``next()`` would move to, without moving."""
+        if self._current is None:
+            return None
+        if self.repeat_one:
+            return self.current()
+        if self.shuffle_mode:
+            return self._paths[int(self._shuffle[self._next_cursor()])]
+        index = self.index + 1
+        if index >= len(self._order):
+            if not self.repeat_mode:
+                return None
+            index = 0
+        return self.track_at(index)
 
     def prev(self):
-        if not self.tracks:
+        if self._current is None:
             return None
         if self.shuffle_mode:
-            if not self._shuffled_indices:
-                self._reset_shuffle()
-            self.index = self._shuffled_indices.pop(0)
+            # Walk back through the tracks shuffle actually played
+            cursor = self._cursor - 1
+            while cursor >= 0 and self._paths[self._shuffle[cursor]] is None:
+                cursor -= 1
+            if cursor >= 0:
+                self._cursor = cursor
+                self._current = int(self._shuffle[cursor])
         elif self.repeat_one:
-            return self.tracks[self.index]
+            return self.current()
         else:
-            self.index -= 1
-            if self.index < 0:
-                if self.repeat_mode:
-                    self.index = len(self.tracks) - 1
-                else:
-                    self.index = 0
-        return self.tracks[self.index]
+            index = self.index - 1
+            if index < 0:
+                index = len(self._order) - 1 if self.repeat_mode else 0
+            self._current = self._order[index]
+        return self.current()
 
     def set_shuffle(self, enabled):
         self.shuffle_mode = enabled
@@ -74,10 +175,77 @@ class Playlist:
     def set_repeat_one(self, enabled):
         self.repeat_one = enabled
 
-    def _reset_shuffle(self):
-        if self.shuffle_mode and self.tracks:
-            indices = list(range(len(self.tracks)))
-            random.shuffle(indices)
-            self._shuffled_indices = indices
+    def snapshot(self):
+        """Return the queue state as plain data for session persistence.
+
+        The shuffle permutation is expressed in playlist positions, so it does
+        not depend on entry ids.
+        """
+        ids = np.fromiter(self._order, dtype=np.int64, count=len(self._order))
+        position = np.full(len(self._paths), -1, dtype=np.int64)
+        position[ids] = np.arange(len(ids))
+        shuffle = position[self._shuffle]
+        alive = shuffle >= 0
+        return {
+            "paths": [self._paths[entry] for entry in ids],
+            "index": self.index if self._current is not None else -1,
+            "shuffle": shuffle[alive],
+            "cursor": int(alive[: self._cursor + 1].sum()) - 1,
+            "shuffle_mode": self.shuffle_mode,
+            "repeat_mode": self.repeat_mode,
+            "repeat_one": self.repeat_one,
+        }
+
+    def restore(self, state):
+        """Replace the queue with one produced by ``snapshot()``."""
+        self._paths = []
+        self._order = TrackList()
+        self._current = None
+        self._dead = 0
+        self._entry_of = None
+        self._shuffle = np.zeros(0, dtype=np.int64)
+        self.shuffle_mode = state["shuffle_mode"]
+        self.repeat_mode = state["repeat_mode"]
+        self.repeat_one = state["repeat_one"]
+        self.add_files(state["paths"])
+        # Entry ids of a fresh playlist equal their positions
+        self._shuffle = np.asarray(state["shuffle"], dtype=np.int64)
+        self._cursor = state["cursor"]
+        if state["index"] >= 0:
+            self.set_index(state["index"])
+
+    def _next_cursor(self):
+        cursor = self._cursor + 1
+        while cursor < len(self._shuffle) and self._paths[self._shuffle[cursor]] is None:
+            cursor += 1
+        if cursor >= len(self._shuffle):
+            # Every track has been played once: start a fresh round
+            self._reset_shuffle(keep_current=False)
+            cursor = 0
+        return cursor
+
+    def _reset_shuffle(self, keep_current=True):
+        if self.shuffle_mode and self._current is not None:
+            ids = np.fromiter(self._order, dtype=np.int64, count=len(self._order))
+            self._shuffle = self._rng.permutation(ids)
+            self._dead = 0
+            self._cursor = -1
+            if keep_current:
+                # The current track opens the history, so prev() returns to it
+                where = int(np.flatnonzero(self._shuffle == self._current)[0])
+                self._shuffle[[0, where]] = self._shuffle[[where, 0]]
+                self._cursor = 0
         else:
-            self._shuffled_indices = []
+            self._shuffle = np.zeros(0, dtype=np.int64)
+            self._cursor = -1
+            self._dead = 0
+
+    def _compact_shuffle(self):
+        alive = np.fromiter(
+            (self._paths[entry] is not None for entry in self._shuffle),
+            dtype=bool,
+            count=len(self._shuffle),
+        )
+        self._cursor = int(alive[: self._cursor + 1].sum()) - 1
+        self._shuffle = self._shuffle[alive]
+        self._dead = 0
@@ -0,0 +1,79 @@
+import os
+import pathlib
+import xml.etree.ElementTree as ET
+from html import escape
+from urllib.parse import unquote, urlparse
+
+XSPF_NS = "{http://xspf.org/ns/0/}"
+
+
+def _resolve(entry, base):
+    if entry.startswith("file://"):
+        return unquote(urlparse(entry).path)
+    if "://" in entry:
+        return entry
+    return os.path.normpath(os.path.join(base, entry))
+
+
+def iter_m3u(path):
+    """Yield track paths from an M3U/M3U8 playlist, one line at a time."""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8-sig", errors="surrogateescape") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield _resolve(line, base)
+
+
+def iter_xspf(path):
+    """Yield track paths from an XSPF playlist without building the whole tree."""
+    base = os.path.dirname(os.path.abspath(path))
+    open_elements = []
+    for event, elem in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            open_elements.append(elem)
+            continue
+        open_elements.pop()
+        if elem.tag == XSPF_NS + "location" and elem.text:
+            yield _resolve(elem.text.strip(), base)
+        elif elem.tag == XSPF_NS + "track":
+            elem.clear()
+            if open_elements:
+                # Detach it too; earlier tracks are gone, so it is the first child
+                open_elements[-1].remove(elem)
+
+
+def iter_playlist(path):
+    if path.lower().endswith(".xspf"):
+        return iter_xspf(path)
+    return iter_m3u(path)
+
+
+def _write_atomic(path, lines):
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp, "w", encoding="utf-8", errors="surrogateescape") as f:
+        f.writelines(lines)
+    os.replace(tmp, path)
+
+
+def _m3u_lines(tracks):
+    yield "#EXTM3U\n"
+    for track in tracks:
+        yield track + "\n"
+
+
+def _xspf_lines(tracks):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<playlist version="1" xmlns="http://xspf.org/ns/0/">\n  <trackList>\n'
+    for track in tracks:
+        uri = pathlib.Path(os.path.abspath(track)).as_uri() if "://" not in track else track
+        yield "    <track><location>%s</location></track>\n" % escape(uri, quote=False)
+    yield "  </trackList>\n</playlist>\n"
+
+
+def write_playlist(path, tracks):
+    """Stream ``tracks`` (any iterable of paths) to an M3U8 or XSPF file."""
+    if path.lower().endswith(".xspf"):
+        _write_atomic(path, _xspf_lines(tracks))
+    else:
+        _write_atomic(path, _m3u_lines(tracks))
@@ -0,0 +1,91 @@
+from math import gcd
+
+import numpy as np
+
+
+def mix_matrix(in_channels, out_channels):
+    """Matrix that maps ``in_channels`` to ``out_channels`` (block @ matrix)."""
+    if in_channels == 6 and out_channels == 2:
+        # ITU-style 5.1 downmix (L, R, C, LFE, Ls, Rs), LFE dropped
+        c = 0.7071
+        matrix = np.array(
+            [[1, 0], [0, 1], [c, c], [0, 0], [c, 0], [0, c]], dtype="float32"
+        )
+        return matrix / matrix.sum(axis=0)
+    if in_channels == 1:
+        return np.ones((1, out_channels), dtype="float32")
+    # Fold input channels round-robin onto the outputs and average them
+    matrix = np.zeros((in_channels, out_channels), dtype="float32")
+    for ch in range(in_channels):
+        matrix[ch, ch % out_channels] = 1.0
+    return matrix / np.maximum(matrix.sum(axis=0), 1.0)
+
+
+def polyphase_bank(up, down, taps_per_phase=32, beta=8.6, rolloff=0.94):
+    """Kaiser-windowed sinc lowpass split into ``up`` phases of equal length."""
+    length = taps_per_phase * up
+    # Cutoff relative to the input rate, below both Nyquist limits
+    cutoff = rolloff * min(1.0, up / down) / up
+    n = np.arange(length) - (length - 1) / 2
+    h = cutoff * np.sinc(cutoff * n) * np.kaiser(length, beta)
+    bank = h.reshape(taps_per_phase, up).T
+    # Every phase gets unity DC gain, so no phase is louder than another
+    bank /= bank.sum(axis=1, keepdims=True)
+    return np.ascontiguousarray(bank, dtype="float32")
+
+
+class Resampler:
+    """Streaming rational-ratio resampler for ``frames x channels`` blocks.
+
+    Each output frame is a dot product of one filter phase with the most
+    recent ``taps`` input frames; a block's outputs are computed together with
+    one gather and one einsum.  The tail of every block is carried over, so
+    splitting the input into blocks of any size gives the same result.
+    """
+
+    def __init__(self, in_rate, out_rate, channels, taps_per_phase=32):
+        g = gcd(int(in_rate), int(out_rate))
+        self.up = int(out_rate) // g
+        self.down = int(in_rate) // g
+        self.channels = channels
+        self.taps = taps_per_phase
+        self.bank = polyphase_bank(self.up, self.down, taps_per_phase)
+        self._offsets = np.arange(self.taps)
+        self.reset()
+
+    def reset(self):
+        self._history = np.zeros((self.taps - 1, self.channels), dtype="float32")
+        # Start half a filter late, which cancels the filter's group delay
+        self._pos = (self.taps * self.up - 1) // 2
+        self._consumed = 0
+        self._produced = 0
+
+    def output_frames(self, frames):
+        """Upper bound on the output size for an input block of ``frames``."""
+        return frames * self.up // self.down + 2
+
+    def process(self, block):
+        n = len(block)
+        self._consumed += n
+        buf = np.concatenate((self._history, block))
+        hist = self.taps - 1
+        # Output k reads input frame (pos + k * down) // up; stop before the end
+        count = max(0, -(-(n * self.up - self._pos) // self.down))
+        positions = self._pos + np.arange(count) * self.down
+        phases = positions % self.up
+        newest = positions // self.up + hist
+        frames = buf[newest[:, None] - self._offsets[None, :]]
+        out = np.einsum("kt,ktc->kc", self.bank[phases], frames).astype("float32", copy=False)
+        self._pos += count * self.down - n * self.up
+        self._history = buf[len(buf) - hist :]
+        self._produced += count
+        return out
+
+    def flush(self):
+        """Drain the filter tail after the last block of a stream."""
+        expected = -(-self._consumed * self.up // self.down)
+        missing = expected - self._produced
+        if missing <= 0:
+            return np.zeros((0, self.channels), dtype="float32")
+        pad = np.zeros((self.taps, self.channels), dtype="float32")
+        return self.process(pad)[:missing]
@@ -0,0 +1,124 @@
+import numpy as np
+
+
+class RingBuffer:
+    """Single-producer/single-consumer ring buffer of float32 audio frames.
+
+    The producer only ever advances ``_write`` and the consumer only ever
+    advances ``_read``.  Both are monotonically increasing frame counters, so
+    no lock is needed as long as there is exactly one thread on each side.
+    """
+
+    def __init__(self, capacity, channels):
+        self.capacity = capacity
+        self.channels = channels
+        self.buffer = np.zeros((capacity, channels), dtype="float32")
+        self.frame = 0  # source frame at the read position
+        self._write = 0
+        self._read = 0
+        self._end = None  # write index at end of stream
+        self._flush = (0, 0, 0)  # (sequence, write index, source frame)
+        self._flush_seen = 0
+        # Set by the consumer from a flush until it first reads a full block
+        self.refilling = False
+
+    def available(self):
+        return self._write - self._read
+
+    def free(self):
+        return self.capacity - (self._write - self._read)
+
+    # Producer side
+
+    def write(self, block):
+        """Copy as many frames of ``block`` as fit, returning the count."""
+        n = min(len(block), self.free())
+        if n <= 0:
+            return 0
+        start = self._write % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start : start + first] = block[:first]
+        if n > first:
+            self.buffer[: n - first] = block[first:n]
+        self._write += n
+        return n
+
+    def mark_end(self):
+        self._end = self._write
+
+    def request_flush(self, frame):
+        """Discard everything queued so far; new data starts at ``frame``.
+
+        The consumer applies the flush on its next read, so the producer may
+        keep writing immediately.
+        """
+        self._end = None
+        self._flush = (self._flush[0] + 1, self._write, frame)
+
+    # Consumer side
+
+    def read_into(self, out):
+        """Fill ``out`` with up to ``len(out)`` frames, returning the count."""
+        seq, index, frame = self._flush
+        if seq != self._flush_seen:
+            self._flush_seen = seq
+            self._read = index
+            self.frame = frame
+            self.refilling = True
+        n = min(len(out), self._write - self._read)
+        if n == len(out):
+            self.refilling = False
+        if n <= 0:
+            return 0
+        start = self._read % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self.buffer[start : start + first]
+        if n > first:
+            out[first:n] = self.buffer[: n - first]
+        self._read += n
+        self.frame += n
+        return n
+
+    def skip(self, n):
+        """Drop up to ``n`` queued frames without copying them."""
+        n = min(n, self._write - self._read)
+        self._read += n
+        self.frame += n
+        return n
+
+    def at_end(self):
+        end = self._end
+        return end is not None and self._read >= end
+
+
+class EventRing:
+    """Fixed-size single-producer/single-consumer queue of integer events.
+
+    ``push`` only stores into preallocated slots, so it is safe to call from
+    the realtime audio thread.  Events are dropped when the ring is full.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self._kinds = [0] * capacity
+        self._values = [0] * capacity
+        self._write = 0
+        self._read = 0
+
+    def push(self, kind, value=0):
+        if self._write - self._read >= self.capacity:
+            return False
+        slot = self._write % self.capacity
+        self._kinds[slot] = kind
+        self._values[slot] = value
+        self._write += 1
+        return True
+
+    def pop(self):
+        """Return the next ``(kind, value)`` pair, or ``None`` when empty."""
+        if self._read == self._write:
+            return None
+        slot = self._read % self.capacity
+        event = (self._kinds[slot], self._values[slot])
+        self._read += 1
+        return event
@@ -0,0 +1,118 @@
+import os
+import struct
+import threading
+
+import numpy as np
+
+# Binary session snapshot: a fixed header, the playlist paths as one
+# NUL-separated UTF-8 blob, then the shuffle permutation as int64 positions.
+MAGIC = b"AMPS"
+VERSION = 1
+HEADER = struct.Struct("<4sHBxqqqdQ")  # magic, version, flags, count, index, cursor, seconds, blob size
+FLAG_SHUFFLE, FLAG_REPEAT, FLAG_REPEAT_ONE = 1, 2, 4
+
+_write_lock = threading.Lock()
+# Snapshots waiting for the writer thread, newest only: filename -> (state, position)
+_pending = {}
+_pending_changed = threading.Condition()
+_writer = None
+
+
+def encode_session(state, position=0.0):
+    """Serialize a ``Playlist.snapshot()`` plus the playback position in seconds."""
+    blob = "\0".join(state["paths"]).encode("utf-8", "surrogateescape")
+    flags = (
+        (FLAG_SHUFFLE if state["shuffle_mode"] else 0)
+        | (FLAG_REPEAT if state["repeat_mode"] else 0)
+        | (FLAG_REPEAT_ONE if state["repeat_one"] else 0)
+    )
+    shuffle = np.asarray(state["shuffle"], dtype="<i8")
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        flags,
+        len(state["paths"]),
+        state["index"],
+        state["cursor"],
+        position,
+        len(blob),
+    )
+    return b"".join((header, blob, shuffle.tobytes()))
+
+
+def decode_session(data):
+    """Inverse of ``encode_session``: returns ``(state, position)``."""
+    magic, version, flags, count, index, cursor, position, size = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a session snapshot")
+    start = HEADER.size
+    blob = data[start : start + size]
+    paths = blob.decode("utf-8", "surrogateescape").split("\0") if count else []
+    if len(paths) != count:
+        raise ValueError("Corrupt session snapshot")
+    state = {
+        "paths": paths,
+        "index": index,
+        "cursor": cursor,
+        "shuffle": np.frombuffer(data, dtype="<i8", offset=start + size),
+        "shuffle_mode": bool(flags & FLAG_SHUFFLE),
+        "repeat_mode": bool(flags & FLAG_REPEAT),
+        "repeat_one": bool(flags & FLAG_REPEAT_ONE),
+    }
+    return state, position
+
+
+def _write_file(filename, data):
+    tmp = filename + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filename)
+
+
+def save_session(filename, state, position=0.0):
+    """Write the snapshot atomically: readers see the old or the new file."""
+    data = encode_session(state, position)
+    with _write_lock:
+        with _pending_changed:
+            _pending.pop(filename, None)  # Older than this one
+        _write_file(filename, data)
+
+
+def save_session_async(filename, state, position=0.0):
+    """Like ``save_session`` but on a background writer thread.
+
+    A snapshot still waiting to be written is replaced by a newer one for the
+    same file, so an older snapshot is never written after a newer one.
+    """
+    global _writer
+    with _pending_changed:
+        _pending[filename] = (state, position)
+        if _writer is None:
+            _writer = threading.Thread(target=_write_pending, daemon=True)
+            _writer.start()
+        _pending_changed.notify()
+
+
+def _write_pending():
+    while True:
+        with _pending_changed:
+            while not _pending:
+                _pending_changed.wait()
+        # Taken before popping, so a synchronous save cannot slip in between
+        with _write_lock:
+            with _pending_changed:
+                if not _pending:
+                    continue
+                filename, (state, position) = _pending.popitem()
+            _write_file(filename, encode_session(state, position))
+
+
+def load_session(filename):
+    """Return ``(state, position)``, or ``None`` if there is no usable snapshot."""
+    try:
+        with open(filename, "rb") as f:
+            return decode_session(f.read())
+    except (OSError, ValueError, struct.error):
+        return None
@@ -0,0 +1,145 @@
+from array import array
+
+import numpy as np
+
+
+class TrackList:
+    """Ordered sequence of integer entry ids with O(log n) positional access.
+
+    Ids are stored in compact ``array('q')`` blocks of at most ``2 * load``
+    items.  A Fenwick tree over the block lengths finds the block holding a
+    position in O(log n), and inserting or removing only shifts one block.
+    Each id also records which block owns it, so ``index_of`` does not scan.
+    """
+
+    def __init__(self, load=512):
+        self._load = load
+        self._blocks = []
+        self._serials = []  # Stable name of each block, parallel to _blocks
+        self._next_serial = 0
+        self._owner = np.zeros(0, dtype=np.int64)  # entry id -> block serial
+        self._block_pos = {}  # block serial -> index into _blocks
+        self._tree = [0]  # Fenwick tree over block lengths, 1-based
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for block in self._blocks:
+            yield from block
+
+    def __getitem__(self, pos):
+        block, offset = self._locate(self._check(pos))
+        return self._blocks[block][offset]
+
+    def extend(self, values):
+        """Append ``values`` at the end."""
+        values = array("q", values)
+        if not values:
+            return
+        self._ensure_owner(max(values))
+        start = 0
+        if self._blocks and len(self._blocks[-1]) < self._load:
+            start = self._load - len(self._blocks[-1])
+            self._blocks[-1].extend(values[:start])
+            self._set_owner(values[:start], self._serials[-1])
+        for offset in range(start, len(values), self._load):
+            self._new_block(len(self._blocks), values[offset : offset + self._load])
+        self._len += len(values)
+        self._rebuild()
+
+    def insert(self, pos, value):
+        if pos >= self._len or not self._blocks:
+            self.extend([value])
+            return
+        block, offset = self._locate(max(pos, 0))
+        self._ensure_owner(value)
+        self._blocks[block].insert(offset, value)
+        self._owner[value] = self._serials[block]
+        self._len += 1
+        self._add(block, 1)
+        if len(self._blocks[block]) > 2 * self._load:
+            self._split(block)
+
+    def pop(self, pos):
+        block, offset = self._locate(self._check(pos))
+        value = self._blocks[block].pop(offset)
+        self._len -= 1
+        if self._blocks[block]:
+            self._add(block, -1)
+        else:
+            del self._blocks[block]
+            del self._serials[block]
+            self._rebuild()
+        return value
+
+    def index_of(self, value):
+        """Position of ``value``, which must be in the list."""
+        block = self._block_pos[int(self._owner[value])]
+        return self._prefix(block) + self._blocks[block].index(value)
+
+    def _check(self, pos):
+        if pos < 0:
+            pos += self._len
+        if not 0 <= pos < self._len:
+            raise IndexError("track position out of range")
+        return pos
+
+    def _locate(self, pos):
+        # Fenwick descent: count the blocks that end at or before ``pos``
+        block = 0
+        step = 1 << (len(self._tree).bit_length() - 1)
+        while step:
+            candidate = block + step
+            if candidate < len(self._tree) and self._tree[candidate] <= pos:
+                block = candidate
+                pos -= self._tree[candidate]
+            step >>= 1
+        return block, pos
+
+    def _prefix(self, block):
+        total = 0
+        while block > 0:
+            total += self._tree[block]
+            block -= block & -block
+        return total
+
+    def _add(self, block, delta):
+        block += 1
+        while block < len(self._tree):
+            self._tree[block] += delta
+            block += block & -block
+
+    def _rebuild(self):
+        tree = [0] + [len(block) for block in self._blocks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+        self._block_pos = {serial: i for i, serial in enumerate(self._serials)}
+
+    def _new_block(self, index, values):
+        serial = self._next_serial
+        self._next_serial += 1
+        self._blocks.insert(index, array("q", values))
+        self._serials.insert(index, serial)
+        self._set_owner(values, serial)
+
+    def _split(self, block):
+        values = self._blocks[block]
+        half = len(values) // 2
+        self._new_block(block + 1, values[half:])
+        del values[half:]
+        self._rebuild()
+
+    def _set_owner(self, values, serial):
+        if len(values):
+            self._owner[np.frombuffer(values, dtype=np.int64)] = serial
+
+    def _ensure_owner(self, value):
+        if value >= len(self._owner):
+            grown = np.zeros(max(value + 1, 2 * len(self._owner)), dtype=np.int64)
+            grown[: len(self._owner)] = self._owner
+            self._owner = grown
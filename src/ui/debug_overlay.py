@@ -0,0 +1,116 @@
+import time
+
+from PyQt5.QtCore import QObject, Qt, QTimer
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QFileDialog, QHBoxLayout, QLabel, QPushButton, QVBoxLayout, QWidget
+
+from player.instrumentation import event_loop_lag, instruments
+
+
+class EventLoopProbe(QObject):
+    """Measures how late a periodic timer fires, i.e. how busy the GUI thread is."""
+
+    def __init__(self, interval_ms=100, parent=None):
+        super().__init__(parent)
+        self.interval = interval_ms / 1000
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self._tick)
+        self._last = None
+
+    def start(self):
+        self._last = time.perf_counter()
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+
+    def _tick(self):
+        now = time.perf_counter()
+        lag = now - self._last - self.interval
+        event_loop_lag.record(max(lag, 0.0) * 1000, now)
+        self._last = now
+
+
+def format_summary(summary):
+    lines = ["%-15s %8s %8s %8s %8s %8s" % ("", "count", "p50", "p95", "p99", "max")]
+    for name, stats in summary["metrics"].items():
+        if "p50" not in stats:
+            lines.append("%-15s %8d" % (name, 0))
+            continue
+        lines.append(
+            "%-15s %8d %8.2f %8.2f %8.2f %8.2f %s"
+            % (name, stats["count"], stats["p50"], stats["p95"], stats["p99"], stats["max"], stats["unit"])
+        )
+    load = summary["metrics"].get("callback_load")
+    if load is not None:
+        # Everything above the 1.0 edge missed the callback deadline
+        edges, counts = load["histogram"]["edges"], load["histogram"]["counts"]
+        late = sum(counts[edges.index(1.0) + 1 :])
+        lines.append("late callbacks  %8d" % late)
+    for name, value in summary["counters"].items():
+        lines.append("%-15s %8d" % (name.replace("_", " "), value))
+    return "\n".join(lines)
+
+
+class DebugOverlay(QWidget):
+    """Translucent panel of live playback and GUI statistics (F12)."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_StyledBackground)
+        self.setStyleSheet(
+            "DebugOverlay { background-color: rgba(0, 0, 0, 190); border-radius: 6px; }"
+            " QLabel { color: #b8f0b8; }"
+        )
+        self.text = QLabel()
+        font = QFont("monospace")
+        font.setStyleHint(QFont.TypeWriter)
+        font.setPointSize(9)
+        self.text.setFont(font)
+        self.text.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        buttons = QHBoxLayout()
+        for label, slot in (("Reset", self.reset), ("Export…", self.export)):
+            button = QPushButton(label)
+            button.clicked.connect(slot)
+            buttons.addWidget(button)
+        buttons.addStretch()
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.text)
+        layout.addLayout(buttons)
+        self.timer = QTimer(self)
+        self.timer.setInterval(250)
+        self.timer.timeout.connect(self.refresh)
+        self.hide()
+
+    def toggle(self):
+        self.setVisible(not self.isVisible())
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start()
+        self.raise_()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        self.text.setText(format_summary(instruments.summary()))
+        self.adjustSize()
+        parent = self.parentWidget()
+        if parent is not None:
+            self.move(parent.width() - self.width() - 8, 8)
+
+    def reset(self):
+        instruments.reset()
+        self.refresh()
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Statistics", "playback-stats.json", "JSON (*.json);;CSV (*.csv)"
+        )
+        if path:
+            instruments.export(path)
@@ -0,0 +1,28 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class EngineAdapter(QObject):
+    """Re-emits AudioEngine events as Qt signals.
+
+    The engine emits from its dispatcher thread; going through Qt signals
+    queues the calls onto the thread that owns the receiving widgets.
+    """
+
+    playback_finished = pyqtSignal()
+    track_changed = pyqtSignal(str)
+    latency_changed = pyqtSignal(float)
+
+    def __init__(self, engine, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self._finished = self.playback_finished.emit
+        self._changed = self.track_changed.emit
+        self._latency = self.latency_changed.emit
+        engine.playback_finished.connect(self._finished)
+        engine.track_changed.connect(self._changed)
+        engine.latency_changed.connect(self._latency)
+
+    def detach(self):
+        self.engine.playback_finished.disconnect(self._finished)
+        self.engine.track_changed.disconnect(self._changed)
+        self.engine.latency_changed.disconnect(self._latency)
@@ -4,21 +4,32 @@ from PyQt5.QtWidgets import (
     QVBoxLayout,
     QHBoxLayout,
     QPushButton,
-    QListWidget,
+    QListView,
     QFileDialog,
     QLabel,
     QSlider,
     QToolButton,
+    QLineEdit,
+    QComboBox,
+    QShortcut,
 )
-from PyQt5.QtCore import Qt, QTimer, QSize
-from PyQt5.QtGui import QPixmap, QIcon
-from player.audio_engine import AudioEngine
+from PyQt5.QtCore import Qt, QTimer, QSize, pyqtSignal
+from PyQt5.QtGui import QPixmap, QIcon, QKeySequence
+from player.peak_cache import PeakCacheService, load_peaks
+from player.session import load_session, save_session, save_session_async
+from player.latency import DEFAULT_PROFILE, PROFILES
 from player.playlist import Playlist
-from utils.metadata_utils import get_metadata_and_album_art
-from ui.visualizer import VisualizerWidget
-from pydub import AudioSegment
+from utils.metadata_cache import MetadataService
+from utils.file_utils import cache_dir, is_audio_file
+from ui.debug_overlay import DebugOverlay, EventLoopProbe
+from ui.engine_adapter import EngineAdapter
+from ui.waveform_seekbar import WaveformSeekBar
+from ui.playlist_model import PlaylistModel
+from ui.search_model import SearchResultsModel
 import numpy as np
+import itertools
 import os
+import threading
 
 
 def resource_path(relative_path):
@@ -31,6 +42,12 @@ def resource_path(relative_path):
 
 
 class MainWindow(QMainWindow):
+    peaks_ready = pyqtSignal(str)
+    metadata_ready = pyqtSignal(str, object, object)
+    scan_progress = pyqtSignal(str, object)
+    loudness_progress = pyqtSignal(object)
+    search_ready = pyqtSignal(object)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Advanced Music Player")
@@ -38,10 +55,35 @@ class MainWindow(QMainWindow):
         self.setGeometry(100, 100, 700, 500)
 
         self.playlist = Playlist()
-        self.audio_engine = AudioEngine(self.playlist)
-        self.audio_engine.playback_finished.connect(self.on_playback_finished)
+        # Audio output and the visualizer are created on first playback, so
+        # sounddevice and the FFT thread stay out of startup
+        self._engine = None
+        self.engine_events = None
+        self.visualizer = None
+        self.peak_cache = PeakCacheService()
+        self.peaks_ready.connect(self.on_peaks_ready)
+        self.metadata = MetadataService()
+        self.metadata_ready.connect(self.on_metadata_ready)
+        self.scanner = None
+        self.scan_progress.connect(self.on_scan_progress)
+        self.loudness = None
+        self.loudness_progress.connect(self.on_loudness_progress)
+        self.session_file = os.path.join(cache_dir(), "session.bin")
+        self._resume = None  # (path, seconds) restored from the last session
+
+        from library.search import SearchService
+
+        # Tags for the index come from the metadata cache and library database
+        self.search = SearchService(tags=self._known_tags)
+        self.search_ready.connect(self.on_search_ready)
 
         self.init_ui()
+        self.restore_session()
+        self.event_loop_probe = EventLoopProbe(parent=self)
+        self.event_loop_probe.start()
+        self.debug_overlay = DebugOverlay(self.centralWidget())
+        QShortcut(QKeySequence(Qt.Key_F12), self, self.debug_overlay.toggle)
+        self.search.add(list(self.playlist))
 
     def init_ui(self):
         central_widget = QWidget()
@@ -67,25 +109,49 @@ class MainWindow(QMainWindow):
         meta_layout.addWidget(self.meta_info_label)
         layout.addLayout(meta_layout)
 
-        # Visualizer
-        self.visualizer = VisualizerWidget()
-        layout.addWidget(self.visualizer)
+        # Visualizer, swapped in for this placeholder when playback starts
+        self._main_layout = layout
+        self._visualizer_slot = QWidget()
+        self._visualizer_slot.setMinimumHeight(140)
+        self._visualizer_slot.setMaximumHeight(200)
+        layout.addWidget(self._visualizer_slot)
 
         # Seek Bar
-        self.seek_slider = QSlider(Qt.Horizontal)
+        self.seek_slider = WaveformSeekBar()
         self.seek_slider.setRange(0, 1000)
         self.seek_slider.sliderMoved.connect(self.seek_audio)
         layout.addWidget(self.seek_slider)
 
-        # Timer for updating seek bar
+        # Timer for updating seek bar, running only once something plays
         self.seek_timer = QTimer(self)
+        self.seek_timer.setInterval(200)
         self.seek_timer.timeout.connect(self.update_seek_bar)
-        self.seek_timer.start(200)  # Update every 200 ms
+
+        # Search-as-you-type, with the artists among the matches as a facet
+        search_layout = QHBoxLayout()
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search title, artist, album or file name")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.textChanged.connect(self.run_search)
+        self.artist_filter = QComboBox()
+        self.artist_filter.setMinimumContentsLength(20)
+        self.artist_filter.addItem("All artists")
+        self.artist_filter.activated.connect(self.run_search)
+        self.lbl_matches = QLabel()
+        search_layout.addWidget(self.search_box)
+        search_layout.addWidget(self.artist_filter)
+        search_layout.addWidget(self.lbl_matches)
+        layout.addLayout(search_layout)
 
         # Playlist
-        self.list_widget = QListWidget()
-        self.list_widget.itemDoubleClicked.connect(self.play_selected)
-        layout.addWidget(self.list_widget)
+        self.playlist_model = PlaylistModel(self.playlist, self.metadata)
+        self.playlist_model.metadata_ready.connect(self.index_tags)
+        self.search_model = SearchResultsModel(self)
+        self.list_view = QListView()
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setModel(self.playlist_model)
+        self.list_view.doubleClicked.connect(self.play_selected)
+        layout.addWidget(self.list_view)
 
         # Controls
         controls = QHBoxLayout()
@@ -142,12 +208,24 @@ class MainWindow(QMainWindow):
         self.btn_load = QPushButton("Open")
         self.btn_load.clicked.connect(self.load_files)
 
+        self.btn_load_folder = QPushButton("Add Folder")
+        self.btn_load_folder.clicked.connect(self.load_folder)
+
+        self.btn_import = QPushButton("Import")
+        self.btn_import.clicked.connect(self.import_playlist)
+
+        self.btn_export = QPushButton("Export")
+        self.btn_export.clicked.connect(self.export_playlist)
+
         controls.addWidget(self.btn_prev)
         controls.addWidget(self.btn_play)
         controls.addWidget(self.btn_pause)
         controls.addWidget(self.btn_stop)
         controls.addWidget(self.btn_next)
         controls.addWidget(self.btn_load)
+        controls.addWidget(self.btn_load_folder)
+        controls.addWidget(self.btn_import)
+        controls.addWidget(self.btn_export)
         controls.addWidget(self.chk_shuffle)
         controls.addWidget(self.chk_repeat)
         controls.addWidget(self.chk_repeat_one)
@@ -163,106 +241,405 @@ class MainWindow(QMainWindow):
         self.slider_volume.valueChanged.connect(self.set_volume)
         volume_layout.addWidget(self.lbl_volume)
         volume_layout.addWidget(self.slider_volume)
+
+        # Latency profile, and the output latency it actually got
+        self.latency_profile = QComboBox()
+        for name in PROFILES:
+            self.latency_profile.addItem(name.replace("-", " ").capitalize(), name)
+        self.latency_profile.setCurrentIndex(self.latency_profile.findData(DEFAULT_PROFILE))
+        self.latency_profile.activated.connect(self.set_latency_profile)
+        self.lbl_latency = QLabel()
+        volume_layout.addWidget(self.latency_profile)
+        volume_layout.addWidget(self.lbl_latency)
         layout.addLayout(volume_layout)
 
         central_widget.setLayout(layout)
 
     def load_files(self):
+        from player.backends import can_decode, supported_extensions
+
+        # Only offer what can be decoded here; AAC, for one, needs ffmpeg
+        patterns = " ".join("*" + ext for ext in supported_extensions() if is_audio_file(ext))
         files, _ = QFileDialog.getOpenFileNames(
             self,
             "Open Music Files",
             "",
-            "Audio Files (*.mp3 *.wav *.ogg *.flac *.m4a *.aac)",
+            "Audio Files (%s)" % patterns,
         )
+        files = [f for f in files if can_decode(f)]
         if files:
-            self.playlist.add_files(files)
-            self.list_widget.clear()
-            self.list_widget.addItems(self.playlist.get_filenames())
-
-    def play_selected(self, item):
-        self.visualizer.set_waveform(np.zeros(1024))
-        index = self.list_widget.row(item)
-        self.playlist.set_index(index)
+            self.add_tracks(files)
+
+    def add_tracks(self, files, chunk=5000):
+        """Append ``files``, any iterable, in chunks of one rowsInserted each."""
+        files = iter(files)
+        added = []
+        while True:
+            part = list(itertools.islice(files, chunk))
+            if not part:
+                break
+            self.playlist_model.append(part)
+            self.search.add(part)
+            added.extend(part)
+        if not added:
+            return
+        self.peak_cache.request(added, self.peaks_ready.emit)
+        self.queue_upcoming()
+        self.autosave_session()
+
+    def import_playlist(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Import Playlist", "", "Playlists (*.m3u *.m3u8 *.xspf)"
+        )
+        if not path:
+            return
+        from player.playlist_io import iter_playlist
+
+        # Parsed incrementally; the session is saved once, after the last chunk
+        self.add_tracks(iter_playlist(path))
+
+    def export_playlist(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Playlist", "", "M3U8 (*.m3u8);;XSPF (*.xspf)"
+        )
+        if path:
+            from player.playlist_io import write_playlist
+
+            write_playlist(path, iter(self.playlist))
+
+    @property
+    def audio_engine(self):
+        if self._engine is None:
+            from player.audio_engine import AudioEngine
+
+            self._engine = AudioEngine(self.playlist, profile=self.latency_profile.currentData())
+            self.engine_events = EngineAdapter(self._engine, self)
+            self.engine_events.playback_finished.connect(self.on_playback_finished)
+            self.engine_events.track_changed.connect(self.on_track_changed)
+            self.engine_events.latency_changed.connect(self.on_latency_changed)
+            self._engine.set_volume(self.slider_volume.value() / 100)
+        return self._engine
+
+    def current_decoder(self):
+        """The playing decoder, without creating the engine."""
+        return self._engine.decoder if self._engine is not None else None
+
+    def ensure_visualizer(self):
+        if self.visualizer is None:
+            from ui.visualizer import VisualizerWidget
+
+            self.visualizer = VisualizerWidget()
+            self._main_layout.replaceWidget(self._visualizer_slot, self.visualizer)
+            self._visualizer_slot.deleteLater()
+            self._visualizer_slot = None
+        return self.visualizer
+
+    def start_playback(self, path):
+        """Start ``path``; False, with a status message, if it cannot be played."""
+        visualizer = self.ensure_visualizer()
+        visualizer.set_waveform(np.zeros(1024))
+        try:
+            self.audio_engine.play(path, callback=visualizer.set_waveform)
+        except (RuntimeError, OSError) as e:
+            self.statusBar().showMessage("Skipped %s: %s" % (os.path.basename(path), e), 10000)
+            return False
+        visualizer.set_samplerate(self.audio_engine.samplerate)
+        visualizer.set_active(True)
+        self.seek_timer.start()
+        return True
+
+    def start_or_skip(self, path, step):
+        """Start ``path``, moving on with ``step()`` past tracks that cannot be played."""
+        for _ in range(len(self.playlist)):
+            if self.start_playback(path):
+                return path
+            upcoming = step()
+            if upcoming is None or upcoming == path:
+                break
+            path = upcoming
+        self.stop_track()
+        return None
+
+    def session_position(self):
+        if self.current_decoder() is None:
+            return 0.0
+        return self.audio_engine.position_seconds()
+
+    def autosave_session(self):
+        save_session_async(
+            self.session_file, self.playlist.snapshot(), self.session_position()
+        )
+
+    def restore_session(self):
+        restored = load_session(self.session_file)
+        if restored is None:
+            return
+        state, position = restored
+        self.playlist_model.restore(state)
+        for button, checked in (
+            (self.chk_shuffle, state["shuffle_mode"]),
+            (self.chk_repeat, state["repeat_mode"]),
+            (self.chk_repeat_one, state["repeat_one"]),
+        ):
+            button.blockSignals(True)
+            button.setChecked(checked)
+            button.blockSignals(False)
+        if len(self.playlist):
+            self.select_current_row()
+            self._resume = (self.playlist.current(), position)
+
+    def load_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Add Music Folder")
+        if not folder:
+            return
+        if self.scanner is None:
+            from library.scanner import LibraryScanner
+
+            self.scanner = LibraryScanner()
+        self.btn_load_folder.setEnabled(False)
+        # Scanning a large collection takes a while; keep it off the GUI thread
+        threading.Thread(target=self._scan_folder, args=(folder,), daemon=True).start()
+
+    def _scan_folder(self, folder):
+        self.scanner.scan(folder, lambda state: self.scan_progress.emit(folder, state))
+
+    def on_scan_progress(self, folder, state):
+        self.statusBar().showMessage(
+            "Scanning %s: %d files, %d updated (%.0f files/sec)"
+            % (folder, state.found, state.updated, state.files_per_sec)
+        )
+        if state.done:
+            self.btn_load_folder.setEnabled(True)
+            paths = self.scanner.database.paths(folder)
+            self.add_tracks(paths)
+            self.analyze_loudness(paths)
+
+    def analyze_loudness(self, paths):
+        if self.loudness is not None:
+            return
+        from library.loudness import LoudnessScanner
+
+        self.loudness = LoudnessScanner()
+        # Stored gains are picked up when each track is next opened
+        threading.Thread(
+            target=self.loudness.scan,
+            args=(paths, self.loudness_progress.emit),
+            daemon=True,
+        ).start()
+
+    def on_loudness_progress(self, state):
+        if state.done:
+            self.loudness = None
+            self.statusBar().showMessage(
+                "Loudness analysis: %d tracks, %.0f tracks/min"
+                % (state.analyzed, state.tracks_per_min),
+                5000,
+            )
+            return
+        self.statusBar().showMessage(
+            "Analyzing loudness: %d of %d tracks (%.0f tracks/min)"
+            % (state.analyzed + state.failed, state.total, state.tracks_per_min)
+        )
+
+    def play_selected(self, index):
+        if self.list_view.model() is self.search_model:
+            path = self.search_model.path_at(index.row())
+            row = self.playlist.position_of(path)
+            if row is None:
+                return
+            self.playlist.set_index(row)
+        else:
+            self.playlist.set_index(index.row())
         self.play_track()
 
+    def _known_tags(self, path):
+        # Called on the search thread for every newly indexed track
+        cached = self.metadata.get_cached(path)
+        if cached is not None:
+            return cached[0]
+        if self.scanner is not None:
+            return self.scanner.database.tags(path)
+        return None
+
+    def run_search(self, *args):
+        text = self.search_box.text().strip()
+        artist = self.artist_filter.currentData()
+        if not text and artist is None:
+            self.list_view.setModel(self.playlist_model)
+            self.select_current_row()
+            self.lbl_matches.clear()
+            return
+        self.search.query(text, self.search_ready.emit, artist=artist)
+
+    def on_search_ready(self, result):
+        if result.query != self.search_box.text().strip():
+            return  # Superseded while it ran
+        self.search_model.set_result(result)
+        self.list_view.setModel(self.search_model)
+        self.lbl_matches.setText("%d matches" % result.total)
+        selected = self.artist_filter.currentData()
+        self.artist_filter.clear()
+        self.artist_filter.addItem("All artists")
+        for name, count in result.artists:
+            self.artist_filter.addItem("%s (%d)" % (name, count), name)
+        if selected is not None:
+            # The active filter stays selected, whatever the new top artists are
+            if self.artist_filter.findData(selected) < 0:
+                self.artist_filter.addItem(selected, selected)
+            self.artist_filter.setCurrentIndex(self.artist_filter.findData(selected))
+
     def play_track(self):
         path = self.playlist.current()
         if path:
-            self.audio_engine.play(path, callback=self.visualizer.set_waveform)
+            path = self.start_or_skip(path, self.playlist.next)
+        if path:
+            self.select_current_row()
+            if self._resume is not None:
+                resume_path, seconds = self._resume
+                self._resume = None
+                if resume_path == path:
+                    self.audio_engine.seek(int(seconds * self.audio_engine.samplerate))
             self.update_metadata(path)
+            self.queue_upcoming()
+            self.autosave_session()
 
     def pause_track(self):
+        if self._engine is None:
+            return
         self.audio_engine.pause()
+        if self.visualizer is not None:
+            self.visualizer.set_active(self.audio_engine.playing)
 
     def stop_track(self):
+        if self._engine is None:
+            return
         self.audio_engine.stop()
+        self.seek_timer.stop()
+        if self.visualizer is not None:
+            self.visualizer.set_active(False)
 
     def next_track(self):
-        self.visualizer.set_waveform(np.zeros(1024))
         path = self.playlist.next()
         if path:
-            self.list_widget.setCurrentRow(self.playlist.index)
-            self.audio_engine.play(path, callback=self.visualizer.set_waveform)
+            path = self.start_or_skip(path, self.playlist.next)
+        if path:
+            self.select_current_row()
             self.update_metadata(path)
+            self.queue_upcoming()
+            self.autosave_session()
 
     def prev_track(self):
-        self.visualizer.set_waveform(np.zeros(1024))
         path = self.playlist.prev()
         if path:
-            self.list_widget.setCurrentRow(self.playlist.index)
-            self.audio_engine.play(path, callback=self.visualizer.set_waveform)
+            path = self.start_or_skip(path, self.playlist.prev)
+        if path:
+            self.select_current_row()
             self.update_metadata(path)
+            self.queue_upcoming()
+            self.autosave_session()
+
+    def select_current_row(self):
+        if self.list_view.model() is not self.playlist_model:
+            return
+        self.list_view.setCurrentIndex(self.playlist_model.index(self.playlist.index))
 
     def set_volume(self, value):
-        self.audio_engine.set_volume(value / 100)
+        if self._engine is not None:
+            self._engine.set_volume(value / 100)
+
+    def set_latency_profile(self, index):
+        if self._engine is not None:
+            self._engine.set_latency_profile(self.latency_profile.itemData(index))
+
+    def on_latency_changed(self, seconds):
+        engine = self.audio_engine
+        self.lbl_latency.setText("%.0f ms" % (seconds * 1000))
+        self.lbl_latency.setToolTip(
+            "Output latency; %d-frame blocks at %d Hz" % (engine.blocksize, engine.samplerate)
+        )
 
     def toggle_shuffle(self, checked):
         self.playlist.set_shuffle(checked)
+        self.queue_upcoming()
 
     def toggle_repeat(self, checked):
         self.playlist.set_repeat(checked)
         if checked:
             self.chk_repeat_one.setChecked(False)
             self.playlist.set_repeat_one(False)
+        self.queue_upcoming()
 
     def toggle_repeat_one(self, checked):
         self.playlist.set_repeat_one(checked)
         if checked:
             self.chk_repeat.setChecked(False)
             self.playlist.set_repeat(False)
+        self.queue_upcoming()
 
     def update_metadata(self, path):
-        meta, art = get_metadata_and_album_art(path)
+        cached = self.metadata.get_cached(path)
+        if cached is not None:
+            self.show_metadata(*cached)
+        else:
+            self.metadata.request(path, self.metadata_ready.emit)
+        self.update_visualizer(path)
+        self.update_waveform(path)
+
+    def index_tags(self, path, meta, thumbnail):
+        self.search.update(path, meta)
+
+    def on_metadata_ready(self, path, meta, thumbnail):
+        self.index_tags(path, meta, thumbnail)
+        if path == self.playlist.current():
+            self.show_metadata(meta, thumbnail)
+
+    def show_metadata(self, meta, thumbnail):
         text = (
             f"<b>Title:</b> {meta.get('title', 'Unknown')}<br>"
             f"<b>Artist:</b> {meta.get('artist', 'Unknown')}<br>"
             f"<b>Album:</b> {meta.get('album', 'Unknown')}"
         )
         self.meta_info_label.setText(text)
-        if art:
-            pixmap = QPixmap()
-            pixmap.loadFromData(art)
-            self.album_art_label.setPixmap(pixmap.scaled(120, 120, Qt.KeepAspectRatio))
-        else:
-            self.album_art_label.setPixmap(QPixmap())
-        self.update_visualizer(path)
+        # Thumbnails are cached pre-scaled to the label size
+        pixmap = QPixmap()
+        if thumbnail:
+            pixmap.loadFromData(thumbnail)
+        self.album_art_label.setPixmap(pixmap)
 
     def update_visualizer(self, path):
-        try:
-            audio = AudioSegment.from_file(path)
-            samples = np.array(audio.get_array_of_samples())
-            if audio.channels == 2:
-                samples = samples[::2]  # Take one channel for stereo
-            samples = samples / np.max(np.abs(samples))
-            downsampled = samples[:: max(1, len(samples) // 512)]
-            self.visualizer.set_waveform(downsampled[:512])
-        except Exception as e:
+        # Seed from the overview the engine's decoder builds while it plays,
+        # instead of decoding the whole file a second time
+        if self.visualizer is None:
+            return
+        decoder = self.current_decoder()
+        if decoder is not None and decoder.path == path:
+            self.visualizer.set_waveform(decoder.overview.envelope())
+        else:
             self.visualizer.set_waveform(np.zeros(512))
 
+    def update_waveform(self, path):
+        peaks = load_peaks(path)
+        if peaks is not None:
+            self.seek_slider.set_peaks(peaks)
+            return
+        # Not cached yet: show what playback has decoded while the pool builds it
+        decoder = self.current_decoder()
+        if decoder is not None and decoder.path == path:
+            self.seek_slider.set_overview(decoder.overview)
+        else:
+            self.seek_slider.set_overview(None)
+        self.peak_cache.request([path], self.peaks_ready.emit)
+
+    def on_peaks_ready(self, path):
+        if path == self.playlist.current():
+            peaks = load_peaks(path)
+            if peaks is not None:
+                self.seek_slider.set_peaks(peaks)
+
     def update_seek_bar(self):
-        if self.audio_engine.data is not None and self.audio_engine.samplerate:
-            pos = self.audio_engine.position
-            total = len(self.audio_engine.data)
+        self.seek_slider.refresh_overview()
+        if self.current_decoder() is not None:
+            pos, total = self.audio_engine.playback_position()
             if total > 0:
                 value = int(pos / total * 1000)
                 self.seek_slider.blockSignals(True)
@@ -270,8 +647,8 @@ class MainWindow(QMainWindow):
                 self.seek_slider.blockSignals(False)
 
     def seek_audio(self, value):
-        if self.audio_engine.data is not None:
-            total = len(self.audio_engine.data)
+        if self.current_decoder() is not None:
+            total = self.audio_engine.frames
             pos = int(value / 1000 * total)
             self.audio_engine.seek(pos)
 
@@ -281,7 +658,7 @@ class MainWindow(QMainWindow):
         QPushButton { background-color: #222; color: #fff; border-radius: 5px; }
         QSlider::groove:horizontal { background: #444; height: 6px; border-radius: 3px; }
         QSlider::handle:horizontal { background: #00cfff; width: 14px; border-radius: 7px; }
-        QListWidget { background: #23283a; color: #fff; }
+        QListView { background: #23283a; color: #fff; }
         """
         self.setStyleSheet(dark_stylesheet)
 
@@ -291,7 +668,7 @@ class MainWindow(QMainWindow):
         QPushButton { background-color: #e0e0e0; color: #222; border-radius: 5px; }
         QSlider::groove:horizontal { background: #bbb; height: 6px; border-radius: 3px; }
         QSlider::handle:horizontal { background: #0078d7; width: 14px; border-radius: 7px; }
-        QListWidget { background: #fff; color: #222; }
+        QListView { background: #fff; color: #222; }
         """
         self.setStyleSheet(light_stylesheet)
 
@@ -303,7 +680,42 @@ class MainWindow(QMainWindow):
             self.set_dark_theme()
             self.btn_theme.setText("Light Mode")
 
+    def queue_upcoming(self):
+        # Pre-decode whatever on_playback_finished would play next
+        if self.current_decoder() is None:
+            return
+        path = None
+        if self.playlist.repeat_one or self.playlist.repeat_mode:
+            path = self.playlist.peek_next()
+        self.audio_engine.preload(path)
+
+    def on_track_changed(self, path):
+        # The engine already moved on gaplessly; bring the playlist in step
+        if not self.playlist.repeat_one:
+            self.playlist.next()
+        if self.playlist.current() != path:
+            self.play_track()
+            return
+        self.select_current_row()
+        self.update_metadata(path)
+        self.queue_upcoming()
+        self.autosave_session()
+
+    def closeEvent(self, event):
+        save_session(self.session_file, self.playlist.snapshot(), self.session_position())
+        self.peak_cache.shutdown()
+        self.metadata.shutdown()
+        self.search.close()
+        if self.loudness is not None:
+            self.loudness.cancel()
+        if self._engine is not None:
+            self.engine_events.detach()
+            self._engine.close()
+        super().closeEvent(event)
+
     def on_playback_finished(self):
+        if self.visualizer is not None:
+            self.visualizer.set_active(False)
         # Handle repeat one and repeat all logic
         if self.playlist.repeat_one:
             self.play_track()
@@ -0,0 +1,76 @@
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt, pyqtSignal
+import os
+
+
+class PlaylistModel(QAbstractListModel):
+    """List model that reads rows lazily from a Playlist.
+
+    Display strings are only built for rows the view asks about, i.e. the
+    visible ones; missing metadata is fetched in the background and the row
+    is refreshed when it arrives.
+    """
+
+    metadata_ready = pyqtSignal(str, object, object)
+
+    def __init__(self, playlist, metadata, parent=None):
+        super().__init__(parent)
+        self.playlist = playlist
+        self.metadata = metadata
+        self._labels = {}
+        self._waiting = {}  # path -> row that asked for it
+        self.metadata_ready.connect(self._on_metadata_ready)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.playlist)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        path = self.playlist.track_at(index.row())
+        label = self._labels.get(path)
+        if label is None:
+            label = self._label(path, index.row())
+        return label
+
+    def append(self, files):
+        """Add ``files`` to the playlist, announcing only the new rows."""
+        if not files:
+            return
+        first = len(self.playlist)
+        self.beginInsertRows(QModelIndex(), first, first + len(files) - 1)
+        self.playlist.add_files(files)
+        self.endInsertRows()
+
+    def restore(self, state):
+        """Replace the whole playlist from a session snapshot."""
+        self.beginResetModel()
+        self.playlist.restore(state)
+        self._waiting.clear()
+        self.endResetModel()
+
+    def _label(self, path, row):
+        cached = self.metadata.get_cached(path)
+        if cached is None:
+            self._waiting[path] = row
+            self.metadata.request(path, self.metadata_ready.emit)
+            return os.path.basename(path)
+        label = self._format(path, cached[0])
+        self._labels[path] = label
+        return label
+
+    @staticmethod
+    def _format(path, meta):
+        title = meta.get("title")
+        if not title:
+            return os.path.basename(path)
+        artist = meta.get("artist")
+        return "%s – %s" % (artist, title) if artist else title
+
+    def _on_metadata_ready(self, path, meta, thumbnail):
+        self._labels[path] = self._format(path, meta)
+        row = self._waiting.pop(path, None)
+        if row is not None and row < len(self.playlist):
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DisplayRole])
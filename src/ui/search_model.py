@@ -0,0 +1,33 @@
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt
+
+
+class SearchResultsModel(QAbstractListModel):
+    """Rows of the latest SearchResult, labelled as the index saw them."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.paths = []
+        self.labels = []
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.labels[index.row()]
+        if role == Qt.ToolTipRole:
+            return self.paths[index.row()]
+        return None
+
+    def set_result(self, result):
+        self.beginResetModel()
+        self.paths = result.paths
+        self.labels = result.labels
+        self.endResetModel()
+
+    def path_at(self, row):
+        return self.paths[row]
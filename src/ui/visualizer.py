@@ -6,32 +6,125 @@ from PyQt5.QtGui import (
     QBrush,
     QPen,
     QPainterPath,
+    QPixmap,
     QFont,
 )
-from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal, pyqtSlot
+from PyQt5.QtCore import Qt, QEvent, QLineF, QRectF, QTimer, QThread, pyqtSignal, pyqtSlot
+from collections import deque
 import numpy as np
+import functools
+from player.instrumentation import fft_time, paint_time
+import threading
+import time
+
+
+@functools.lru_cache(maxsize=8)
+def hann_window(size):
+    return np.hanning(size).astype("float32")
+
+
+@functools.lru_cache(maxsize=32)
+def band_edges(fft_size, samplerate, bands, fmin=30.0):
+    """First rfft bin of each of ``bands`` log-spaced bands (for reduceat)."""
+    bins = fft_size // 2 + 1
+    fmax = samplerate / 2
+    freqs = np.geomspace(fmin, fmax, bands + 1)[:-1]
+    edges = np.round(freqs / fmax * (bins - 1)).astype(np.intp)
+    # Low bands are narrower than a bin; give each at least one bin of its own
+    for i in range(1, bands):
+        edges[i] = max(edges[i], edges[i - 1] + 1)
+    return np.minimum(edges, bins - 1)
 
 
 class FFTWorker(QThread):
+    """Turns incoming audio into ``bands`` log-spaced spectrum levels.
+
+    The thread sleeps until ``hop`` new samples have arrived, so it costs
+    nothing while playback is paused.  Window, band mapping and work buffers
+    are allocated once per configuration.
+    """
+
     spectrum_ready = pyqtSignal(np.ndarray)
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, fft_size=2048, overlap=0.5, bands=64, samplerate=44100):
         super().__init__(parent)
-        self.data = np.zeros(1024)
         self.running = True
+        self._wake = threading.Event()
+        self._lock = threading.Lock()  # Guards the buffers against reconfiguration
+        self.configure(fft_size, overlap, bands, samplerate)
+
+    def configure(self, fft_size=None, overlap=None, bands=None, samplerate=None):
+        with self._lock:
+            self._configure(fft_size, overlap, bands, samplerate)
+
+    def _configure(self, fft_size, overlap, bands, samplerate):
+        self.fft_size = fft_size or self.fft_size
+        self.overlap = self.overlap if overlap is None else overlap
+        self.bands = bands or self.bands
+        self.samplerate = samplerate or self.samplerate
+        self.hop = max(1, int(self.fft_size * (1 - self.overlap)))
+        self.window = hann_window(self.fft_size)
+        self.edges = band_edges(self.fft_size, self.samplerate, self.bands)
+        widths = np.diff(np.append(self.edges, self.fft_size // 2 + 1))
+        self.widths = np.maximum(widths, 1).astype("float32")
+        self._history = np.zeros(self.fft_size, dtype="float32")
+        self._frame = np.zeros(self.fft_size, dtype="float32")
+        self._magnitude = np.zeros(self.fft_size // 2 + 1, dtype="float32")
+        self._levels = np.zeros(self.bands, dtype="float32")
+        self._write = 0
+        self._fresh = 0
 
     def run(self):
         while self.running:
-            spectrum = np.abs(np.fft.rfft(self.data * np.hanning(len(self.data))))
-            spectrum = spectrum / (np.max(spectrum) + 1e-6)
-            self.spectrum_ready.emit(spectrum)
-            self.msleep(30)
+            self._wake.wait()
+            self._wake.clear()
+            if self.running:
+                start = time.perf_counter()
+                levels = self.analyze()
+                fft_time.record((time.perf_counter() - start) * 1000, start)
+                self.spectrum_ready.emit(levels)
+
+    def analyze(self):
+        """Window the latest ``fft_size`` samples and reduce them to bands."""
+        with self._lock:
+            return self._analyze()
+
+    def _analyze(self):
+        self._fresh = 0
+        start = self._write % self.fft_size
+        tail = self.fft_size - start
+        self._frame[:tail] = self._history[start:]
+        self._frame[tail:] = self._history[:start]
+        np.multiply(self._frame, self.window, out=self._frame)
+        np.abs(np.fft.rfft(self._frame), out=self._magnitude)
+        np.add.reduceat(self._magnitude, self.edges, out=self._levels)
+        np.divide(self._levels, self.widths, out=self._levels)
+        np.divide(self._levels, self._levels.max() + 1e-6, out=self._levels)
+        return self._levels.copy()
 
     def update_data(self, data):
-        self.data = data.copy() if data is not None else np.zeros(1024)
+        with self._lock:
+            self._update_data(data)
+
+    def _update_data(self, data):
+        if data is None:
+            self._history[:] = 0
+            self._fresh = self.hop
+        else:
+            mono = data.mean(axis=1) if data.ndim > 1 else data
+            mono = mono[-self.fft_size :]
+            start = self._write % self.fft_size
+            first = min(len(mono), self.fft_size - start)
+            self._history[start : start + first] = mono[:first]
+            self._history[: len(mono) - first] = mono[first:]
+            self._write += len(mono)
+            self._fresh += len(mono)
+        if self._fresh >= self.hop:
+            self._wake.set()
 
     def stop(self):
         self.running = False
+        self._wake.set()
         self.wait()
 
 
@@ -41,25 +134,91 @@ class VisualizerWidget(QWidget):
         self.setMinimumHeight(140)
         self.setMaximumHeight(200)
         self.setStyleSheet("background-color: #181c24; border-radius: 10px;")
-        self.spectrum = np.zeros(513)
-        self.peak = np.zeros(513)
+        self.spectrum = np.zeros(64)
+        self.peak = np.zeros(64)
         self.fft_worker = FFTWorker()
         self.fft_worker.spectrum_ready.connect(self.update_spectrum)
         self.fft_worker.start()
         self.timer = QTimer(self)
+        self.timer.setInterval(30)
         self.timer.timeout.connect(self.update)
-        self.timer.start(30)
+        self.active = False  # Redraw only while visible and playing
+        self.batched = True  # False selects the per-bar path, for comparison
+        self.frame_times = deque(maxlen=240)  # Seconds spent in paintEvent
+        self._bar_fill = None
+        self._glow = None
+
+    def set_active(self, active):
+        self.active = active
+        self._update_timer()
+        if not active:
+            # Let the bars fall back to zero instead of freezing mid-frame
+            self.spectrum = np.zeros_like(self.spectrum)
+            self.peak = np.zeros_like(self.peak)
+            self.update()
+
+    def _update_timer(self):
+        if self.active and self.isVisible():
+            if not self.timer.isActive():
+                self.timer.start()
+        else:
+            self.timer.stop()
+
+    def showEvent(self, event):
+        self._update_timer()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self._update_timer()
+        super().hideEvent(event)
+
+    def resizeEvent(self, event):
+        self._bar_fill = None
+        super().resizeEvent(event)
+
+    def changeEvent(self, event):
+        if event.type() in (QEvent.StyleChange, QEvent.PaletteChange):
+            self._bar_fill = None
+        super().changeEvent(event)
+
+    def frame_stats(self):
+        """Mean and 95th percentile paint time in milliseconds."""
+        if not self.frame_times:
+            return 0.0, 0.0
+        times = np.array(self.frame_times) * 1000
+        return float(times.mean()), float(np.percentile(times, 95))
+
+    def _build_cache(self):
+        # Bars and glow only change with the widget size, so render them once
+        w, h = max(self.width(), 1), max(self.height(), 1)
+        self._bar_fill = QPixmap(w, h)
+        self._bar_fill.fill(Qt.transparent)
+        painter = QPainter(self._bar_fill)
+        grad = QLinearGradient(0, 20, 0, h)
+        grad.setColorAt(0.0, QColor(0, 255, 255, 220))
+        grad.setColorAt(0.5, QColor(0, 128, 255, 180))
+        grad.setColorAt(1.0, QColor(0, 0, 64, 0))
+        painter.fillRect(0, 0, w, h, QBrush(grad))
+        painter.end()
+        self._bar_brush = QBrush(self._bar_fill)
+        self._glow = QPixmap(w, 10)
+        self._glow.fill(Qt.transparent)
+        painter = QPainter(self._glow)
+        glow = QLinearGradient(0, 0, 0, 10)
+        glow.setColorAt(0, QColor(0, 255, 255, 80))
+        glow.setColorAt(1, QColor(0, 0, 0, 0))
+        painter.fillRect(0, 0, w, 10, QBrush(glow))
+        painter.end()
 
     def set_waveform(self, waveform):
         if waveform is not None and len(waveform) > 0:
-            waveform = waveform.flatten()
-            if len(waveform) > 1024:
-                waveform = waveform[:1024]
-            else:
-                waveform = np.pad(waveform, (0, 1024 - len(waveform)), "constant")
             self.fft_worker.update_data(waveform)
         else:
-            self.fft_worker.update_data(np.zeros(1024))
+            self.fft_worker.update_data(None)
+
+    def set_samplerate(self, samplerate):
+        if samplerate and samplerate != self.fft_worker.samplerate:
+            self.fft_worker.configure(samplerate=samplerate)
 
     @pyqtSlot(np.ndarray)
     def update_spectrum(self, spectrum):
@@ -72,8 +231,53 @@ class VisualizerWidget(QWidget):
         self.peak = np.maximum(self.peak * 0.96, self.spectrum)
 
     def paintEvent(self, event):
+        start = time.perf_counter()
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
+        if self.batched:
+            self._paint_batched(painter)
+        else:
+            self._paint_per_bar(painter)
+        painter.end()
+        elapsed = time.perf_counter() - start
+        self.frame_times.append(elapsed)
+        paint_time.record(elapsed * 1000, start)
+
+    def _paint_batched(self, painter):
+        if self._bar_fill is None:
+            self._build_cache()
+        w, h = self.width(), self.height()
+        bar_count = min(w // 4, len(self.spectrum))
+        if bar_count == 0:
+            return
+        bar_width = w / bar_count
+        max_height = h - 20
+        xs = (np.arange(bar_count) * bar_width).astype(int)
+        heights = (self.spectrum[:bar_count] * max_height).astype(int)
+        peaks = h - (self.peak[:bar_count] * max_height).astype(int)
+
+        # One drawRects call fills every bar from the cached gradient texture.
+        # Square tops: rounded-rect paths cost more than the per-bar gradients.
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(self._bar_brush)
+        painter.drawRects(
+            [
+                QRectF(x + 1, h - bar_height, int(bar_width) - 2, bar_height)
+                for x, bar_height in zip(xs.tolist(), heights.tolist())
+                if bar_height > 0
+            ]
+        )
+
+        painter.setPen(QPen(QColor(255, 255, 255, 180), 2))
+        painter.drawLines(
+            [
+                QLineF(x + 1, y, x + int(bar_width) - 2, y)
+                for x, y in zip(xs.tolist(), peaks.tolist())
+            ]
+        )
+        painter.drawPixmap(0, h - 10, self._glow)
+
+    def _paint_per_bar(self, painter):
         w, h = self.width(), self.height()
         bar_count = min(w // 4, len(self.spectrum))
         bar_width = w / bar_count
@@ -0,0 +1,109 @@
+from PyQt5.QtWidgets import QSlider, QStyle
+from PyQt5.QtGui import QPainter, QColor, QPixmap, QPen
+from PyQt5.QtCore import QLine, Qt
+import numpy as np
+
+
+class WaveformSeekBar(QSlider):
+    """Horizontal seek slider that draws the track's waveform overview.
+
+    Keeps the QSlider API (range, value, ``sliderMoved``) so it can stand in
+    for a plain slider; clicking or dragging jumps straight to the position.
+    """
+
+    played_color = QColor(0, 207, 255)
+    unplayed_color = QColor(90, 100, 120)
+
+    def __init__(self, parent=None):
+        super().__init__(Qt.Horizontal, parent)
+        self.setMinimumHeight(48)
+        self.peaks = None  # PeakFile from the on-disk cache
+        self.overview = None  # Progressive PeakBuilder while the cache is built
+        self._pixmaps = None
+
+    def set_peaks(self, peaks):
+        self.peaks = peaks
+        self.overview = None
+        self._pixmaps = None
+        self.update()
+
+    def set_overview(self, overview):
+        self.peaks = None
+        self.overview = overview
+        self._pixmaps = None
+        self.update()
+
+    def refresh_overview(self):
+        # The progressive overview fills in as playback decodes
+        if self.overview is not None:
+            self._pixmaps = None
+            self.update()
+
+    def resizeEvent(self, event):
+        self._pixmaps = None
+        super().resizeEvent(event)
+
+    def _columns(self, width):
+        if self.peaks is not None:
+            mins, maxs, _ = self.peaks.columns(width)
+            return mins, maxs
+        if self.overview is not None:
+            edges = np.arange(width) * self.overview.buckets // width
+            return self.overview.mins[edges], self.overview.maxs[edges]
+        return None
+
+    def _render(self):
+        w, h = self.width(), self.height()
+        columns = self._columns(w)
+        mid = h / 2
+        if columns is None:
+            lines = [QLine(0, int(mid), w, int(mid))]
+        else:
+            # One vertical line per pixel column, shared by both pixmaps
+            mins, maxs = columns
+            tops = (mid - np.clip(maxs, -1, 1) * mid).astype(int).tolist()
+            bottoms = (mid - np.clip(mins, -1, 1) * mid).astype(int).tolist()
+            lines = [QLine(x, top, x, bottom) for x, (top, bottom) in enumerate(zip(tops, bottoms))]
+        pixmaps = []
+        for color in (self.unplayed_color, self.played_color):
+            pixmap = QPixmap(w, h)
+            pixmap.fill(Qt.transparent)
+            painter = QPainter(pixmap)
+            painter.setPen(QPen(color, 1))
+            painter.drawLines(lines)
+            painter.end()
+            pixmaps.append(pixmap)
+        self._pixmaps = pixmaps
+
+    def paintEvent(self, event):
+        if self._pixmaps is None:
+            self._render()
+        unplayed, played = self._pixmaps
+        span = self.maximum() - self.minimum()
+        x = int((self.value() - self.minimum()) / span * self.width()) if span else 0
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, unplayed)
+        painter.drawPixmap(0, 0, played, 0, 0, x, self.height())
+        painter.setPen(QPen(QColor(255, 255, 255, 200), 2))
+        painter.drawLine(x, 0, x, self.height())
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.setSliderDown(True)
+            self._seek_to(event.x())
+
+    def mouseMoveEvent(self, event):
+        if self.isSliderDown():
+            self._seek_to(event.x())
+
+    def mouseReleaseEvent(self, event):
+        if self.isSliderDown():
+            self.setSliderDown(False)
+
+    def _seek_to(self, x):
+        # setSliderPosition emits sliderMoved while the slider is down
+        self.setSliderPosition(
+            QStyle.sliderValueFromPosition(
+                self.minimum(), self.maximum(), max(0, x), self.width()
+            )
+        )
@@ -2,4 +2,22 @@ import os
 
 
 def is_audio_file(filename):
-    return filename.lower().endswith((".mp3", ".wav", ".ogg", ".flac", ".aac", ".m4a"))
+    return filename.lower().endswith(
+        (".mp3", ".wav", ".ogg", ".opus", ".flac", ".aif", ".aiff", ".aac", ".m4a")
+    )
+
+
+def cache_dir(*parts):
+    """Per-user cache directory for the player, created on demand."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    path = os.path.join(base, "advanced-music-player", *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_identity(path):
+    """Return ``(absolute path, size, mtime_ns)``, which changes with the file."""
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_size, st.st_mtime_ns
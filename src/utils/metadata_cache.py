@@ -0,0 +1,152 @@
+import io
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.file_utils import cache_dir, file_identity
+
+THUMBNAIL_SIZE = (120, 120)
+
+
+def make_thumbnail(art, size=THUMBNAIL_SIZE):
+    """Downscale embedded album art to a small JPEG, or ``None`` if unreadable."""
+    from PIL import Image
+
+    try:
+        image = Image.open(io.BytesIO(art))
+        image.thumbnail(size)
+        out = io.BytesIO()
+        image.convert("RGB").save(out, format="JPEG", quality=90)
+        return out.getvalue()
+    except (OSError, ValueError):
+        return None
+
+
+def _entry_size(entry):
+    # Rough footprint: thumbnail bytes, tag text and per-entry overhead
+    meta, thumbnail = entry
+    return len(thumbnail or b"") + sum(len(str(v)) for v in meta.values()) + 200
+
+
+class MetadataCache:
+    """Tags and album-art thumbnails keyed by ``(path, size, mtime)``.
+
+    Recently used entries live in an in-memory LRU bounded by ``max_bytes``;
+    everything is also persisted in SQLite so later sessions skip mutagen.
+    """
+
+    def __init__(self, filename=None, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if filename is None:
+            filename = os.path.join(cache_dir(), "metadata.sqlite")
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER,"
+            " tags TEXT, thumbnail BLOB)"
+        )
+        self._db.commit()
+
+    def lookup(self, path):
+        """Return ``(meta, thumbnail)`` if cached and still current, else ``None``."""
+        try:
+            key = file_identity(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            row = self._db.execute(
+                "SELECT tags, thumbnail FROM metadata WHERE path = ? AND size = ? AND mtime = ?",
+                (key[0], key[1], key[2]),
+            ).fetchone()
+        if row is None:
+            return None
+        entry = (json.loads(row[0]), row[1])
+        self._remember(key, entry)
+        return entry
+
+    def store(self, path, meta, thumbnail):
+        key = file_identity(path)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?)",
+                (key[0], key[1], key[2], json.dumps(meta), thumbnail),
+            )
+            self._db.commit()
+        self._remember(key, (meta, thumbnail))
+
+    def _remember(self, key, entry):
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = entry
+            self._bytes += _entry_size(entry)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= _entry_size(old)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class MetadataService:
+    """Extracts tags and thumbnails on a thread pool, backed by a cache."""
+
+    def __init__(self, cache=None, max_workers=4):
+        self.cache = cache if cache is not None else MetadataCache()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="metadata"
+        )
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def get_cached(self, path):
+        return self.cache.lookup(path)
+
+    def request(self, path, on_ready):
+        """Load ``path`` in the background and call ``on_ready(path, meta, thumbnail)``.
+
+        The callback runs on a worker thread.
+        """
+        with self._lock:
+            if path in self._pending:
+                return
+            self._pending.add(path)
+        self._executor.submit(self._load, path, on_ready)
+
+    def load(self, path):
+        """Return ``(meta, thumbnail)`` for ``path``, extracting it if needed."""
+        cached = self.cache.lookup(path)
+        if cached is not None:
+            return cached
+        from utils.metadata_utils import get_metadata_and_album_art
+
+        meta, art = get_metadata_and_album_art(path)
+        thumbnail = make_thumbnail(art) if art else None
+        self.cache.store(path, meta, thumbnail)
+        return meta, thumbnail
+
+    def _load(self, path, on_ready):
+        try:
+            meta, thumbnail = self.load(path)
+        except Exception:
+            # Unreadable or vanished files still get an (empty) answer
+            meta, thumbnail = {}, None
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+        on_ready(path, meta, thumbnail)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.cache.close()
@@ -1,4 +1,4 @@
-from mutagen import File
+from mutagen import File, MutagenError
 from mutagen.id3 import ID3, APIC, TIT2, TPE1, TALB
 
 
@@ -33,4 +33,18 @@ def get_metadata_and_album_art(path):
         meta["title"] = audio.get("title", [""])[0] if audio.get("title") else ""
         meta["artist"] = audio.get("artist", [""])[0] if audio.get("artist") else ""
         meta["album"] = audio.get("album", [""])[0] if audio.get("album") else ""
+    if getattr(audio, "info", None) is not None:
+        meta["duration"] = getattr(audio.info, "length", 0.0)
     return meta, art
+
+
+def read_replaygain(path):
+    """Track gain in dB from ReplayGain tags, or ``None`` if there is none."""
+    try:
+        audio = File(path, easy=True)
+        value = audio.get("replaygain_track_gain") if audio is not None else None
+        if value:
+            return float(value[0].split()[0])
+    except (ValueError, KeyError, OSError, MutagenError):
+        pass
+    return None
@@ -0,0 +1,81 @@
+"""Startup profiling for ``main.py --profile-startup``.
+
+The GUI is relaunched under ``-X importtime``; the child records how long
+each startup phase took up to the first paint of the main window, prints the
+breakdown and quits.  The parent then summarizes the import log.
+"""
+
+import re
+import subprocess
+import sys
+import time
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def under_importtime():
+    return "importtime" in sys._xoptions
+
+
+def relaunch(argv, top=15):
+    """Run ``argv`` again under ``-X importtime`` and report the slowest imports."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime"] + argv,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    imports = []
+    for line in proc.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match is None:
+            if not line.startswith("import time:"):
+                print(line, file=sys.stderr)
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        # Top-level imports only, so nested modules are not counted twice
+        if len(indent) == 1:
+            imports.append((int(cumulative_us), int(self_us), name))
+    imports.sort(reverse=True)
+    total = sum(cumulative for cumulative, _, _ in imports)
+    print("\nTop-level imports: %.1f ms in total" % (total / 1000))
+    print("%10s %10s  %s" % ("cumul ms", "self ms", "module"))
+    for cumulative, self_us, name in imports[:top]:
+        print("%10.1f %10.1f  %s" % (cumulative / 1000, self_us / 1000, name))
+    return proc.returncode
+
+
+class StartupProfile:
+    """Wall-clock marks between process start and the first paint."""
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.marks = []
+
+    def mark(self, label):
+        self.marks.append((label, time.perf_counter()))
+
+    def watch_first_paint(self, widget, app):
+        """Record the first paint of ``widget``, report and quit ``app``."""
+        from PyQt5.QtCore import QEvent, QObject, QTimer
+
+        profile = self
+
+        class PaintWatcher(QObject):
+            def eventFilter(self, obj, event):
+                if event.type() == QEvent.Paint:
+                    obj.removeEventFilter(self)
+                    profile.mark("first paint")
+                    # Let the paint finish before quitting
+                    QTimer.singleShot(0, lambda: (profile.report(), app.quit()))
+                return False
+
+        self._watcher = PaintWatcher()
+        widget.installEventFilter(self._watcher)
+
+    def report(self):
+        print("Startup phases (ms since main.py started):")
+        previous = self.start
+        for label, at in self.marks:
+            print("%8.1f  +%7.1f  %s" % ((at - self.start) * 1000, (at - previous) * 1000, label))
+            previous = at
+        sys.stdout.flush()
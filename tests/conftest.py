@@ -0,0 +1,11 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import fake_sounddevice  # noqa: E402
+
+# No audio device is needed: the engine plays into a paced fake stream
+fake_sounddevice.install()
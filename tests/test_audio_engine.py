@@ -0,0 +1,60 @@
+import threading
+import time
+
+import numpy as np
+import soundfile as sf
+
+from player.audio_engine import AudioEngine
+
+
+def write_tone(path, seconds=0.05, samplerate=48000):
+    t = np.arange(int(seconds * samplerate)) / samplerate
+    tone = 0.1 * np.sin(2 * np.pi * 440 * t)
+    sf.write(str(path), np.column_stack([tone, tone]).astype("float32"), samplerate)
+    return str(path)
+
+
+def test_close_while_a_listener_restarts_playback(tmp_path):
+    path = write_tone(tmp_path / "tone.wav")
+    engine = AudioEngine(samplerate=48000)
+    delivering = threading.Event()
+    closing = threading.Event()
+
+    def replay():
+        # Like PlayerControls moving on to the next track
+        delivering.set()
+        closing.wait(5)
+        time.sleep(0.1)  # Let close() get as far as it can
+        engine.play(path)
+
+    engine.playback_finished.connect(replay)
+    engine.play(path)
+    assert delivering.wait(5)
+    closer = threading.Thread(target=engine.close, daemon=True)
+    closing.set()
+    closer.start()
+    closer.join(5)
+    assert not closer.is_alive(), "close() deadlocked with the dispatcher"
+    assert engine.stream is None
+    assert engine.decoder is None
+
+
+def test_configure_output_while_a_listener_restarts_playback(tmp_path):
+    path = write_tone(tmp_path / "tone.wav")
+    engine = AudioEngine(samplerate=48000)
+    delivering = threading.Event()
+
+    def replay():
+        delivering.set()
+        time.sleep(0.1)
+        engine.play(path)
+
+    engine.playback_finished.connect(replay)
+    engine.play(path)
+    assert delivering.wait(5)
+    changer = threading.Thread(target=engine.configure_output, args=(44100,), daemon=True)
+    changer.start()
+    changer.join(5)
+    assert not changer.is_alive(), "configure_output() deadlocked with the dispatcher"
+    assert engine.stream is None
+    engine.close()
@@ -0,0 +1,31 @@
+import threading
+
+from player.audio_engine import AudioEngine
+from player.controls import PlayerControls
+from player.playlist import Playlist
+
+from test_audio_engine import write_tone
+
+
+def test_shutdown_at_a_track_boundary(tmp_path):
+    paths = [write_tone(tmp_path / ("%d.wav" % i)) for i in range(20)]
+    playlist = Playlist()
+    playlist.add_files(paths)
+    engine = AudioEngine(playlist, samplerate=48000)
+    controls = PlayerControls(engine, playlist)
+    second = threading.Event()
+    controls.track_started.connect(lambda path: path == paths[1] and second.set())
+    controls.play()
+    assert second.wait(5)
+
+    def shutdown():
+        # What ``python -m player`` does on Ctrl-C
+        controls.detach()
+        engine.close()
+
+    closer = threading.Thread(target=shutdown, daemon=True)
+    closer.start()
+    closer.join(5)
+    assert not closer.is_alive(), "shutdown deadlocked with the dispatcher"
+    assert engine.stream is None
+    assert playlist.current() != paths[-1]
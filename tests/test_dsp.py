@@ -0,0 +1,78 @@
+import tracemalloc
+
+import numpy as np
+from scipy.signal import sosfilt
+
+from player import dsp
+from player.dsp import DSPChain, Equalizer, db_to_gain, peaking_sos
+
+GAINS = [12, -12, 9, 0, 3, -6, 0, 6, -9, 12]
+
+
+def noise(frames, channels=2):
+    return (np.random.default_rng(0).standard_normal((frames, channels)) * 0.2).astype("float32")
+
+
+def run(eq, signal, blocksize=1024):
+    out = signal.copy()
+    for i in range(0, len(out), blocksize):
+        eq.process(out[i : i + blocksize])
+    return out
+
+
+def test_equalizer_matches_sosfilt():
+    signal = noise(48000)
+    eq = Equalizer(48000, 2, 1024)
+    eq.set_gains(GAINS)
+    expected = sosfilt(peaking_sos(dsp.EQ_FREQUENCIES, GAINS, 48000), signal, axis=0)
+    assert np.abs(run(eq, signal) - expected).max() < 1e-3
+
+
+def test_equalizer_process_does_not_allocate():
+    eq = Equalizer(48000, 2, 1024)
+    eq.set_gains(GAINS)
+    block = noise(1024)
+    eq.process(block)
+    tracemalloc.start()
+    for _ in range(100):
+        eq.process(block)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert peak < 1024
+
+
+def test_equalizer_restarts_from_silence_after_bypass():
+    eq = Equalizer(48000, 2, 1024)
+    eq.set_gains(GAINS)
+    run(eq, noise(4096))
+    eq.set_gains([0] * 10)
+    eq.set_gains(GAINS)
+    fresh = Equalizer(48000, 2, 1024)
+    fresh.set_gains(GAINS)
+    signal = noise(4096)
+    assert np.array_equal(run(eq, signal), run(fresh, signal))
+
+
+def test_public_sosfilt_fallback_matches():
+    signal = noise(8192)
+    eq = Equalizer(48000, 2, 1024)
+    eq.set_gains(GAINS)
+    fallback = Equalizer(48000, 2, 1024)
+    fallback.set_gains(GAINS)
+    fallback._sosfilt = dsp._sosfilt_inplace
+    assert np.abs(run(eq, signal) - run(fallback, signal)).max() < 1e-5
+
+
+def test_crossfade_keeps_the_outgoing_track_gain():
+    chain = DSPChain(48000, 2, 1024)
+    chain.set_crossfade(1.0)
+    chain.set_track_gain(-6.0)
+    chain.ramp.gain = chain.ramp.target
+    chain.begin_crossfade(0.0)
+    block = np.zeros((1024, 2), dtype="float32")
+    outgoing = np.full((1024, 2), 0.5, dtype="float32")
+    chain.crossfade(block, outgoing, 0)
+    chain.process(block)
+    fade_out = chain._fade[1][:1024, None]
+    expected = 0.5 * db_to_gain(-6.0) * fade_out
+    assert np.abs(block - expected).max() < 1e-5
@@ -0,0 +1,32 @@
+from player.playlist import Playlist
+
+PATHS = ["a", "b", "c", "d", "e", "f", "g", "h"]
+
+
+def shuffled(seed_steps):
+    playlist = Playlist()
+    playlist.add_files(PATHS)
+    playlist.set_shuffle(True)
+    for _ in range(seed_steps):
+        playlist.next()
+    return playlist
+
+
+def test_remove_current_in_shuffle_does_not_repeat_it():
+    for _ in range(50):
+        playlist = shuffled(3)
+        removed = playlist.current()
+        playlist.remove(playlist.index)
+        current = playlist.current()
+        assert current not in (None, removed)
+        assert playlist.next() != current
+
+
+def test_remove_current_in_shuffle_finishes_the_round_without_repeats():
+    for _ in range(50):
+        playlist = shuffled(0)
+        playlist.remove(playlist.index)
+        # Seven tracks are left and the new current one counts as played
+        rest = [playlist.current()] + [playlist.next() for _ in range(6)]
+        assert sorted(rest) == sorted(set(rest))
+        assert len(rest) == 7
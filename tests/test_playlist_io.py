@@ -0,0 +1,23 @@
+import tracemalloc
+
+from player.playlist_io import iter_xspf, write_playlist
+
+
+def test_xspf_round_trip(tmp_path):
+    tracks = [str(tmp_path / ("%d & <%d>.flac" % (i, i))) for i in range(100)]
+    path = str(tmp_path / "list.xspf")
+    write_playlist(path, tracks)
+    assert list(iter_xspf(path)) == tracks
+
+
+def test_xspf_memory_does_not_grow_with_the_playlist(tmp_path):
+    peaks = []
+    for count in (2000, 20000):
+        path = str(tmp_path / ("%d.xspf" % count))
+        write_playlist(path, ["/music/%06d.flac" % i for i in range(count)])
+        tracemalloc.start()
+        for _ in iter_xspf(path):
+            pass
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    assert peaks[1] < peaks[0] * 2